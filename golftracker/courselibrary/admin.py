@@ -9,9 +9,16 @@ class HoleInline(admin.TabularInline):
 class TeeInline(admin.StackedInline):
     model = Tee
     extra = 0
+    readonly_fields = Tee.TOTAL_FIELDS
 
 class TeeAdmin(admin.ModelAdmin):
     inlines = [HoleInline]
+    readonly_fields = Tee.TOTAL_FIELDS
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        #Holes may have changed through the HoleInline
+        form.instance.update_totals()
 
 class CourseAdmin(admin.ModelAdmin):
     inlines = [TeeInline]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CourselibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courselibrary'
+
+    def ready(self):
+        import courselibrary.signals
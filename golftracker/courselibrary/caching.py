@@ -0,0 +1,105 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import F, Prefetch
+from django.template.loader import render_to_string
+
+from .models import Course, Tee, Hole
+
+
+#Entries are never stale since their keys change whenever the course does, the timeout only bounds memory
+COURSE_CACHE_TIMEOUT = 60 * 60 * 24
+STATS_KEYS = {
+    'hits': 'courselibrary:cache:hits',
+    'misses': 'courselibrary:cache:misses',
+}
+
+
+def _versionKey(course_id) -> str:
+    return f'courselibrary:course:{course_id}:version'
+
+
+def _newVersion() -> int:
+    #Start from the clock so a version key that was evicted never reuses an old version number
+    return int(time.time() * 1000)
+
+
+def courseVersion(course_id) -> int:
+    ''' Current cache version of a course '''
+    key = _versionKey(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _newVersion(), None)
+        version = cache.get(key)
+    return version
+
+
+def bumpCourseVersion(course_id) -> None:
+    ''' Invalidate every cached entry for a course by moving it to a new version '''
+    key = _versionKey(course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _newVersion(), None)
+
+
+def _count(outcome) -> None:
+    key = STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def cacheStats() -> dict:
+    ''' Hit and miss counts for the course caches '''
+    counts = cache.get_many(STATS_KEYS.values())
+    return {outcome: counts.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def _getOrSet(key, build):
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    value = build()
+    if value is not None:
+        cache.set(key, value, COURSE_CACHE_TIMEOUT)
+    return value
+
+
+def _prefix(course_id) -> str:
+    return f'courselibrary:course:{course_id}:v{courseVersion(course_id)}'
+
+
+def _loadCourse(course_id):
+    #Only the creator's name is shown, the rest of the user row stays out of the cache
+    return (Course.objects.annotate(creator_username=F('creator__username'))
+            .prefetch_related(Prefetch('tee_set', queryset=Tee.objects.order_by('id')),
+                              Prefetch('tee_set__hole_set', queryset=Hole.objects.order_by('number')))
+            .filter(pk=course_id).first())
+
+
+def peekCourse(course_id):
+    ''' The course as far as a conditional request needs it, its creator_id, verified and
+        last_updated. Taken from the cached course when there is one, otherwise only those
+        fields are loaded, so a 304 never builds the whole course. None if it doesn't exist '''
+    course = cache.get(f'{_prefix(course_id)}:graph')
+    if course is None:
+        course = Course.objects.only('id', 'creator_id', 'verified', 'last_updated').filter(pk=course_id).first()
+    return course
+
+
+def getCourseDetail(course_id):
+    ''' Return the course with its creator's username, tees and holes loaded and its rendered
+        scorecard fragment, both from the cache when possible. Both are read under the
+        same version so the fragment always matches the course. Returns (None, None)
+        if the course doesn't exist '''
+    prefix = _prefix(course_id)
+    course = _getOrSet(f'{prefix}:graph', lambda: _loadCourse(course_id))
+    if course is None:
+        return None, None
+    scorecard = _getOrSet(f'{prefix}:scorecard',
+                          lambda: render_to_string('courselibrary/scorecard.html', {'course': course}))
+    return course, scorecard
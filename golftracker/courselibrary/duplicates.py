@@ -0,0 +1,115 @@
+import math
+import re
+import unicodedata
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Course, CourseTrigram
+
+
+SIMILARITY_THRESHOLD = 0.5
+#Most candidates scored exactly per lookup, the ones sharing the most trigrams are kept
+CANDIDATE_LIMIT = 50
+FREQUENCY_CACHE_TIMEOUT = 60 * 60
+#Words that appear in most course names, dropping them makes "Pebble Beach GL" match "Pebble Beach Golf Links"
+GENERIC_WORDS = {
+    'the', 'and', 'of', 'at', 'golf', 'course', 'courses', 'club', 'links', 'country', 'cc', 'gc', 'gl',
+    'g', 'c', 'l', 'resort', 'municipal', 'muni',
+}
+
+
+def normalize(text) -> str:
+    ''' Lowercase, strip accents and punctuation and drop generic golf words '''
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    words = re.findall(r'[a-z0-9]+', text)
+    return ' '.join(word for word in words if word not in GENERIC_WORDS)
+
+
+def trigrams(text) -> set:
+    ''' Trigrams of each word padded with spaces, so short words still produce some '''
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def courseTrigrams(name, location) -> set:
+    ''' Trigram set used to compare courses. Location trigrams are kept apart by an upper
+        case marker so a town name can't match a course name '''
+    return trigrams(normalize(name)) | {gram.upper() for gram in trigrams(normalize(location))}
+
+
+def similarity(first, second) -> float:
+    ''' Jaccard similarity of two trigram sets '''
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def indexCourses(courses, replace=True) -> None:
+    ''' Store the trigram rows of the given saved courses, replacing any they already
+        have. Pass replace=False for courses that were just created '''
+    courses = list(courses)
+    if replace:
+        CourseTrigram.objects.filter(course__in=courses).delete()
+    CourseTrigram.objects.bulk_create([CourseTrigram(course_id=course.id, trigram=gram)
+                                       for course in courses
+                                       for gram in courseTrigrams(course.name, course.location)],
+                                      batch_size=1000)
+
+
+def _frequencyKey(gram) -> str:
+    #Cache keys can't contain spaces, normalized text never contains underscores
+    return f'courselibrary:trigram:{gram.replace(" ", "_")}:courses'
+
+
+def trigramFrequencies(grams) -> dict:
+    ''' Number of courses each trigram appears in. Counts are cached for a while since
+        they are only used to order trigrams from rarest to most common '''
+    keys = {_frequencyKey(gram): gram for gram in grams}
+    frequency = {keys[key]: count for key, count in cache.get_many(keys).items()}
+    missing = [gram for gram in grams if gram not in frequency]
+    if missing:
+        counted = dict(CourseTrigram.objects.filter(trigram__in=missing)
+                       .values_list('trigram').annotate(courses=Count('id')))
+        counted = {gram: counted.get(gram, 0) for gram in missing}
+        cache.set_many({_frequencyKey(gram): count for gram, count in counted.items()}, FREQUENCY_CACHE_TIMEOUT)
+        frequency.update(counted)
+    return frequency
+
+
+def findDuplicates(name, location='', exclude_id=None, threshold=SIMILARITY_THRESHOLD) -> list:
+    ''' Return (similarity, course) pairs for existing courses that look like the same
+        course, most similar first. The CANDIDATE_LIMIT courses sharing the most trigrams
+        are picked in one grouped index query, then scored exactly in Python. With more
+        look-alikes than that, the ones sharing the fewest trigrams are not considered '''
+    grams = courseTrigrams(name, location)
+    if not grams:
+        return []
+    #A candidate needs at least this many shared trigrams to possibly reach the threshold
+    min_shared = max(1, math.ceil(threshold * len(grams)))
+
+    #Trigrams like a state code are shared by thousands of courses and make up most of the
+    #rows the candidate query would group. A candidate can share at most as many of the skipped
+    #trigrams as were skipped, so leaving the most common half out and lowering the required
+    #count to match still lets through every course that could reach the threshold
+    frequency = trigramFrequencies(grams)
+    ranked = sorted(grams, key=lambda gram: frequency.get(gram, 0))
+    skipped = min_shared // 2
+    candidates = (CourseTrigram.objects.filter(trigram__in=ranked[:len(ranked) - skipped])
+                  .exclude(course_id=exclude_id).values('course_id').annotate(shared=Count('id'))
+                  .filter(shared__gte=min_shared - skipped).order_by('-shared')[:CANDIDATE_LIMIT])
+    ids = [candidate['course_id'] for candidate in candidates]
+    if not ids:
+        return []
+
+    #The names have to be similar on their own as well, so two courses in the same town don't match
+    name_grams = trigrams(normalize(name))
+    matches = []
+    for course in Course.objects.filter(pk__in=ids).only('id', 'name', 'location'):
+        score = similarity(grams, courseTrigrams(course.name, course.location))
+        if score >= threshold and similarity(name_grams, trigrams(normalize(course.name))) >= threshold:
+            matches.append((score, course))
+    return sorted(matches, key=lambda match: (-match[0], match[1].name))
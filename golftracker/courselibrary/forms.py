@@ -1,17 +1,34 @@
 from django import forms
+from django.forms import BaseModelFormSet
 from .models import Course, Tee
+from .duplicates import findDuplicates
 
 
 class CourseCreateForm(forms.ModelForm):
+    not_duplicate = forms.BooleanField(required=False,
+                                       label="This is a different course from the suggested ones")
+
     class Meta:
         model = Course
-        fields = ['name', 'location', 'num_of_holes']
+        fields = ['name', 'location', 'num_of_holes', 'latitude', 'longitude']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        #Stop and suggest existing courses that look the same, unless the user confirmed it's a new one
+        self.duplicates = []
+        name = cleaned_data.get('name')
+        if name and not cleaned_data.get('not_duplicate'):
+            self.duplicates = [course for score, course in findDuplicates(name, cleaned_data.get('location', ''))]
+            if self.duplicates:
+                raise forms.ValidationError("This course looks like it may already be in the course library. "
+                                            "Check the suggested courses or confirm that it is a different course.")
+        return cleaned_data
 
 
 class CourseUpdateForm(forms.ModelForm):
     class Meta:
         model = Course
-        fields = ['name', 'location', 'num_of_holes']
+        fields = ['name', 'location', 'num_of_holes', 'latitude', 'longitude']
 
 
 class TeeCreateForm(forms.ModelForm):
@@ -24,3 +41,37 @@ class TeeUpdateForm(forms.ModelForm):
     class Meta:
         model = Tee
         fields = ['name', 'course_rating', 'slope_rating']
+
+
+class _FormsetObjectField(forms.ModelChoiceField):
+    ''' Hidden primary key field that resolves ids against the objects the formset
+        already loaded, rather than running a query for every form '''
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.formset._existing_object(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return obj
+
+
+class BaseHoleFormSet(BaseModelFormSet):
+    def clean(self):
+        super().clean()
+        #Totals are computed from the posted forms, so an edit has to cover every hole it was given
+        if self.edit_only and self.total_form_count() != len(self.get_queryset()):
+            raise forms.ValidationError("Every hole of the scorecard must be submitted.", code='missing_holes')
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        pk_name = self.model._meta.pk.name
+        field = form.fields[pk_name]
+        form.fields[pk_name] = _FormsetObjectField(self, field.queryset, initial=field.initial,
+                                                   required=False, widget=field.widget)
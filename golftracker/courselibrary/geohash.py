@@ -0,0 +1,130 @@
+import math
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+EARTH_RADIUS_KM = 6371.0
+#Length of one degree of latitude on the same sphere distanceKm() uses
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=PRECISION) -> str:
+    ''' Encode a coordinate as a geohash. Nearby points share a common prefix, so a
+        prefix identifies a rectangular cell that can be found with an index range scan '''
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    value = 0
+    even = True
+    while len(geohash) < precision:
+        #Bits alternate between longitude and latitude, starting with longitude
+        span, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            span[0] = middle
+        else:
+            value = value << 1
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(geohash)
+
+
+def decode(geohash):
+    ''' Return the (latitude, longitude) bounds of a geohash cell as
+        ((min_lat, max_lat), (min_lon, max_lon)) '''
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for character in geohash:
+        value = BASE32.index(character)
+        for shift in range(4, -1, -1):
+            span = lon_range if even else lat_range
+            middle = (span[0] + span[1]) / 2
+            if (value >> shift) & 1:
+                span[0] = middle
+            else:
+                span[1] = middle
+            even = not even
+    return tuple(lat_range), tuple(lon_range)
+
+
+def cellSize(precision):
+    ''' Height and width of a geohash cell in degrees at the given precision '''
+    bits = precision * 5
+    lat_bits = bits // 2
+    lon_bits = bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def neighbours(geohash) -> list:
+    ''' The cell itself and the up to 8 cells around it. Cells past the poles are
+        dropped and longitude wraps around the antimeridian '''
+    (min_lat, max_lat), (min_lon, max_lon) = decode(geohash)
+    height, width = cellSize(len(geohash))
+    center_lat = (min_lat + max_lat) / 2
+    center_lon = (min_lon + max_lon) / 2
+    cells = []
+    for lat_step in (-1, 0, 1):
+        latitude = center_lat + lat_step * height
+        if latitude < -90 or latitude > 90:
+            continue
+        for lon_step in (-1, 0, 1):
+            longitude = (center_lon + lon_step * width + 180) % 360 - 180
+            cell = encode(latitude, longitude, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def coveringCells(latitude, longitude, radius_km, precision, limit=64):
+    ''' Cells at the given precision that together cover every point within radius_km of
+        the coordinate. Returns None if more than limit cells would be needed '''
+    height, width = cellSize(precision)
+    lat_margin = radius_km / KM_PER_DEGREE
+    min_lat = max(-90.0, latitude - lat_margin)
+    max_lat = min(90.0, latitude + lat_margin)
+    #Widest longitude reached by the circle, if it would reach a pole every longitude is covered
+    reach = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi / 2)) / math.cos(math.radians(latitude))
+    if reach >= 1 or min_lat == -90.0 or max_lat == 90.0:
+        return None
+    lon_margin = math.degrees(math.asin(reach))
+
+    #Snap the box to the cell grid so every cell is visited once
+    first_lat = math.floor((min_lat + 90) / height) * height - 90
+    first_lon = math.floor((longitude - lon_margin + 180) / width) * width - 180
+    rows = int(math.ceil((max_lat - first_lat) / height)) or 1
+    columns = int(math.ceil((longitude + lon_margin - first_lon) / width)) or 1
+    if rows * columns > limit:
+        return None
+
+    cells = set()
+    for row in range(rows):
+        cell_lat = min(90.0, first_lat + (row + 0.5) * height)
+        for column in range(columns):
+            cell_lon = (first_lon + (column + 0.5) * width + 180) % 360 - 180
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def distanceKm(lat1, lon1, lat2, lon2) -> float:
+    ''' Great circle distance between two coordinates using the haversine formula '''
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coveredRadiusKm(latitude, precision) -> float:
+    ''' Distance from a point that is guaranteed to lie inside the 3x3 block of cells
+        around it, at least one full cell in every direction '''
+    height, width = cellSize(precision)
+    #Longitude degrees shrink towards the poles, use the narrowest latitude in the block
+    edge_latitude = min(90.0, abs(latitude) + 2 * height)
+    return min(height * KM_PER_DEGREE, width * KM_PER_DEGREE * math.cos(math.radians(edge_latitude)))
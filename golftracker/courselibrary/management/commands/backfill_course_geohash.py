@@ -0,0 +1,62 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courselibrary.models import Course
+
+
+class Command(BaseCommand):
+    help = ("Fill in the geohash of every course that has coordinates. Coordinates for existing "
+            "courses can be loaded at the same time from a csv file with id, latitude and longitude columns")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coordinates', help="CSV file with id, latitude and longitude columns")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['coordinates']:
+            self.loadCoordinates(options['coordinates'], batch_size)
+
+        updated = 0
+        batch = []
+        courses = Course.objects.only('id', 'latitude', 'longitude', 'geohash').order_by('id')
+        for course in courses.iterator(chunk_size=batch_size):
+            current = course.geohash
+            course.update_geohash()
+            if course.geohash != current:
+                batch.append(course)
+            if len(batch) >= batch_size:
+                updated += self.saveGeohashes(batch)
+                batch = []
+        updated += self.saveGeohashes(batch)
+        self.stdout.write(self.style.SUCCESS(f'Updated the geohash of {updated} courses'))
+
+    def saveGeohashes(self, courses) -> int:
+        Course.objects.bulk_update(courses, ['geohash'])
+        return len(courses)
+
+    def loadCoordinates(self, path, batch_size):
+        with open(path, newline='', encoding='utf-8') as stream:
+            reader = csv.DictReader(stream)
+            if not {'id', 'latitude', 'longitude'} <= set(reader.fieldnames or []):
+                raise CommandError('Coordinates file needs id, latitude and longitude columns')
+            rows = []
+            for line_number, row in enumerate(reader, start=2):
+                try:
+                    latitude, longitude = float(row['latitude']), float(row['longitude'])
+                    course_id = int(row['id'])
+                except ValueError:
+                    raise CommandError(f'Line {line_number} has an invalid id or coordinate')
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    raise CommandError(f'Line {line_number} has coordinates out of range')
+                rows.append(Course(id=course_id, latitude=latitude, longitude=longitude))
+                if len(rows) >= batch_size:
+                    self.saveCoordinates(rows)
+                    rows = []
+            self.saveCoordinates(rows)
+
+    def saveCoordinates(self, rows):
+        with transaction.atomic():
+            Course.objects.bulk_update(rows, ['latitude', 'longitude'])
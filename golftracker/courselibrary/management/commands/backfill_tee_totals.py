@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courselibrary.models import Tee
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored par, yardage and hole count totals on every tee from its holes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report tees whose stored totals are out of date, don't fix them")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        aggregates = {f'computed_{field}': expression
+                      for field, expression in Tee.totals_aggregates('hole__').items()}
+        tees = Tee.objects.annotate(**aggregates).order_by('id')
+
+        stale = []
+        checked = 0
+        for tee in tees.iterator(chunk_size=options['batch_size']):
+            checked += 1
+            changed = False
+            for field in Tee.TOTAL_FIELDS:
+                computed = getattr(tee, f'computed_{field}')
+                if getattr(tee, field) != computed:
+                    setattr(tee, field, computed)
+                    changed = True
+            if changed:
+                stale.append(tee)
+
+        for tee in stale:
+            self.stdout.write(f'Tee {tee.pk} ({tee.name}) has out of date totals')
+
+        if options['check']:
+            if stale:
+                raise CommandError(f'{len(stale)} of {checked} tees have out of date totals')
+            self.stdout.write(self.style.SUCCESS(f'All {checked} tees have correct totals'))
+            return
+
+        Tee.objects.bulk_update(stale, Tee.TOTAL_FIELDS, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} tees, updated {len(stale)}'))
@@ -0,0 +1,76 @@
+import math
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from courselibrary.models import Course
+from courselibrary.duplicates import normalize, trigrams, courseTrigrams, similarity, indexCourses, SIMILARITY_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = "Report clusters of courses in the library that look like duplicates of each other"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                            help="Minimum trigram similarity between two courses to count as duplicates")
+        parser.add_argument('--rebuild-index', action='store_true',
+                            help="Rebuild the trigram index used by course creation before reporting")
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        courses = {}
+        postings = defaultdict(list)
+        for course in Course.objects.only('id', 'name', 'location').order_by('id').iterator(chunk_size=2000):
+            grams = courseTrigrams(course.name, course.location)
+            courses[course.id] = (course, grams, trigrams(normalize(course.name)))
+            for gram in grams:
+                postings[gram].append(course.id)
+
+        if options['rebuild_index']:
+            ids = list(courses)
+            for start in range(0, len(ids), 1000):
+                indexCourses(courses[course_id][0] for course_id in ids[start:start + 1000])
+            self.stdout.write(f'Rebuilt the trigram index for {len(ids)} courses')
+
+        #Union find over every pair of courses that are similar enough
+        parent = {course_id: course_id for course_id in courses}
+
+        def find(course_id):
+            while parent[course_id] != course_id:
+                parent[course_id] = parent[parent[course_id]]
+                course_id = parent[course_id]
+            return course_id
+
+        for course_id, (course, grams, name_grams) in courses.items():
+            if not grams:
+                continue
+            #Same bound as findDuplicates(), the most common half of the required trigrams is skipped
+            min_shared = max(1, math.ceil(threshold * len(grams)))
+            skipped = min_shared // 2
+            ranked = sorted(grams, key=lambda gram: len(postings[gram]))
+            shared = Counter()
+            for gram in ranked[:len(ranked) - skipped]:
+                #Postings are in id order, each pair is only compared from its lower id
+                posting = postings[gram]
+                shared.update(posting[bisect_right(posting, course_id):])
+            for other_id, count in shared.items():
+                if count < min_shared - skipped or find(other_id) == find(course_id):
+                    continue
+                other, other_grams, other_name_grams = courses[other_id]
+                if (similarity(grams, other_grams) >= threshold
+                        and similarity(name_grams, other_name_grams) >= threshold):
+                    parent[find(other_id)] = find(course_id)
+
+        clusters = defaultdict(list)
+        for course_id in courses:
+            clusters[find(course_id)].append(courses[course_id][0])
+        clusters = [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+        for number, cluster in enumerate(sorted(clusters, key=len, reverse=True), start=1):
+            self.stdout.write(f'Cluster {number}:')
+            for course in cluster:
+                self.stdout.write(f'    {course.id}: {course.name} ({course.location})')
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(clusters)} clusters covering {sum(len(cluster) for cluster in clusters)} '
+            f'of {len(courses)} courses'))
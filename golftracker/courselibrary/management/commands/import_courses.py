@@ -0,0 +1,293 @@
+import csv
+import itertools
+import json
+import os
+import time
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courselibrary.models import Course, Tee, Hole
+from courselibrary import duplicates, search
+
+
+FORMATS = ['csv', 'json', 'ndjson']
+
+CSV_COLUMNS = ['course_name', 'location', 'num_of_holes', 'tee_name', 'course_rating',
+               'slope_rating', 'hole_number', 'par', 'yards']
+#Optional csv columns, repeated on every row of a course
+CSV_COORDINATE_COLUMNS = ['latitude', 'longitude']
+
+
+class RecordError(Exception):
+    ''' A course record in the input file is invalid '''
+
+
+def readNdjson(stream):
+    ''' Yield one course record per non blank line '''
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Line {line_number} is not valid JSON: {error}')
+
+
+def readJsonArray(stream, chunk_size=65536):
+    ''' Yield the items of a top level JSON array one at a time, reading the file
+        in chunks so the whole document is never held in memory '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if not buffer.startswith('['):
+                raise CommandError('JSON input must be an array of courses')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(']'):
+            return
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('JSON input ended before the course array was closed')
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        #A number at the very end of the buffer may still be incomplete
+        if end == len(buffer) and not eof:
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def readCsv(stream):
+    ''' Yield course records from a csv file with one row per hole. Rows for the same
+        course and tee must be next to each other '''
+    reader = csv.DictReader(stream)
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise CommandError(f'CSV input is missing columns: {", ".join(sorted(missing))}')
+
+    course_key = itemgetter('course_name', 'location', 'num_of_holes')
+    tee_key = itemgetter('tee_name', 'course_rating', 'slope_rating')
+    for (name, location, num_of_holes), course_rows in itertools.groupby(reader, key=course_key):
+        course_rows = list(course_rows)
+        coordinates = {column: course_rows[0].get(column) or None for column in CSV_COORDINATE_COLUMNS}
+        tees = []
+        for (tee_name, course_rating, slope_rating), tee_rows in itertools.groupby(course_rows, key=tee_key):
+            tees.append({
+                'name': tee_name,
+                'course_rating': course_rating or None,
+                'slope_rating': slope_rating or None,
+                'holes': [{'number': row['hole_number'], 'par': row['par'], 'yards': row['yards']}
+                          for row in tee_rows],
+            })
+        yield {'name': name, 'location': location, 'num_of_holes': num_of_holes, 'tees': tees, **coordinates}
+
+
+READERS = {
+    'csv': readCsv,
+    'json': readJsonArray,
+    'ndjson': readNdjson,
+}
+
+
+def buildCourse(record, creator=None, verified=False):
+    ''' Turn one course record into unsaved Course, Tee and Hole instances and validate
+        them without touching the database. Returns (course, [(tee, [holes])]) '''
+    if not isinstance(record, dict):
+        raise RecordError('record is not an object')
+    try:
+        num_of_holes = f"{int(record.get('num_of_holes', 0)):02}"
+    except (TypeError, ValueError):
+        raise RecordError(f"invalid num_of_holes {record.get('num_of_holes')!r}")
+
+    course = Course(name=record.get('name') or '', location=record.get('location') or '',
+                    num_of_holes=num_of_holes, creator=creator, verified=verified,
+                    latitude=record.get('latitude'), longitude=record.get('longitude'))
+    try:
+        course.clean_fields(exclude=['creator'])
+        #bulk_create doesn't call save(), which normally sets the geohash
+        course.update_geohash()
+        tees = []
+        for tee_record in record.get('tees') or []:
+            tee = Tee(name=tee_record.get('name') or '',
+                      course_rating=tee_record.get('course_rating'),
+                      slope_rating=tee_record.get('slope_rating'))
+            tee.clean_fields(exclude=['course'])
+            holes = []
+            for hole_record in tee_record.get('holes') or []:
+                hole = Hole(number=hole_record.get('number'), par=hole_record.get('par'),
+                            yards=hole_record.get('yards'))
+                hole.clean_fields(exclude=['tees'])
+                holes.append(hole)
+            numbers = sorted(hole.number for hole in holes)
+            if numbers != list(range(1, int(num_of_holes) + 1)):
+                raise RecordError(f'tee {tee.name!r} must have holes numbered 1 to {int(num_of_holes)}')
+            tee.set_totals(holes)
+            tees.append((tee, holes))
+    except ValidationError as error:
+        raise RecordError('; '.join(f'{field}: {" ".join(messages)}'
+                                    for field, messages in error.message_dict.items()))
+    return course, tees
+
+
+def saveBatch(batch) -> int:
+    ''' Insert a batch of built courses with one bulk insert per table, returns the hole count '''
+    with transaction.atomic():
+        courses = Course.objects.bulk_create([course for course, tees in batch])
+        all_tees = []
+        for course, tees in batch:
+            for tee, holes in tees:
+                tee.course = course
+                all_tees.append(tee)
+        Tee.objects.bulk_create(all_tees)
+        all_holes = []
+        for course, tees in batch:
+            for tee, holes in tees:
+                for hole in holes:
+                    hole.tees = tee
+                    all_holes.append(hole)
+        Hole.objects.bulk_create(all_holes)
+        #bulk_create skips the post_save signals that normally index new courses
+        search.indexCourses(courses)
+        duplicates.indexCourses(courses, replace=False)
+    return len(all_holes)
+
+
+class Command(BaseCommand):
+    help = ("Stream courses, tees and holes from a CSV, JSON or NDJSON file into the course library "
+            "using batched bulk inserts. Progress is checkpointed after every batch so an "
+            "interrupted import can be resumed with --resume")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="Input format, defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of courses inserted per transaction")
+        parser.add_argument('--creator', help="Username recorded as the creator of the imported courses")
+        parser.add_argument('--verified', action='store_true', help="Mark the imported courses as verified")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate every record and report errors without writing anything")
+        parser.add_argument('--checkpoint', help="Checkpoint file, defaults to <path>.checkpoint")
+        parser.add_argument('--resume', action='store_true',
+                            help="Skip the courses committed by a previous run according to the checkpoint")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown input format {file_format!r}, use --format with one of {", ".join(FORMATS)}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        creator = None
+        if options['creator']:
+            try:
+                creator = User.objects.get(username=options['creator'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['creator']!r} does not exist")
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        skip = self.readCheckpoint(checkpoint_path, path) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f'Resuming after {skip} already imported courses')
+
+        dry_run = options['dry_run']
+        started = time.monotonic()
+        imported = 0
+        hole_count = 0
+        errors = 0
+        batch = []
+        record_number = 0
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            for record_number, record in enumerate(READERS[file_format](stream), start=1):
+                if record_number <= skip:
+                    continue
+                try:
+                    built = buildCourse(record, creator=creator, verified=options['verified'])
+                except RecordError as error:
+                    if not dry_run:
+                        raise CommandError(f'Course {record_number} is invalid: {error}. '
+                                           f'{skip + imported} courses were imported, fix the file and rerun with --resume')
+                    errors += 1
+                    self.stderr.write(f'Course {record_number}: {error}')
+                    continue
+
+                if dry_run:
+                    imported += 1
+                    continue
+                batch.append(built)
+                if len(batch) >= options['batch_size']:
+                    hole_count += saveBatch(batch)
+                    imported += len(batch)
+                    batch = []
+                    self.writeCheckpoint(checkpoint_path, path, skip + imported)
+                    self.reportProgress(imported, hole_count, started)
+
+            if batch:
+                hole_count += saveBatch(batch)
+                imported += len(batch)
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        if dry_run:
+            if errors:
+                raise CommandError(f'{errors} of {record_number - skip} courses are invalid')
+            self.stdout.write(self.style.SUCCESS(f'Validated {imported} courses in {elapsed:.2f}s, no errors found'))
+            return
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} courses and {hole_count} holes in {elapsed:.2f}s '
+            f'({imported / elapsed:.0f} courses/s, {hole_count / elapsed:.0f} holes/s)'))
+
+    def reportProgress(self, imported, hole_count, started):
+        if self.verbosity < 1:
+            return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f'{imported} courses imported ({imported / elapsed:.0f} courses/s, '
+                          f'{hole_count / elapsed:.0f} holes/s)')
+
+    def readCheckpoint(self, checkpoint_path, path) -> int:
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Could not read checkpoint {checkpoint_path}: {error}')
+        if checkpoint.get('path') != os.path.abspath(path):
+            raise CommandError(f'Checkpoint {checkpoint_path} belongs to a different file')
+        return int(checkpoint.get('imported', 0))
+
+    def writeCheckpoint(self, checkpoint_path, path, imported):
+        temp_path = f'{checkpoint_path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'path': os.path.abspath(path), 'imported': imported}, checkpoint_file)
+        os.replace(temp_path, checkpoint_path)
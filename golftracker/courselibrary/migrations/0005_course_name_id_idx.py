@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0004_rename_tee_name_tee_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['name', 'id'], name='course_name_id_idx'),
+        ),
+    ]
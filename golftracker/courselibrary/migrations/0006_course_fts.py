@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS courselibrary_course_fts "
+        "USING fts5(name, location, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO courselibrary_course_fts (rowid, name, location) "
+        "SELECT id, name, location FROM courselibrary_course"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS courselibrary_course_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0005_course_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_tee_totals(apps, schema_editor):
+    Tee = apps.get_model('courselibrary', 'Tee')
+    tees = Tee.objects.annotate(
+        computed_total_par=Coalesce(Sum('hole__par'), 0),
+        computed_total_yards=Coalesce(Sum('hole__yards'), 0),
+        computed_front_par=Coalesce(Sum('hole__par', filter=Q(hole__number__lte=9)), 0),
+        computed_back_par=Coalesce(Sum('hole__par', filter=Q(hole__number__gt=9)), 0),
+        computed_hole_count=Count('hole'),
+    )
+    for tee in tees:
+        tee.total_par = tee.computed_total_par
+        tee.total_yards = tee.computed_total_yards
+        tee.front_par = tee.computed_front_par
+        tee.back_par = tee.computed_back_par
+        tee.hole_count = tee.computed_hole_count
+    Tee.objects.bulk_update(tees, ['total_par', 'total_yards', 'front_par', 'back_par', 'hole_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0006_course_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tee',
+            name='back_par',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tee',
+            name='front_par',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tee',
+            name='hole_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tee',
+            name='total_par',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tee',
+            name='total_yards',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_tee_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0007_tee_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0008_alter_course_last_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=9),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+    ]
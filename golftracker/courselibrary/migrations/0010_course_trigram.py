@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:29
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+#Copied from courselibrary.duplicates as it was when this migration was written, so later changes
+#there don't change what this migration does. Courses are reindexed by the post_save signal anyway
+GENERIC_WORDS = {
+    'the', 'and', 'of', 'at', 'golf', 'course', 'courses', 'club', 'links', 'country', 'cc', 'gc', 'gl',
+    'g', 'c', 'l', 'resort', 'municipal', 'muni',
+}
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    words = re.findall(r'[a-z0-9]+', text)
+    return ' '.join(word for word in words if word not in GENERIC_WORDS)
+
+
+def _trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _courseTrigrams(name, location):
+    return _trigrams(_normalize(name)) | {gram.upper() for gram in _trigrams(_normalize(location))}
+
+
+def index_existing_courses(apps, schema_editor):
+    Course = apps.get_model('courselibrary', 'Course')
+    CourseTrigram = apps.get_model('courselibrary', 'CourseTrigram')
+    rows = []
+    for course in Course.objects.only('id', 'name', 'location').iterator():
+        rows.extend(CourseTrigram(course_id=course.id, trigram=gram)
+                    for gram in _courseTrigrams(course.name, course.location))
+        if len(rows) >= 5000:
+            CourseTrigram.objects.bulk_create(rows)
+            rows = []
+    CourseTrigram.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0009_course_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courselibrary.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'course'], name='course_trigram_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_courses, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,26 @@
 from django.db import models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator, MaxValueValidator
+from . import geohash
+
+
+class CourseQuerySet(models.QuerySet):
+    def with_can_edit(self, user):
+        ''' Annotate each course with can_edit, following the same rules as canEditCourse():
+            staff can edit any course, other users only unverified courses they created '''
+        if user.is_staff:
+            can_edit = models.Value(True)
+        elif not user.is_authenticated:
+            can_edit = models.Value(False)
+        else:
+            can_edit = models.Case(
+                models.When(verified=False, creator_id=user.pk, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            )
+        return self.annotate(can_edit=can_edit)
 
 
 class Course(models.Model):
@@ -11,13 +32,41 @@ class Course(models.Model):
     name = models.CharField(max_length=256)
     location = models.CharField(max_length=256, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
-    last_updated = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
     creator = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
     verified = models.BooleanField(default=False)
     num_of_holes = models.CharField(max_length=2, choices=HOLE_CHOICES)
+    latitude = models.FloatField(blank=True, null=True,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(blank=True, null=True,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    #Derived from latitude and longitude on save, indexed for nearest course lookups
+    geohash = models.CharField(max_length=geohash.PRECISION, blank=True, db_index=True, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            #Supports keyset pagination of the course library
+            models.Index(fields=['name', 'id'], name='course_name_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def update_geohash(self) -> None:
+        ''' Set the geohash from the coordinates, or clear it if either is missing '''
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = geohash.encode(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
     
 
 class Tee(models.Model):
@@ -26,10 +75,46 @@ class Tee(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     course_rating = models.FloatField(blank=True, null=True)
     slope_rating = models.FloatField(blank=True, null=True)
+    #Totals of the tee's holes, kept up to date by update_totals() whenever holes are written
+    total_par = models.IntegerField(default=0, editable=False)
+    total_yards = models.IntegerField(default=0, editable=False)
+    front_par = models.IntegerField(default=0, editable=False)
+    back_par = models.IntegerField(default=0, editable=False)
+    hole_count = models.IntegerField(default=0, editable=False)
+
+    TOTAL_FIELDS = ['total_par', 'total_yards', 'front_par', 'back_par', 'hole_count']
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def totals_aggregates(prefix='') -> dict:
+        ''' Aggregate expressions for the hole totals, prefix is the lookup path to
+            the holes ('' from a hole queryset, 'hole__' from a tee queryset) '''
+        return {
+            'total_par': Coalesce(Sum(f'{prefix}par'), 0),
+            'total_yards': Coalesce(Sum(f'{prefix}yards'), 0),
+            'front_par': Coalesce(Sum(f'{prefix}par', filter=Q(**{f'{prefix}number__lte': 9})), 0),
+            'back_par': Coalesce(Sum(f'{prefix}par', filter=Q(**{f'{prefix}number__gt': 9})), 0),
+            'hole_count': Count(f'{prefix}id'),
+        }
+
+    def set_totals(self, holes) -> None:
+        ''' Set the hole totals from hole objects already in memory, without saving '''
+        holes = list(holes)
+        self.total_par = sum(hole.par for hole in holes)
+        self.total_yards = sum(hole.yards for hole in holes)
+        self.front_par = sum(hole.par for hole in holes if hole.number <= 9)
+        self.back_par = sum(hole.par for hole in holes if hole.number > 9)
+        self.hole_count = len(holes)
+
+    def update_totals(self) -> None:
+        ''' Recompute the hole totals in one aggregate query and save them '''
+        totals = Hole.objects.filter(tees=self).aggregate(**self.totals_aggregates())
+        for field, value in totals.items():
+            setattr(self, field, value)
+        self.save(update_fields=self.TOTAL_FIELDS)
+
 
 class Hole(models.Model):
     number = models.IntegerField()
@@ -40,3 +125,17 @@ class Hole(models.Model):
     def __str__(self):
         return f'{self.number}'
 
+
+class CourseTrigram(models.Model):
+    ''' One row for each trigram of a course's normalized name and location, used to
+        find likely duplicate courses '''
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trigram', 'course'], name='course_trigram_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.course_id}: {self.trigram}'
@@ -0,0 +1,124 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course
+from . import geohash
+
+
+FTS_TABLE = 'courselibrary_course_fts'
+SEARCH_LIMIT = 25
+NEARBY_LIMIT = 50
+#Precision 5 cells are roughly 5km across, the search widens one level at a time from there
+NEARBY_START_PRECISION = 5
+
+#Whether each database has the index table, by alias and name since tests swap the database under an alias
+_available = {}
+
+
+def ftsAvailable() -> bool:
+    ''' Check if the database is SQLite with the FTS5 index table in place '''
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _available[key] = cursor.fetchone() is not None
+    return _available[key]
+
+
+def searchTerms(query) -> list:
+    ''' Split a free text query into lowercase word tokens, dropping any punctuation
+        so user input can never be interpreted as FTS5 query syntax '''
+    return re.findall(r'\w+', query.lower())
+
+
+def _matchExpression(terms) -> str:
+    #Every term is a quoted prefix match so "pebb bea" finds "Pebble Beach"
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+def indexCourses(courses) -> None:
+    ''' Add or replace the search index rows for the given courses '''
+    if not ftsAvailable():
+        return
+    rows = [(course.id, course.name, course.location) for course in courses]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, location) VALUES (%s, %s, %s)', rows)
+
+
+def unindexCourse(course_id) -> None:
+    ''' Remove a course from the search index '''
+    if not ftsAvailable():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [course_id])
+
+
+def searchCourses(query, limit=SEARCH_LIMIT) -> list:
+    ''' Return the courses matching every word of the query as a prefix, best match first.
+        Uses the FTS5 index (ranked by bm25 with name weighted over location) on SQLite
+        and falls back to icontains filtering ordered by name on other databases '''
+    terms = searchTerms(query)
+    if not terms:
+        return []
+
+    if not ftsAvailable():
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(location__icontains=term)
+        return list(Course.objects.filter(condition).order_by('name', 'id')[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                       f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s',
+                       [_matchExpression(terms), limit])
+        ids = [row[0] for row in cursor.fetchall()]
+    courses = Course.objects.in_bulk(ids)
+    return [courses[course_id] for course_id in ids if course_id in courses]
+
+
+def _cellsCondition(cells) -> Q:
+    condition = Q()
+    for cell in cells:
+        #A prefix match written as a range so SQLite can use the index ('~' sorts after every geohash character)
+        condition |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+    return condition
+
+
+def nearestCourses(latitude, longitude, k=10) -> list:
+    ''' Return up to k (distance_km, course) pairs closest to the coordinate, nearest first.
+        The geohash cell around the point and its neighbours are scanned first, moving to
+        larger cells until at least k candidates are found. If the k-th candidate is further
+        away than the edge of that block, the cells covering its distance are scanned as
+        well, so the result is always the exact k nearest '''
+    def rank(cells):
+        #Rank plain tuples, only the winning courses are loaded as model instances
+        candidates = Course.objects.filter(_cellsCondition(cells)) if cells is not None else Course.objects.exclude(geohash='')
+        return sorted((geohash.distanceKm(latitude, longitude, course_lat, course_lon), course_id)
+                      for course_id, course_lat, course_lon in candidates.values_list('id', 'latitude', 'longitude'))[:k]
+
+    ranked = None
+    for precision in range(NEARBY_START_PRECISION, 0, -1):
+        candidates = rank(geohash.neighbours(geohash.encode(latitude, longitude, precision)))
+        if len(candidates) < k:
+            continue
+        radius = candidates[-1][0]
+        if radius <= geohash.coveredRadiusKm(latitude, precision):
+            ranked = candidates
+        else:
+            #There are k courses within radius, so the exact answer lies in the cells covering it
+            cells = geohash.coveringCells(latitude, longitude, radius, precision)
+            ranked = rank(cells) if cells is not None else None
+        break
+
+    if ranked is None:
+        #Too few courses close by to narrow the search, rank everything with coordinates
+        ranked = rank(None)
+    courses = Course.objects.only('id', 'name', 'location').in_bulk([course_id for distance, course_id in ranked])
+    return [(distance, courses[course_id]) for distance, course_id in ranked]
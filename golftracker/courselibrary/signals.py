@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Course, Tee, Hole
+from .caching import bumpCourseVersion
+from . import duplicates, search
+
+
+def touch_course(course_id):
+    #Tee and hole edits count as edits to the course, update() skips the post_save signal
+    Course.objects.filter(pk=course_id).update(last_updated=timezone.now())
+    invalidate_course(course_id)
+
+
+def invalidate_course(course_id):
+    bumpCourseVersion(course_id)
+    #Bump again once the write commits, in case a concurrent request cached the old data under the new version
+    transaction.on_commit(lambda: bumpCourseVersion(course_id))
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'location'} & set(update_fields):
+        return
+    search.indexCourses([instance])
+    duplicates.indexCourses([instance])
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    search.unindexCourse(instance.id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    invalidate_course(instance.id)
+
+
+@receiver(post_save, sender=Tee)
+@receiver(post_delete, sender=Tee)
+def invalidate_tee_course_cache(sender, instance, origin=None, **kwargs):
+    #Deleting a course already invalidates it, no need to do it again for each tee
+    if isinstance(origin, Course):
+        return
+    touch_course(instance.course_id)
+
+
+@receiver(post_save, sender=Hole)
+@receiver(post_delete, sender=Hole)
+def invalidate_hole_course_cache(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Course, Tee)):
+        return
+    course_id = Tee.objects.filter(pk=instance.tees_id).values_list('course_id', flat=True).first()
+    if course_id is not None:
+        touch_course(course_id)
@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from ..models import Course, Tee, Hole
+from ..search import searchCourses
+from .. import geohash
+from ..management.commands.import_courses import readJsonArray
+
+
+class BackfillTeeTotalsCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        user = User.objects.create_user(username='testuser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course',
+                                       location='Roseville, MN',
+                                       creator=user, num_of_holes="09")
+        tee = Tee.objects.create(name='White', course=course)
+        for i in range(9):
+            Hole.objects.create(number=i + 1, par=3, yards=100, tees=tee)
+
+    def test_check_reports_stale_totals(self):
+        """Check that --check fails when stored totals don't match the holes
+        and doesn't change anything"""
+        with self.assertRaises(CommandError):
+            call_command('backfill_tee_totals', '--check', stdout=StringIO())
+        self.assertEqual(Tee.objects.get(name='White').total_par, 0)
+
+    def test_backfill_fixes_stale_totals(self):
+        """Check that running the command stores the correct totals and that
+        a following check passes"""
+        out = StringIO()
+        call_command('backfill_tee_totals', stdout=out)
+        tee = Tee.objects.get(name='White')
+        self.assertEqual(tee.total_par, 27)
+        self.assertEqual(tee.total_yards, 900)
+        self.assertEqual(tee.hole_count, 9)
+        self.assertIn('updated 1', out.getvalue())
+        call_command('backfill_tee_totals', '--check', stdout=StringIO())
+
+
+class ImportCoursesCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        User.objects.create_user(username='staffuser', password='12345', is_staff=True)
+
+    def courseRecord(self, name, holes=9, par=4):
+        return {'name': name, 'location': 'Roseville, MN', 'num_of_holes': holes,
+                'tees': [{'name': 'White', 'course_rating': 35.1, 'slope_rating': 120,
+                          'holes': [{'number': i + 1, 'par': par, 'yards': 350} for i in range(holes)]}]}
+
+    def writeFile(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as import_file:
+            import_file.write(content)
+        return path
+
+    def writeNdjson(self, records):
+        return self.writeFile('courses.ndjson', '\n'.join(json.dumps(record) for record in records))
+
+    def test_imports_ndjson(self):
+        """Check that courses, tees and holes are created from an NDJSON file
+        along with the tee totals and the search index"""
+        path = self.writeNdjson([self.courseRecord('Cedarholm Golf Course'),
+                                 self.courseRecord('Dwan Golf Course', holes=18)])
+        out = StringIO()
+        call_command('import_courses', path, '--creator', 'staffuser', '--verified', stdout=out)
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertEqual(Hole.objects.count(), 27)
+        course = Course.objects.get(name='Dwan Golf Course')
+        self.assertEqual(course.num_of_holes, '18')
+        self.assertTrue(course.verified)
+        self.assertEqual(course.creator.username, 'staffuser')
+        self.assertEqual(course.tee_set.get().total_par, 72)
+        self.assertEqual(searchCourses('dwan'), [course])
+        self.assertIn('Imported 2 courses and 27 holes', out.getvalue())
+
+    def test_imports_json_array_in_chunks(self):
+        """Check that a JSON array is streamed item by item even when items
+        span several reads"""
+        records = [self.courseRecord(f'Course {i}') for i in range(5)]
+        path = self.writeFile('courses.json', json.dumps(records))
+        with open(path) as stream:
+            parsed = list(readJsonArray(stream, chunk_size=7))
+        self.assertEqual(parsed, records)
+        call_command('import_courses', path, '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(Course.objects.count(), 5)
+        self.assertEqual(Tee.objects.count(), 5)
+
+    def test_imports_csv(self):
+        """Check that csv rows are grouped into courses and tees"""
+        rows = ['course_name,location,num_of_holes,tee_name,course_rating,slope_rating,hole_number,par,yards']
+        for tee in ['White', 'Red']:
+            for i in range(9):
+                rows.append(f'Cedarholm Golf Course,"Roseville, MN",9,{tee},35.1,120,{i + 1},3,150')
+        path = self.writeFile('courses.csv', '\n'.join(rows))
+        call_command('import_courses', path, stdout=StringIO())
+        course = Course.objects.get()
+        self.assertEqual(course.location, 'Roseville, MN')
+        self.assertEqual(sorted(course.tee_set.values_list('name', flat=True)), ['Red', 'White'])
+        self.assertEqual(Hole.objects.count(), 18)
+
+    def test_dry_run_reports_errors_without_writing(self):
+        """Check that a dry run validates every record and writes nothing"""
+        bad = self.courseRecord('Bad Course')
+        bad['tees'][0]['holes'].pop()
+        path = self.writeNdjson([self.courseRecord('Cedarholm Golf Course'), bad])
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_courses', path, '--dry-run', stdout=StringIO(), stderr=err)
+        self.assertIn('Course 2', err.getvalue())
+        self.assertFalse(Course.objects.exists())
+
+    def test_resumes_from_checkpoint_after_failure(self):
+        """Check that a failed import keeps the committed batches and a rerun with
+        --resume skips them"""
+        records = [self.courseRecord(f'Course {i}') for i in range(5)]
+        records[3]['num_of_holes'] = 'lots'
+        path = self.writeNdjson(records)
+        with self.assertRaises(CommandError):
+            call_command('import_courses', path, '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(Course.objects.count(), 2)
+        self.assertTrue(os.path.exists(f'{path}.checkpoint'))
+
+        records[3]['num_of_holes'] = 9
+        with open(path, 'w') as import_file:
+            import_file.write('\n'.join(json.dumps(record) for record in records))
+        call_command('import_courses', path, '--resume', stdout=StringIO())
+        self.assertEqual(sorted(Course.objects.values_list('name', flat=True)),
+                         [f'Course {i}' for i in range(5)])
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class BackfillCourseGeohashCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Course.objects.create(name='Cedarholm Golf Course', num_of_holes="09")
+        Course.objects.create(name='Keller Golf Course', num_of_holes="18")
+
+    def test_loads_coordinates_and_sets_geohash(self):
+        """Check that coordinates from the csv are stored along with their geohash"""
+        path = os.path.join(self.directory.name, 'coordinates.csv')
+        with open(path, 'w') as coordinates_file:
+            coordinates_file.write('id,latitude,longitude\n1,45.0137,-93.1568\n')
+        out = StringIO()
+        call_command('backfill_course_geohash', '--coordinates', path, stdout=out)
+        course = Course.objects.get(pk=1)
+        self.assertEqual(course.latitude, 45.0137)
+        self.assertEqual(course.geohash, geohash.encode(45.0137, -93.1568))
+        self.assertEqual(Course.objects.get(pk=2).geohash, '')
+        self.assertIn('Updated the geohash of 1 courses', out.getvalue())
+
+    def test_fixes_missing_geohash(self):
+        """Check that courses whose coordinates were written without save() get a geohash"""
+        Course.objects.filter(pk=2).update(latitude=45.0087, longitude=-93.0708)
+        call_command('backfill_course_geohash', stdout=StringIO())
+        self.assertEqual(Course.objects.get(pk=2).geohash, geohash.encode(45.0087, -93.0708))
+
+
+class FindDuplicateCoursesCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        Course.objects.create(name='Pebble Beach Golf Links', location='Pebble Beach, CA', num_of_holes="18")
+        Course.objects.create(name='Pebble Beach GL', location='Pebble Beach, CA', num_of_holes="18")
+        Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN', num_of_holes="09")
+
+    def test_reports_cluster(self):
+        """Check that the near duplicate courses are reported as one cluster"""
+        out = StringIO()
+        call_command('find_duplicate_courses', stdout=out)
+        self.assertIn('1: Pebble Beach Golf Links', out.getvalue())
+        self.assertIn('2: Pebble Beach GL', out.getvalue())
+        self.assertNotIn('Cedarholm', out.getvalue())
+        self.assertIn('Found 1 clusters covering 2 of 3 courses', out.getvalue())
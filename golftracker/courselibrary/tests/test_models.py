@@ -1,8 +1,11 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from random import randint
+from unittest.mock import patch
 
 from ..models import Course, Tee, Hole
+from .. import geohash, duplicates
 
 class CourseTestCase(TestCase):
     def setUp(self):
@@ -16,6 +19,71 @@ class CourseTestCase(TestCase):
         cedarholm = Course.objects.get(name='Cedarholm Golf Course')
         self.assertEqual(cedarholm.__str__(), 'Cedarholm Golf Course')
 
+    def test_geohash_follows_coordinates(self):
+        """Test that saving a course sets its geohash from its coordinates
+        and clears it when they are removed"""
+        cedarholm = Course.objects.get(name='Cedarholm Golf Course')
+        self.assertEqual(cedarholm.geohash, '')
+        cedarholm.latitude = 45.0137
+        cedarholm.longitude = -93.1568
+        cedarholm.save(update_fields=['latitude', 'longitude'])
+        self.assertEqual(Course.objects.get(pk=cedarholm.pk).geohash, geohash.encode(45.0137, -93.1568))
+        cedarholm.latitude = None
+        cedarholm.save()
+        self.assertEqual(Course.objects.get(pk=cedarholm.pk).geohash, '')
+
+
+class CourseCanEditAnnotationTestCase(TestCase):
+    def setUp(self):
+        self.regular_user = User.objects.create_user(username='testuser', password='12345')
+        self.other_user = User.objects.create_user(username='testuser2', password='12345')
+        self.staff_user = User.objects.create_user(username='staffuser', password='12345', is_staff=True)
+        Course.objects.create(name='Unverified', creator=self.regular_user, num_of_holes="09")
+        Course.objects.create(name='Verified', creator=self.regular_user, num_of_holes="18", verified=True)
+
+    def can_edit(self, user):
+        return dict(Course.objects.with_can_edit(user).values_list('name', 'can_edit'))
+
+    def test_creator_can_edit_only_unverified_courses(self):
+        """Test that the creator can edit their unverified course but not a verified one"""
+        self.assertEqual(self.can_edit(self.regular_user), {'Unverified': True, 'Verified': False})
+
+    def test_other_user_cannot_edit(self):
+        """Test that a user who didn't create the courses can't edit either"""
+        self.assertEqual(self.can_edit(self.other_user), {'Unverified': False, 'Verified': False})
+
+    def test_staff_can_edit_everything(self):
+        """Test that staff can edit every course"""
+        self.assertEqual(self.can_edit(self.staff_user), {'Unverified': True, 'Verified': True})
+
+    def test_annotation_is_a_single_query(self):
+        """Test that annotating a list of courses doesn't load any creators"""
+        with self.assertNumQueries(1):
+            courses = list(Course.objects.with_can_edit(self.regular_user))
+            [course.can_edit for course in courses]
+
+
+class GeohashTestCase(TestCase):
+    def test_encode_known_value(self):
+        """Test encoding against a published reference geohash"""
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_decode_contains_point(self):
+        """Test that a decoded cell contains the point that was encoded"""
+        (min_lat, max_lat), (min_lon, max_lon) = geohash.decode(geohash.encode(45.0137, -93.1568, 7))
+        self.assertTrue(min_lat <= 45.0137 <= max_lat)
+        self.assertTrue(min_lon <= -93.1568 <= max_lon)
+
+    def test_neighbours_wrap_antimeridian(self):
+        """Test that cells next to the antimeridian have neighbours on the other side"""
+        cells = geohash.neighbours(geohash.encode(0.0, 179.99, 3))
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geohash.encode(0.0, -179.99, 3), cells)
+
+    def test_distance(self):
+        """Test the haversine distance between Minneapolis and St Paul"""
+        self.assertAlmostEqual(geohash.distanceKm(44.9778, -93.2650, 44.9537, -93.0900), 14.0, delta=0.5)
+
 
 class TeeTestCase(TestCase):
     def setUp(self):
@@ -31,6 +99,17 @@ class TeeTestCase(TestCase):
         white = Tee.objects.get(name='White')
         self.assertEqual(white.__str__(), 'White')
 
+    def test_tee_changes_update_course_last_updated(self):
+        """Test that saving or deleting a tee counts as an edit to its course"""
+        cedarholm = Course.objects.get(name='Cedarholm Golf Course')
+        white = Tee.objects.get(name='White')
+        white.slope_rating = 72.0
+        white.save()
+        edited = Course.objects.get(pk=cedarholm.pk).last_updated
+        self.assertGreater(edited, cedarholm.last_updated)
+        white.delete()
+        self.assertGreater(Course.objects.get(pk=cedarholm.pk).last_updated, edited)
+
 
 class HoleTestCase(TestCase):
     def setUp(self):
@@ -48,3 +127,87 @@ class HoleTestCase(TestCase):
         self.assertEqual(hole_3.__str__(), '3')
 
 
+class TeeTotalsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        course = Course.objects.create(name='Dwan Golf Course',
+                                       location='Bloomington, MN',
+                                       creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='White', course=course)
+        for i in range(18):
+            Hole.objects.create(number=i + 1, par=3 if i < 9 else 5, yards=100, tees=self.tee)
+
+    def test_new_tee_has_zero_totals(self):
+        """Test that a tee without holes starts with zeroed totals"""
+        tee = Tee.objects.create(name='Red', course=self.tee.course)
+        self.assertEqual(tee.total_par, 0)
+        self.assertEqual(tee.hole_count, 0)
+
+    def test_update_totals_aggregates_holes(self):
+        """Test that update_totals() stores the totals of the tee's holes"""
+        self.tee.update_totals()
+        tee = Tee.objects.get(pk=self.tee.pk)
+        self.assertEqual(tee.total_par, 72)
+        self.assertEqual(tee.total_yards, 1800)
+        self.assertEqual(tee.front_par, 27)
+        self.assertEqual(tee.back_par, 45)
+        self.assertEqual(tee.hole_count, 18)
+
+    def test_update_totals_uses_one_aggregate_query(self):
+        """Test that recomputing the totals is one aggregate query plus the update
+        and the touch of the course's last_updated"""
+        with self.assertNumQueries(3):
+            self.tee.update_totals()
+
+
+class DuplicateCoursesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pebble = Course.objects.create(name='Pebble Beach Golf Links', location='Pebble Beach, CA',
+                                            num_of_holes="18")
+        Course.objects.create(name='Spyglass Hill Golf Course', location='Pebble Beach, CA', num_of_holes="18")
+        Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN', num_of_holes="09")
+
+    def test_normalize_drops_generic_words(self):
+        """Test that normalizing removes case, accents, punctuation and generic golf words"""
+        self.assertEqual(duplicates.normalize('The Pébble-Beach G.L.'), 'pebble beach')
+
+    def test_finds_abbreviated_name(self):
+        """Test that an abbreviated name suggests the existing course"""
+        matches = duplicates.findDuplicates('Pebble Beach GL', 'Pebble Beach, CA')
+        self.assertEqual([course for score, course in matches], [self.pebble])
+
+    def test_ignores_different_course_at_same_location(self):
+        """Test that sharing a location is not enough to be a duplicate"""
+        self.assertEqual(duplicates.findDuplicates('Poppy Hills', 'Pebble Beach, CA'), [])
+
+    def test_excludes_given_course(self):
+        """Test that a course is not reported as a duplicate of itself"""
+        matches = duplicates.findDuplicates(self.pebble.name, self.pebble.location, exclude_id=self.pebble.id)
+        self.assertEqual(matches, [])
+
+    def test_index_follows_renames(self):
+        """Test that renaming a course replaces its trigrams"""
+        self.pebble.name = 'Cypress Point Club'
+        self.pebble.save()
+        self.assertEqual(duplicates.findDuplicates('Pebble Beach Golf Links', 'Pebble Beach, CA'), [])
+        matches = duplicates.findDuplicates('Cypress Point', 'Pebble Beach, CA')
+        self.assertEqual([course for score, course in matches], [self.pebble])
+
+    def test_candidates_are_limited(self):
+        """Test that only CANDIDATE_LIMIT candidates are scored, so with more look-alikes
+        than that some are left out"""
+        for i in range(3):
+            Course.objects.create(name='Pebble Beach Golf Links', location='Pebble Beach, CA', num_of_holes="18")
+        with patch('courselibrary.duplicates.CANDIDATE_LIMIT', 2):
+            matches = duplicates.findDuplicates('Pebble Beach GL', 'Pebble Beach, CA')
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(len(duplicates.findDuplicates('Pebble Beach GL', 'Pebble Beach, CA')), 4)
+
+    def test_lookup_query_count(self):
+        """Test that a lookup is a frequency count, one grouped candidate query and one
+        query loading the candidates, and the frequencies come from the cache next time"""
+        with self.assertNumQueries(3):
+            duplicates.findDuplicates('Pebble Beach GL', 'Pebble Beach, CA')
+        with self.assertNumQueries(2):
+            duplicates.findDuplicates('Pebble Beach GL', 'Pebble Beach, CA')
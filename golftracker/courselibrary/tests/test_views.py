@@ -1,10 +1,18 @@
 import re
+from random import Random
+from unittest.mock import patch
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.core.cache import cache
 
 from ..models import Course, Tee, Hole
 from ..views import canEditCourse
 from ..forms import CourseCreateForm, CourseUpdateForm, TeeCreateForm, TeeUpdateForm
+from golftracker.pagination import PAGE_SIZE
+from ..caching import cacheStats
+from ..search import nearestCourses
+from .. import geohash, search
 
 
 class CanEditCourseHelperFunctionTestCase(TestCase):
@@ -120,7 +128,7 @@ class CourseListViewTestCase(TestCase):
         response = client.get('/courselibrary/')
         response_courses = response.context['courses']
 
-        self.assertQuerysetEqual(response_courses, courses, ordered=False)
+        self.assertQuerySetEqual(response_courses, courses, ordered=False)
 
     def test_renders_correct_template(self):
         """Check that the correct template is rendered"""
@@ -130,6 +138,206 @@ class CourseListViewTestCase(TestCase):
         response = client.get('/courselibrary/')
         self.assertTemplateUsed(response, 'courselibrary/courselibrary.html')
 
+    def test_courses_are_paginated_by_name(self):
+        """Check that the library is split into pages ordered by name and that
+        following the next cursor returns the rest of the courses"""
+        user = User.objects.get(username='testuser')
+        for i in range(PAGE_SIZE):
+            Course.objects.create(name=f'Course {i:02}', creator=user, num_of_holes="09")
+        client = Client()
+        client.force_login(user)
+        response = client.get('/courselibrary/')
+        first_page = response.context['courses']
+        self.assertEqual(len(first_page), PAGE_SIZE)
+        self.assertEqual(first_page[0].name, 'Cedarholm Golf Course')
+        self.assertTrue(response.context['next_cursor'])
+
+        response = client.get('/courselibrary/', {'after': response.context['next_cursor']})
+        second_page = response.context['courses']
+        self.assertEqual([course.name for course in second_page], [f'Course {PAGE_SIZE - 1}', 'Island Lake Golf Course'])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_invalid_cursor_raises_404(self):
+        """Check that a tampered page cursor returns a 404"""
+        user = User.objects.get(username='testuser')
+        client = Client()
+        client.force_login(user)
+        response = client.get('/courselibrary/', {'after': 'notacursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_does_not_grow_with_courses(self):
+        """Check that a page of courses with tees and holes is loaded in a fixed
+        number of queries (session, user, courses, tees, holes)"""
+        user = User.objects.get(username='testuser')
+        for course in Course.objects.all():
+            for name in ['White', 'Red']:
+                tee = Tee.objects.create(name=name, course=course)
+                for i in range(9):
+                    Hole.objects.create(number=i + 1, par=4, yards=300, tees=tee)
+        client = Client()
+        client.force_login(user)
+        with self.assertNumQueries(5):
+            client.get('/courselibrary/')
+
+    def test_edit_links_follow_can_edit(self):
+        """Check that edit links are only shown on courses the user can edit"""
+        user = User.objects.get(username='testuser')
+        Course.objects.filter(name='Island Lake Golf Course').update(verified=True)
+        client = Client()
+        client.force_login(user)
+        response = client.get('/courselibrary/')
+        can_edit = {course.name: course.can_edit for course in response.context['courses']}
+        self.assertEqual(can_edit, {'Cedarholm Golf Course': True, 'Island Lake Golf Course': False})
+        self.assertContains(response, '/courselibrary/1/edit/')
+        self.assertNotContains(response, '/courselibrary/2/edit/')
+
+    def test_summary_mode_shows_tee_totals(self):
+        """Check that summary mode shows each tee's stored totals"""
+        user = User.objects.get(username='testuser')
+        course = Course.objects.get(name='Cedarholm Golf Course')
+        tee = Tee.objects.create(name='White', course=course)
+        for i in range(9):
+            Hole.objects.create(number=i + 1, par=4, yards=300, tees=tee)
+        tee.update_totals()
+        client = Client()
+        client.force_login(user)
+        response = client.get('/courselibrary/', {'view': 'summary'})
+        summary_tee = response.context['courses'][0].tee_set.all()[0]
+        self.assertTrue(response.context['summary'])
+        self.assertEqual(summary_tee.total_par, 36)
+        self.assertEqual(summary_tee.total_yards, 2700)
+        self.assertEqual(summary_tee.hole_count, 9)
+        self.assertNotContains(response, '1 - Par: 4')
+
+
+class CourseSearchViewTestCase(TestCase):
+    def setUp(self) -> None:
+        user = User.objects.create_user(username='testuser', password='12345')
+        Course.objects.create(name='Pebble Beach Golf Links',
+                        location='Pebble Beach, CA',
+                        creator=user, num_of_holes="18")
+        Course.objects.create(name='Spyglass Hill',
+                        location='Pebble Beach, CA',
+                        creator=user, num_of_holes="18")
+        Course.objects.create(name='Cedarholm Golf Course',
+                        location='Roseville, MN',
+                        creator=user, num_of_holes="09")
+
+    def search(self, query, **params):
+        user = User.objects.get(username='testuser')
+        client = Client()
+        client.force_login(user)
+        return client.get('/courselibrary/search/', {'q': query, **params})
+
+    def test_rejects_unloggedin_user(self):
+        """Check that an unlogged in user is redirected"""
+        client = Client()
+        response = client.get('/courselibrary/search/', {'q': 'pebble'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_renders_correct_template(self):
+        """Check that the correct template is rendered"""
+        response = self.search('pebble')
+        self.assertTemplateUsed(response, 'courselibrary/search.html')
+
+    def test_prefix_query_matches_partial_words(self):
+        """Check that partially typed words match as prefixes"""
+        response = self.search('cedar gol')
+        names = [course.name for course in response.context['courses']]
+        self.assertEqual(names, ['Cedarholm Golf Course'])
+
+    def test_name_matches_rank_above_location_matches(self):
+        """Check that a course whose name matches ranks above one that
+        only matches on location"""
+        response = self.search('pebble')
+        names = [course.name for course in response.context['courses']]
+        self.assertEqual(names, ['Pebble Beach Golf Links', 'Spyglass Hill'])
+
+    def test_query_syntax_is_ignored(self):
+        """Check that FTS operators and punctuation in the query don't cause errors"""
+        response = self.search('"spyglass"* (hil:')
+        names = [course.name for course in response.context['courses']]
+        self.assertEqual(names, ['Spyglass Hill'])
+
+    def test_index_follows_course_updates_and_deletes(self):
+        """Check that the search index is kept in sync when a course is
+        renamed or deleted"""
+        course = Course.objects.get(name='Spyglass Hill')
+        course.name = 'Poppy Hills'
+        course.save()
+        self.assertFalse(self.search('spyglass').context['courses'])
+        self.assertEqual(self.search('poppy').context['courses'], [course])
+        course.delete()
+        self.assertFalse(self.search('poppy').context['courses'])
+
+    def test_json_format_returns_results(self):
+        """Check that the as-you-type json format returns the matches"""
+        response = self.search('spy', format='json')
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['name'], 'Spyglass Hill')
+        self.assertEqual(results[0]['url'], '/courselibrary/2/')
+
+    def test_falls_back_to_icontains_without_fts(self):
+        """Check that search still works on databases without the FTS5 index"""
+        with patch('courselibrary.search.ftsAvailable', return_value=False):
+            response = self.search('beach')
+        names = [course.name for course in response.context['courses']]
+        self.assertEqual(names, ['Pebble Beach Golf Links', 'Spyglass Hill'])
+
+    def test_fts_check_is_per_database(self):
+        """Check that the answer remembered for another database, like the one the test
+        database replaced, isn't used for this one"""
+        with patch.dict(search._available, {('default', 'other.sqlite3'): False}, clear=True):
+            self.assertTrue(search.ftsAvailable())
+
+
+class CourseNearbyViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_returns_nearest_courses_in_order(self):
+        """Check that the closest courses are returned nearest first with distances"""
+        Course.objects.create(name='Cedarholm Golf Course', num_of_holes="09",
+                              latitude=45.0137, longitude=-93.1568)
+        Course.objects.create(name='Keller Golf Course', num_of_holes="18",
+                              latitude=45.0087, longitude=-93.0708)
+        Course.objects.create(name='Pebble Beach Golf Links', num_of_holes="18",
+                              latitude=36.5684, longitude=-121.9500)
+        Course.objects.create(name='No Coordinates', num_of_holes="18")
+        response = self.client.get('/courselibrary/nearby/', {'lat': '45.01', 'lon': '-93.15', 'k': '2'})
+        results = response.json()['results']
+        self.assertEqual([result['name'] for result in results], ['Cedarholm Golf Course', 'Keller Golf Course'])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+
+    def test_matches_brute_force(self):
+        """Check that the cell search finds the same courses as ranking every course"""
+        rng = Random(8)
+        for i in range(300):
+            Course.objects.create(name=f'Course {i}', num_of_holes="18",
+                                  latitude=rng.uniform(40, 50), longitude=rng.uniform(-100, -85))
+        for _ in range(10):
+            latitude, longitude = rng.uniform(40, 50), rng.uniform(-100, -85)
+            expected = sorted(Course.objects.all(),
+                              key=lambda course: geohash.distanceKm(latitude, longitude, course.latitude, course.longitude))[:5]
+            found = [course for distance, course in nearestCourses(latitude, longitude, 5)]
+            self.assertEqual(found, expected)
+
+    def test_returns_all_courses_when_fewer_than_k(self):
+        """Check that the search falls back to every located course when there aren't k nearby"""
+        Course.objects.create(name='Pebble Beach Golf Links', num_of_holes="18",
+                              latitude=36.5684, longitude=-121.9500)
+        response = self.client.get('/courselibrary/nearby/', {'lat': '-33.9', 'lon': '151.2'})
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_rejects_bad_coordinates(self):
+        """Check that missing or out of range parameters return 400"""
+        self.assertEqual(self.client.get('/courselibrary/nearby/', {'lat': '45'}).status_code, 400)
+        self.assertEqual(self.client.get('/courselibrary/nearby/', {'lat': '95', 'lon': '0'}).status_code, 400)
+        self.assertEqual(self.client.get('/courselibrary/nearby/', {'lat': '45', 'lon': '0', 'k': '500'}).status_code, 400)
+
 
 class CourseCreateTestCase(TestCase):
     def setUp(self) -> None:
@@ -194,6 +402,35 @@ class CourseCreateTestCase(TestCase):
         self.assertEqual(response.url, '/courselibrary/1/edit/')
 
 
+class CourseCreateDuplicateTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.existing = Course.objects.create(name='Pebble Beach Golf Links', location='Pebble Beach, CA',
+                                              num_of_holes="18")
+
+    def test_suggests_existing_course(self):
+        """Check that creating a likely duplicate re-renders the form with the existing course suggested"""
+        response = self.client.post('/courselibrary/create/', {'name': 'Pebble Beach GL',
+                                                               'location': 'Pebble Beach, CA',
+                                                               'num_of_holes': '18'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].duplicates, [self.existing])
+        self.assertContains(response, '/courselibrary/1/')
+        self.assertEqual(Course.objects.count(), 1)
+
+    def test_confirmed_new_course_is_created(self):
+        """Check that confirming the course is different creates it anyway"""
+        response = self.client.post('/courselibrary/create/', {'name': 'Pebble Beach GL',
+                                                               'location': 'Pebble Beach, CA',
+                                                               'num_of_holes': '18',
+                                                               'not_duplicate': 'on'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Course.objects.filter(name='Pebble Beach GL').exists())
+
+
 class CourseDetailsViewTestCase(TestCase):
     def setUp(self) -> None:
         user = User.objects.create(username='testuser', password='12345')
@@ -232,6 +469,147 @@ class CourseDetailsViewTestCase(TestCase):
         self.assertEqual(response.context["course"], course)
 
 
+class CourseDetailsCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Cedarholm Golf Course',
+                location='Roseville, MN',
+                creator=self.user, num_of_holes="09")
+        self.tee = Tee.objects.create(name='White', course=self.course)
+        for i in range(9):
+            Hole.objects.create(number=i + 1, par=3, yards=100, tees=self.tee)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_second_request_is_served_from_cache(self):
+        """Check that once cached, the course page only queries the session and user"""
+        self.client.get('/courselibrary/1/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/courselibrary/1/')
+        self.assertContains(response, '9 - Par: 3 - Yards: 100')
+        self.assertEqual(cacheStats(), {'hits': 2, 'misses': 2})
+
+    def test_hole_edit_invalidates_cached_scorecard(self):
+        """Check that changing a hole shows up on the next request"""
+        self.client.get('/courselibrary/1/')
+        hole = Hole.objects.get(number=9)
+        hole.yards = 150
+        hole.save()
+        response = self.client.get('/courselibrary/1/')
+        self.assertContains(response, '9 - Par: 3 - Yards: 150')
+
+    def test_tee_edit_view_invalidates_cached_scorecard(self):
+        """Check that bulk hole updates through teeEdit show up on the next request"""
+        self.client.get('/courselibrary/1/')
+        payload = {'name': 'Blue', 'course_rating': '', 'slope_rating': '',
+                   'form-TOTAL_FORMS': '9', 'form-INITIAL_FORMS': '9'}
+        for i, hole in enumerate(Hole.objects.order_by('number')):
+            payload[f'form-{i}-id'] = str(hole.id)
+            payload[f'form-{i}-par'] = '4'
+            payload[f'form-{i}-yards'] = '100'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/courselibrary/1/edittee/', payload)
+        response = self.client.get('/courselibrary/1/')
+        self.assertContains(response, 'Blue')
+        self.assertContains(response, '9 - Par: 4 - Yards: 100')
+
+    def test_cached_course_has_no_user_row(self):
+        """Check that the cached course holds the creator's username, not their whole user"""
+        response = self.client.get('/courselibrary/1/')
+        course = response.context['course']
+        self.assertFalse(Course.creator.is_cached(course))
+        self.assertEqual(course.creator_username, 'testuser')
+        self.assertContains(response, 'Creator: testuser')
+
+    def test_conditional_request_skips_building_course(self):
+        """Check that a 304 for a course that isn't cached only loads its validator fields
+        and doesn't build or cache the course and scorecard"""
+        etag = self.client.get('/courselibrary/1/')['ETag']
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get('/courselibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(cacheStats(), {'hits': 0, 'misses': 0})
+
+    def test_course_delete_removes_cached_page(self):
+        """Check that a deleted course is no longer served from the cache"""
+        self.client.get('/courselibrary/1/')
+        self.course.delete()
+        response = self.client.get('/courselibrary/1/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_stats_are_staff_only(self):
+        """Check that the cache statistics are only available to staff"""
+        response = self.client.get('/courselibrary/cache-stats/')
+        self.assertEqual(response.status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get('/courselibrary/1/')
+        response = self.client.get('/courselibrary/cache-stats/')
+        self.assertEqual(response.json(), {'hits': 0, 'misses': 2})
+
+
+class CourseDetailsConditionalGetTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course',
+                location='Roseville, MN',
+                creator=self.user, num_of_holes="09")
+        self.tee = Tee.objects.create(name='White', course=course)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_response_has_validators(self):
+        """Check that the course page is sent with an ETag and no Last-Modified, which
+        couldn't tell two edits in the same second or two users apart"""
+        response = self.client.get('/courselibrary/1/')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_unchanged_course_returns_304(self):
+        """Check that a client holding the current page gets a 304 without the
+        template being rendered"""
+        etag = self.client.get('/courselibrary/1/')['ETag']
+        response = self.client.get('/courselibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, 'courselibrary/detail.html')
+
+    def test_tee_edit_changes_etag(self):
+        """Check that editing a tee moves the course's last_updated and etag"""
+        etag = self.client.get('/courselibrary/1/')['ETag']
+        self.tee.name = 'Blue'
+        self.tee.save()
+        response = self.client.get('/courselibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_between_users(self):
+        """Check that a different user doesn't get another user's cached page"""
+        etag = self.client.get('/courselibrary/1/')['ETag']
+        other = User.objects.create(username='otheruser', password='12345')
+        client = Client()
+        client.force_login(other)
+        response = client.get('/courselibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_becoming_staff_changes_etag(self):
+        """Check that a user made staff, who can now edit a verified course, gets the page with the edit links"""
+        Course.objects.filter(pk=1).update(verified=True)
+        etag = self.client.get('/courselibrary/1/')['ETag']
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/courselibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['can_edit'])
+
+    def test_if_modified_since_alone_is_not_enough(self):
+        """Check that a client only sending If-Modified-Since always gets the page"""
+        response = self.client.get('/courselibrary/1/', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+
 class CourseEditViewTestCase(TestCase):
     def setUp(self) -> None:
         user = User.objects.create(username='testuser', password='12345')
@@ -458,6 +836,9 @@ class TeeCreateViewTestCase(TestCase):
             self.assertEqual(hole.number, i + 1)
             self.assertEqual(hole.par, 3)
             self.assertEqual(hole.yards, (i + 1) * 10)
+        self.assertEqual(tee.total_par, 27)
+        self.assertEqual(tee.total_yards, 450)
+        self.assertEqual(tee.hole_count, 9)
 
 
     def test_successful_post_redirects_to_correct_url(self):
@@ -594,6 +975,10 @@ class teeEditViewTestCase(TestCase):
             self.assertEqual(hole.number, i + 1)
             self.assertEqual(hole.par, 4)
             self.assertEqual(hole.yards, (i + 1) * 20)
+        self.assertEqual(tee.total_par, 36)
+        self.assertEqual(tee.total_yards, 900)
+        self.assertEqual(tee.front_par, 36)
+        self.assertEqual(tee.back_par, 0)
 
     def test_successful_post_redirects_to_correct_url(self):
         """Check that a successful post redirects to the correct url"""
@@ -635,6 +1020,87 @@ class teeEditViewTestCase(TestCase):
             self.assertEqual(hole.yards, (i + 1) * 10)
 
 
+class TeeWriteQueryCountTestCase(TestCase):
+    """Benchmarks for the number of queries it takes to save an 18 hole scorecard.
+    Saving each hole individually took 1 tee insert + 18 hole inserts + 2 queries to
+    recompute the totals when creating (~25 per request), and 18 hole lookups + 18
+    hole updates when editing (~45 per request). Both paths now write the tee and
+    all of its holes in two statements inside one transaction"""
+
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Dwan Golf Course',
+                location='Bloomington, MN',
+                creator=self.user, num_of_holes="18")
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def payload(self, par, initial=0, ids=None):
+        payload = {'name': 'White', 'course_rating': '70.1', 'slope_rating': '125.0',
+                   'form-TOTAL_FORMS': '18', 'form-INITIAL_FORMS': str(initial)}
+        for i in range(18):
+            if ids:
+                payload[f'form-{i}-id'] = str(ids[i])
+            payload[f'form-{i}-par'] = str(par)
+            payload[f'form-{i}-yards'] = '400'
+        return payload
+
+    def test_tee_create_query_count(self):
+        """Session, user, course with its edit permission, then the tee insert, the touch
+        of the course's last_updated and a single bulk insert of the holes wrapped in a savepoint.
+        The writes are the ~3 statements the scorecard targets, the rest is per request lookups
+        and the savepoint, which is a BEGIN/COMMIT pair outside of tests"""
+        with self.assertNumQueries(8):
+            response = self.client.post('/courselibrary/1/newtee/', self.payload(4))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Hole.objects.count(), 18)
+        self.assertEqual(Tee.objects.get(name='White').total_par, 72)
+
+    def test_tee_edit_query_count(self):
+        """Session, user, tee with its course, the current holes, then the tee update,
+        the touch of the course's last_updated and a single bulk update of the holes
+        wrapped in a savepoint. As with creating, only the last three are scorecard writes"""
+        tee = Tee.objects.create(name='White', course=self.course)
+        holes = Hole.objects.bulk_create([Hole(number=i + 1, par=4, yards=400, tees=tee) for i in range(18)])
+        with self.assertNumQueries(9):
+            response = self.client.post(f'/courselibrary/{tee.id}/edittee/',
+                                        self.payload(3, initial=18, ids=[hole.id for hole in holes]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(Hole.objects.values_list('par', flat=True)), {3})
+        self.assertEqual(Tee.objects.get(pk=tee.id).total_par, 54)
+
+    def test_incomplete_scorecard_saves_nothing(self):
+        """Check that a scorecard with a missing hole is rejected as a whole"""
+        payload = self.payload(4)
+        del payload['form-17-par']
+        response = self.client.post('/courselibrary/1/newtee/', payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Tee.objects.exists())
+        self.assertFalse(Hole.objects.exists())
+
+    def test_short_edit_formset_is_rejected(self):
+        """Check that an edit posting fewer holes than the tee has saves nothing, so the
+        totals are never computed from part of the scorecard"""
+        tee = Tee.objects.create(name='White', course=self.course)
+        holes = Hole.objects.bulk_create([Hole(number=i + 1, par=4, yards=400, tees=tee) for i in range(18)])
+        tee.set_totals(holes)
+        tee.save()
+        payload = self.payload(3, initial=18, ids=[hole.id for hole in holes])
+        payload['form-TOTAL_FORMS'] = '9'
+        payload['form-INITIAL_FORMS'] = '9'
+        response = self.client.post(f'/courselibrary/{tee.id}/edittee/', payload)
+        self.assertContains(response, 'Every hole of the scorecard must be submitted.')
+        self.assertEqual(set(Hole.objects.values_list('par', flat=True)), {4})
+        self.assertEqual(Tee.objects.get(pk=tee.id).total_par, 72)
+
+    def test_failed_hole_write_rolls_back_tee(self):
+        """Check that the tee isn't left behind when writing the holes fails"""
+        with patch('courselibrary.views.Hole.objects.bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/courselibrary/1/newtee/', self.payload(4))
+        self.assertFalse(Tee.objects.exists())
+
+
 class teeDeleteViewTestCase(TestCase):
     def setUp(self) -> None:
         user = User.objects.create(username='testuser', password='12345')
@@ -4,7 +4,10 @@ from . import views
 app_name = "courselibrary"
 urlpatterns = [
     path('', views.courseList, name='courselibrary'),
+    path('search/', views.courseSearch, name='search'),
+    path('nearby/', views.courseNearby, name='nearby'),
     path('create/', views.courseCreate, name='create'),
+    path('cache-stats/', views.courseCacheStats, name='cache-stats'),
     path('<int:course_id>/', views.courseDetails, name='detail'),
     path('<int:course_id>/edit/', views.courseEdit, name='edit'),
     path('<int:course_id>/delete/', views.courseDelete, name='delete'),
@@ -1,13 +1,19 @@
 from django.shortcuts import render, redirect
 from django.urls import reverse
-from django.http import Http404
+from django.http import Http404, JsonResponse
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.forms import modelformset_factory
+from django.db.models import Prefetch
 
+from golftracker.conditional import conditionalResponse
+from golftracker.pagination import keysetPage
 from .models import Course, Tee, Hole
-from .forms import CourseUpdateForm, TeeUpdateForm, CourseCreateForm, TeeCreateForm
+from .search import searchCourses, nearestCourses, NEARBY_LIMIT
+from .caching import getCourseDetail, peekCourse, cacheStats
+from .forms import CourseUpdateForm, TeeUpdateForm, CourseCreateForm, TeeCreateForm, BaseHoleFormSet
 
 
 #HELPER FUNCTIONS
@@ -17,23 +23,79 @@ def canEditCourse(user, course) -> bool:
         1. Created the course and the course isn't verified
         2. Are a staff member '''
     
-    creator = course.creator
+    #Compare ids so checking doesn't load the creator
     is_staff = user.is_staff
     if course.verified:
         return is_staff
     else:
-        return creator == user or is_staff
+        return course.creator_id == user.pk or is_staff
 
 
 #VIEWS
 
 @login_required
 def courseList(request):
-    courses = Course.objects.all()
-    context = {"courses": courses}
+    summary = request.GET.get('view') == 'summary'
+    if summary:
+        #Summary mode only needs the stored per tee totals, so holes aren't loaded at all
+        courses = Course.objects.prefetch_related(Prefetch('tee_set', queryset=Tee.objects.order_by('id')))
+    else:
+        courses = Course.objects.prefetch_related(
+            Prefetch('tee_set', queryset=Tee.objects.order_by('id')),
+            Prefetch('tee_set__hole_set', queryset=Hole.objects.order_by('number')),
+        )
+
+    courses, next_cursor = keysetPage(courses.with_can_edit(request.user), ['name', 'id'], request.GET.get('after'))
+    context = {
+        "courses": courses,
+        "next_cursor": next_cursor,
+        "summary": summary,
+        "first_page": not request.GET.get('after'),
+    }
     return render(request, 'courselibrary/courselibrary.html', context)
 
 
+@login_required
+def courseSearch(request):
+    query = request.GET.get('q', '').strip()
+    courses = searchCourses(query) if query else []
+
+    #Lightweight response for as-you-type lookups
+    if request.GET.get('format') == 'json':
+        results = [{'id': course.id,
+                    'name': course.name,
+                    'location': course.location,
+                    'url': reverse('courselibrary:detail', kwargs={ 'course_id': course.id })}
+                   for course in courses]
+        return JsonResponse({'query': query, 'results': results})
+
+    context = {
+        'query': query,
+        'courses': courses,
+    }
+    return render(request, 'courselibrary/search.html', context)
+
+
+@login_required
+def courseNearby(request):
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        k = int(request.GET.get('k', 10))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lon are required numbers, k must be an integer'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 1 <= k <= NEARBY_LIMIT):
+        return JsonResponse({'error': f'lat, lon or k out of range, k can be at most {NEARBY_LIMIT}'}, status=400)
+
+    results = [{'id': course.id,
+                'name': course.name,
+                'location': course.location,
+                'distance_km': round(distance, 2),
+                'url': reverse('courselibrary:detail', kwargs={ 'course_id': course.id })}
+               for distance, course in nearestCourses(latitude, longitude, k)]
+    return JsonResponse({'results': results})
+
+
 @login_required
 def courseCreate(request):
     if request.method == 'POST':
@@ -54,22 +116,41 @@ def courseCreate(request):
 
 @login_required
 def courseDetails(request, course_id):
-    try:
-        course = Course.objects.get(pk=course_id)
-    except Course.DoesNotExist:
+    #The validator only needs last_updated and the edit permission, the course and its
+    #scorecard are only built when the page has to be sent
+    course = peekCourse(course_id)
+    if course is None:
         raise Http404("Course does not exist")
-    return render(request, 'courselibrary/detail.html', {'course': course})
+
+    #The edit links depend on the user and whether they can edit, which staff status changes too
+    can_edit = canEditCourse(request.user, course)
+    etag = f'course-{course.id}-{course.last_updated.timestamp()}-{request.user.pk}-{int(can_edit)}'
+
+    def renderDetail():
+        course, scorecard = getCourseDetail(course_id)
+        if course is None:
+            raise Http404("Course does not exist")
+        return render(request, 'courselibrary/detail.html',
+                      {'course': course, 'scorecard': scorecard, 'can_edit': can_edit})
+    return conditionalResponse(request, etag, renderDetail)
+
+
+@login_required
+def courseCacheStats(request):
+    if not request.user.is_staff:
+        raise PermissionDenied()
+    return JsonResponse(cacheStats())
 
 
 
 @login_required
 def courseEdit(request, course_id):
     try:
-        course = Course.objects.get(pk=course_id)
+        course = Course.objects.with_can_edit(request.user).get(pk=course_id)
         tees = Tee.objects.filter(course=course)
     except Course.DoesNotExist:
         raise Http404("Course does not exist")
-    if canEditCourse(request.user, course) == False:
+    if course.can_edit == False:
         raise PermissionDenied()
 
     if request.method == 'POST':
@@ -93,10 +174,10 @@ def courseEdit(request, course_id):
 @login_required
 def courseDelete(request, course_id):
     try:
-        course = Course.objects.get(pk=course_id)
+        course = Course.objects.with_can_edit(request.user).get(pk=course_id)
     except Course.DoesNotExist:
         raise Http404("Course does not exist")
-    if canEditCourse(request.user, course) == False:
+    if course.can_edit == False:
         raise PermissionDenied()
 
     if request.method == "POST":
@@ -109,27 +190,33 @@ def courseDelete(request, course_id):
 @login_required
 def teeCreate(request, course_id):
     try:
-        course = Course.objects.get(pk=course_id)
+        course = Course.objects.with_can_edit(request.user).get(pk=course_id)
     except Course.DoesNotExist:
         raise Http404("Course does not exist")
-    if canEditCourse(request.user, course) == False:
+    if course.can_edit == False:
         raise PermissionDenied()
     
     num_holes = int(course.num_of_holes)
-    HoleFormset = modelformset_factory(Hole, fields=('par', 'yards'), extra=num_holes)
+    #Every hole on the scorecard must be filled in before anything is saved
+    HoleFormset = modelformset_factory(Hole, formset=BaseHoleFormSet, fields=('par', 'yards'), extra=0,
+                                       min_num=num_holes, validate_min=True,
+                                       max_num=num_holes, validate_max=True)
 
     if request.method == 'POST':
         form = TeeCreateForm(request.POST)
         hole_formset = HoleFormset(request.POST, queryset=Hole.objects.none())
         if form.is_valid() and hole_formset.is_valid():
-            form.instance.course = course
-            form.save()
-
             hole_instances = hole_formset.save(commit=False)
             for i, hole_instance in enumerate(hole_instances):
                 hole_instance.number = i + 1
-                hole_instance.tees = form.instance
-                hole_instance.save()
+
+            with transaction.atomic():
+                form.instance.course = course
+                form.instance.set_totals(hole_instances)
+                form.save()
+                for hole_instance in hole_instances:
+                    hole_instance.tees = form.instance
+                Hole.objects.bulk_create(hole_instances)
 
             messages.success(request, f'Tee successfully created.')
             return redirect(reverse('courselibrary:edit', kwargs={ 'course_id': course.id }))
@@ -149,7 +236,7 @@ def teeCreate(request, course_id):
 @login_required
 def teeEdit(request, tee_id):
     try:
-        tee = Tee.objects.get(pk=tee_id)
+        tee = Tee.objects.select_related('course').get(pk=tee_id)
         course = tee.course
     except Course.DoesNotExist:
         raise Http404("Course does not exist")
@@ -158,19 +245,27 @@ def teeEdit(request, tee_id):
     if canEditCourse(request.user, course) == False:
         raise PermissionDenied()
     
-    HoleFormset = modelformset_factory(Hole, fields=('par', 'yards'), extra=0)
+    HoleFormset = modelformset_factory(Hole, formset=BaseHoleFormSet, fields=('par', 'yards'),
+                                       extra=0, edit_only=True)
+    holes = Hole.objects.filter(tees=tee).order_by('number')
 
     if request.method == 'POST':
         form = TeeUpdateForm(request.POST, instance=tee)
-        hole_formset = HoleFormset(request.POST, queryset=Hole.objects.filter(tees=tee))
+        hole_formset = HoleFormset(request.POST, queryset=holes)
         if form.is_valid() and hole_formset.is_valid():
-            form.save()
-            hole_formset.save()
+            changed_holes = hole_formset.save(commit=False)
+            #Validated forms hold the posted values, so the totals come from memory
+            tee.set_totals(hole_form.instance for hole_form in hole_formset.forms)
+
+            with transaction.atomic():
+                form.save()
+                if changed_holes:
+                    Hole.objects.bulk_update(changed_holes, ['par', 'yards'])
             messages.success(request, f'Tee successfully update.')
             return redirect(reverse('courselibrary:edit', kwargs={ 'course_id': course.id }))
     else:
         form = TeeUpdateForm(instance=tee)
-        hole_formset = HoleFormset(queryset=Hole.objects.filter(tees=tee))
+        hole_formset = HoleFormset(queryset=holes)
 
     context = {
         'tee': tee,
@@ -185,7 +280,7 @@ def teeEdit(request, tee_id):
 @login_required
 def teeDelete(request, tee_id):
     try:
-        tee = Tee.objects.get(pk=tee_id)
+        tee = Tee.objects.select_related('course').get(pk=tee_id)
         course = tee.course
     except Course.DoesNotExist:
         raise Http404("Course does not exist")
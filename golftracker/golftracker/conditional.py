@@ -0,0 +1,21 @@
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+
+def conditionalResponse(request, etag, render):
+    ''' Answer with 304 Not Modified when the client's copy still matches the etag, otherwise
+        call render() for the full response. Either way the response carries the etag so the
+        client can revalidate next time. Pages are per user, so they are marked private and
+        must always be revalidated. They have no Last-Modified, which is only precise to the
+        second and can't tell users apart, so everything the page depends on goes in the etag '''
+    etag = quote_etag(etag)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render()
+
+    if request.method in ('GET', 'HEAD'):
+        if not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+
+#Files under these folders are named by the hash of their content, so they never change
+IMMUTABLE_PREFIXES = ('avatars/',)
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def mediaEtag(stat) -> str:
+    ''' Validator of a stored file from its modification time and size, like the ones front servers use '''
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def byteRange(header, size):
+    ''' (first, last) byte positions asked for by a Range header, or None to send the whole file
+        when there is no single range in it. Raises RangeNotSatisfiable when the range starts
+        past the end of the file '''
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None:
+        #Malformed or several ranges, which the whole file also answers
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        #The last n bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _readRange(path, first, length):
+    with open(path, 'rb') as file:
+        file.seek(first)
+        while length > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _patchCaching(response, name, etag, modified) -> None:
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(modified)
+    if name.startswith(IMMUTABLE_PREFIXES):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        #Other media isn't named by its content, so clients check back each time
+        patch_cache_control(response, public=True, no_cache=True)
+
+
+def _fileResponse(request, name, path, stat, content_type):
+    if settings.MEDIA_ACCEL_REDIRECT:
+        #The proxy answers ranges itself, the body and its length come from it
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + quote(name)
+        return response
+    if settings.MEDIA_X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Sendfile'] = path
+        return response
+
+    header = request.headers.get('Range')
+    #A range only applies to the copy the client has when If-Range still matches it
+    if_range = request.headers.get('If-Range')
+    if header and (if_range is None or if_range == mediaEtag(stat)):
+        try:
+            requested = byteRange(header, stat.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if requested is not None:
+            first, last = requested
+            response = StreamingHttpResponse(_readRange(path, first, last - first + 1),
+                                             status=206, content_type=content_type)
+            response.headers['Content-Length'] = last - first + 1
+            response.headers['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+            response.headers['Accept-Ranges'] = 'bytes'
+            return response
+
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serveMedia(request, path):
+    ''' Serve a file from MEDIA_ROOT with validators and cache headers, answering conditional and
+        range requests. Hands the file to the front server instead when one is configured '''
+    name = os.path.normpath(path).replace('\\', '/').lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+
+    etag = mediaEtag(stat)
+    modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = _fileResponse(request, name, full_path, stat, content_type or 'application/octet-stream')
+    if response.status_code != 416:
+        _patchCaching(response, name, etag, modified)
+    return response
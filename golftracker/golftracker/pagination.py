@@ -0,0 +1,71 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+PAGE_SIZE = 25
+
+
+def _jsonDefault(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot encode {type(value).__name__} in a page cursor')
+
+
+def encodeCursor(values) -> str:
+    ''' Pack the ordering values of the last row on a page into an opaque url safe token '''
+    raw = json.dumps(values, default=_jsonDefault, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decodeCursor(model, fields, cursor) -> list:
+    ''' Unpack a token made by encodeCursor() back into python values for the given model fields.
+        Raises Http404 if the token has been tampered with or doesn't match the fields '''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        raise Http404("Invalid page")
+
+
+def _afterCursor(ordering, values) -> Q:
+    ''' Build the row comparison (a, b) > (x, y) as (a > x) OR (a = x AND b > y),
+        flipping the comparison for descending fields '''
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def keysetPage(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    ''' Return one page of the queryset and the cursor for the page after it.
+        The ordering must end in a unique field (normally the primary key) so that
+        every row has a distinct position. The next cursor is None on the last page '''
+    fields = [field.lstrip('-') for field in ordering]
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decodeCursor(queryset.model, fields, cursor)
+        queryset = queryset.filter(_afterCursor(ordering, values))
+
+    #Fetch one extra row to find out if there is another page without a COUNT query
+    objects = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(objects) > page_size:
+        objects = objects[:page_size]
+        last = objects[-1]
+        next_cursor = encodeCursor([getattr(last, queryset.model._meta.get_field(field).attname)
+                                    for field in fields])
+    return objects, next_cursor
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from django.db import connections
+
+
+#Statements longer than this are cut short in the log line and assertion messages
+SQL_PREVIEW_LENGTH = 200
+SLOWEST_QUERIES = 3
+REPEATED_QUERIES = 5
+#Lists of placeholders, like the ones prefetching uses for its IN clauses, differ only in length
+PLACEHOLDER_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(sql) -> str:
+    ''' Short hash of a statement with its placeholder lists collapsed, so one query run
+        again with different parameters has the same fingerprint '''
+    normalized = WHITESPACE_RE.sub(' ', PLACEHOLDER_LIST_RE.sub('(...)', sql)).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def _preview(sql) -> str:
+    return sql if len(sql) <= SQL_PREVIEW_LENGTH else sql[:SQL_PREVIEW_LENGTH] + '...'
+
+
+class QueryRecorder(ContextDecorator):
+    ''' Records every statement run on this thread's database connections, with how long it
+        took, while it is entered '''
+
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        #Started afresh each time, a decorated test may run more than once
+        self.queries = []
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        return False
+
+    def _record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duration(self) -> float:
+        return sum(seconds for sql, seconds in self.queries)
+
+    def repeated(self) -> list:
+        ''' (fingerprint, times run, statement) of every query run more than once, most run first '''
+        statements = {}
+        counts = Counter()
+        for sql, seconds in self.queries:
+            key = fingerprint(sql)
+            statements.setdefault(key, sql)
+            counts[key] += 1
+        return [(key, times, statements[key]) for key, times in counts.most_common() if times > 1]
+
+    def slowest(self, limit=SLOWEST_QUERIES) -> list:
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+class QueryInstrumentationMiddleware:
+    ''' Counts and times the queries of each request, reporting them in a Server-Timing
+        header and a JSON log line on the golftracker.queries logger. The line is a warning
+        when the request repeated a query, which is how an N+1 shows up '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        repeated = recorder.repeated()
+        timing = f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries, {len(repeated)} repeated"'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response.headers['Server-Timing'] = timing
+
+        level = logging.WARNING if repeated else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'db_ms': round(recorder.duration * 1000, 1),
+                'repeated': [{'fingerprint': key, 'count': times, 'sql': _preview(sql)}
+                             for key, times, sql in repeated[:REPEATED_QUERIES]],
+                'slowest': [{'ms': round(seconds * 1000, 1), 'sql': _preview(sql)}
+                            for sql, seconds in recorder.slowest()],
+            }))
+        return response
+
+
+class queryBudget(QueryRecorder):
+    ''' Test helper failing when the block or test it wraps runs more than max_queries queries.
+        The message lists the repeated queries, which is where an N+1 shows up. Use it as
+        `with queryBudget(8): client.get(url)` or to decorate a test method '''
+
+    def __init__(self, max_queries):
+        super().__init__()
+        self.max_queries = max_queries
+
+    def __exit__(self, exc_type, *exc_info):
+        super().__exit__(exc_type, *exc_info)
+        if exc_type is None and self.count > self.max_queries:
+            repeated = ''.join(f'\n  {times}x {_preview(sql)}' for key, times, sql in self.repeated())
+            raise AssertionError(f'{self.count} queries run, over the budget of {self.max_queries}.'
+                                 + (f' Repeated:{repeated}' if repeated else ''))
+        return False
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First so the queries of every other middleware are counted too
+    'golftracker.queries.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +88,52 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Use a shared backend such as Redis or Memcached in production so every worker sees
+# the same course versions and cache statistics
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'golftracker',
+        # Room for the course trigram frequencies as well as cached course pages
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    }
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.0/topics/logging/
+# QueryInstrumentationMiddleware logs one JSON line per request with its query count and time,
+# at WARNING for requests repeating a query and INFO for the others. Set QUERY_LOG_LEVEL=INFO
+# in the environment to see every request
+
+QUERY_LOG_LEVEL = os.environ.get('QUERY_LOG_LEVEL', 'WARNING')
+# Kept out of the test runner's output, tests checking the lines capture them with assertLogs
+if sys.argv[1:2] == ['test']:
+    QUERY_LOG_LEVEL = 'CRITICAL'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'golftracker.queries': {
+            'handlers': ['console'],
+            'level': QUERY_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -123,6 +172,12 @@ STATIC_URL = 'static/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# Media files are served by golftracker.media.serveMedia. Behind a front server, set one of
+# these so it sends the file bytes instead of a Python worker:
+# the internal location nginx serves MEDIA_ROOT from, answered with X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT = None
+# or True for servers supporting X-Sendfile such as Apache's mod_xsendfile
+MEDIA_X_SENDFILE = False
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
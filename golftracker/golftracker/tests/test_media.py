@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from django.test import TestCase, Client, override_settings
+
+from ..media import byteRange, RangeNotSatisfiable
+
+
+class ServeMediaTestCase(TestCase):
+    def setUp(self) -> None:
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        os.makedirs(os.path.join(self.media, 'avatars/ab/abcd'))
+        os.makedirs(os.path.join(self.media, 'profile_pics'))
+        with open(os.path.join(self.media, 'avatars/ab/abcd/64.webp'), 'wb') as file:
+            file.write(b'0123456789')
+        with open(os.path.join(self.media, 'profile_pics/photo.jpeg'), 'wb') as file:
+            file.write(b'jpeg bytes')
+        self.client = Client()
+
+    def test_hashed_files_are_immutable(self):
+        """Check that content hashed files are cached for a year as immutable and other
+        media files must be revalidated"""
+        response = self.client.get('/media/avatars/ab/abcd/64.webp')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        response = self.client.get('/media/profile_pics/photo.jpeg')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_matching_etag_is_not_modified(self):
+        """Check that a request with the current ETag gets 304 with the cache headers"""
+        etag = self.client.get('/media/avatars/ab/abcd/64.webp')['ETag']
+        response = self.client.get('/media/avatars/ab/abcd/64.webp', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get('/media/avatars/ab/abcd/64.webp', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_byte_ranges(self):
+        """Check that a single byte range is answered with 206 and just those bytes, and one
+        past the end of the file with 416"""
+        response = self.client.get('/media/avatars/ab/abcd/64.webp', headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+
+        response = self.client.get('/media/avatars/ab/abcd/64.webp', headers={'Range': 'bytes=20-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        #A range for an older copy of the file gets the whole current file
+        response = self.client.get('/media/avatars/ab/abcd/64.webp', headers={'Range': 'bytes=2-5', 'If-Range': '"old"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_byte_range_parsing(self):
+        """Check the ranges read from Range headers"""
+        self.assertEqual(byteRange('bytes=0-', 10), (0, 9))
+        self.assertEqual(byteRange('bytes=-3', 10), (7, 9))
+        self.assertEqual(byteRange('bytes=5-100', 10), (5, 9))
+        self.assertIsNone(byteRange('bytes=0-1,4-5', 10))
+        self.assertIsNone(byteRange('items=0-1', 10))
+        with self.assertRaises(RangeNotSatisfiable):
+            byteRange('bytes=-0', 10)
+
+    def test_paths_outside_media_are_not_found(self):
+        """Check that missing files, folders and paths leaving MEDIA_ROOT are 404s"""
+        self.assertEqual(self.client.get('/media/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/media/avatars/').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/%2e%2e/%2e%2e/etc/passwd').status_code, 404)
+
+    def test_only_safe_methods(self):
+        """Check that media files can't be posted to"""
+        self.assertEqual(self.client.post('/media/profile_pics/photo.jpeg').status_code, 405)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/')
+    def test_accel_redirect_hands_file_to_proxy(self):
+        """Check that with X-Accel-Redirect configured the response has no body and points
+        the proxy at the internal location, still with the cache headers"""
+        response = self.client.get('/media/avatars/ab/abcd/64.webp')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/avatars/ab/abcd/64.webp')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(MEDIA_X_SENDFILE=True)
+    def test_x_sendfile_hands_file_to_server(self):
+        """Check that with X-Sendfile configured the response names the file on disk"""
+        response = self.client.get('/media/profile_pics/photo.jpeg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media, 'profile_pics/photo.jpeg'))
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,112 @@
+import json
+import logging
+import re
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from ..queries import QueryInstrumentationMiddleware, QueryRecorder, fingerprint, queryBudget
+from courselibrary.models import Course, Tee, Hole
+from rounds.models import Round, Score
+
+
+class QueryRecorderTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.courses = [Course.objects.create(name=f'Course {i}', creator=self.user, num_of_holes="09")
+                        for i in range(3)]
+
+    def test_fingerprint_ignores_parameters(self):
+        """Check that statements differing only in the length of their placeholder lists share a fingerprint"""
+        self.assertEqual(fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s)'),
+                         fingerprint('SELECT  * FROM "t"\nWHERE "id" IN (%s)'))
+        self.assertNotEqual(fingerprint('SELECT * FROM "t" WHERE "id" = %s'),
+                            fingerprint('SELECT * FROM "u" WHERE "id" = %s'))
+
+    def test_repeated_queries_are_grouped(self):
+        """Check that a query run once per object is reported as repeated"""
+        with QueryRecorder() as recorder:
+            for course in self.courses:
+                Course.objects.get(pk=course.pk)
+            User.objects.get(pk=self.user.pk)
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual([times for key, times, sql in recorder.repeated()], [3])
+        self.assertIn('courselibrary_course', recorder.repeated()[0][2])
+        self.assertEqual(len(recorder.slowest(2)), 2)
+
+    def test_budget_fails_with_repeated_queries(self):
+        """Check that going over the budget fails and names the repeated query"""
+        with self.assertRaisesRegex(AssertionError, r'3 queries run, over the budget of 2\. Repeated:\n  3x SELECT'):
+            with queryBudget(2):
+                for course in self.courses:
+                    Course.objects.get(pk=course.pk)
+        with queryBudget(3):
+            for course in self.courses:
+                Course.objects.get(pk=course.pk)
+
+    def test_repeated_queries_are_warnings(self):
+        """Check that a request repeating a query is logged as a warning and others only as info"""
+        def repeating(request):
+            for course in self.courses:
+                Course.objects.get(pk=course.pk)
+            return HttpResponse()
+
+        with self.assertLogs('golftracker.queries', 'INFO') as logs:
+            QueryInstrumentationMiddleware(repeating)(RequestFactory().get('/'))
+            QueryInstrumentationMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertEqual([record.levelno for record in logs.records], [logging.WARNING, logging.INFO])
+        self.assertEqual(json.loads(logs.records[0].getMessage())['repeated'][0]['count'], 3)
+
+    def test_query_log_is_quiet_in_tests(self):
+        """Check that the per request lines stay out of the test output"""
+        self.assertFalse(logging.getLogger('golftracker.queries').isEnabledFor(logging.WARNING))
+
+    def test_middleware_reports_queries(self):
+        """Check that responses carry a Server-Timing entry for the database and a JSON log line"""
+        client = Client()
+        client.force_login(self.user)
+        with self.assertLogs('golftracker.queries', 'INFO') as logs:
+            response = client.get('/courselibrary/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ repeated"$')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['method'], record['path'], record['status']), ('GET', '/courselibrary/', 200))
+        queries = int(re.search(r'desc="(\d+) queries', response['Server-Timing']).group(1))
+        self.assertEqual(record['queries'], queries)
+        self.assertLessEqual(len(record['slowest']), 3)
+
+
+class ViewQueryBudgetTestCase(TestCase):
+    ''' Pages whose templates walk related objects, with enough of them that an N+1 goes over budget '''
+
+    def setUp(self) -> None:
+        #Cached dashboards would hide the queries being budgeted
+        cache.clear()
+        self.user = User.objects.create(username='testuser', password='12345')
+        for i in range(12):
+            course = Course.objects.create(name=f'Course {i:02}', creator=self.user, num_of_holes="18")
+            tee = Tee.objects.create(name='White', course=course, course_rating=70.1, slope_rating=125)
+            Hole.objects.bulk_create([Hole(number=hole + 1, par=4, yards=400, tees=tee) for hole in range(18)])
+            self.round = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='18')
+            Score.objects.bulk_create([Score(round=self.round, hole_number=hole + 1, par=4, yardage=400, score=5)
+                                       for hole in range(18)])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @queryBudget(5)
+    def test_course_library(self):
+        """Check the queries of a page of courses with their tees and holes"""
+        response = self.client.get('/courselibrary/')
+        self.assertEqual(response.status_code, 200)
+
+    @queryBudget(7)
+    def test_dashboard(self):
+        """Check the queries of a dashboard listing recent rounds with their courses and tees"""
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+
+    @queryBudget(4)
+    def test_round_detail(self):
+        """Check the queries of a scorecard with every hole scored"""
+        response = self.client.get(f'/roundslibrary/{self.round.pk}/')
+        self.assertEqual(response.status_code, 200)
@@ -19,7 +19,7 @@ from django.contrib.auth import views as auth_views
 from django.urls import path, include
 from users import views as user_views
 from django.conf import settings
-from django.conf.urls.static import static
+from .media import serveMedia
 
 urlpatterns = [
     path('', include('rounds.urls')),
@@ -29,7 +29,6 @@ urlpatterns = [
     path('profile/', user_views.profile, name='profile'),
     path('login/', auth_views.LoginView.as_view(template_name='users/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(template_name='users/logout.html'), name='logout'),
+    #Served in production too, handed to the front server when MEDIA_ACCEL_REDIRECT or MEDIA_X_SENDFILE is set
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", serveMedia, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
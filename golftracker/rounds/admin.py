@@ -9,6 +9,8 @@ class ScoreInline(admin.TabularInline):
 
 class RoundAdmin(admin.ModelAdmin):
     inlines = [ScoreInline]
+    #Kept up to date by the score signals as the ScoreInline is saved
+    readonly_fields = Round.TOTAL_FIELDS
 
 
 admin.site.register(Round, RoundAdmin)
@@ -0,0 +1,45 @@
+from django.db import IntegrityError, transaction
+
+from .models import Round, Score, ScoreBatch
+from .signals import touch_round
+
+
+def _appliedVersion(round_id, key):
+    return ScoreBatch.objects.filter(round_id=round_id, key=key).values_list('version', flat=True).first()
+
+
+def applyScoreBatch(round_id, key, version, scores):
+    ''' Apply a batch of {hole number: score or None} to a round in one transaction if the
+        client saw the current version of the round. A batch is applied at most once per key,
+        retries get the version it produced. Returns (status code, response body) '''
+    applied = _appliedVersion(round_id, key)
+    if applied is not None:
+        return 200, {'version': applied}
+
+    try:
+        with transaction.atomic():
+            round = Round.objects.select_for_update().only('id', 'version').get(pk=round_id)
+            if round.version != version:
+                return 409, {'error': 'The round has changed since this version', 'version': round.version}
+            rows = list(Score.objects.filter(round_id=round_id, hole_number__in=scores))
+            if len(rows) != len(scores):
+                return 400, {'error': 'The round has no score for some of these holes'}
+
+            changed = [row for row in rows if row.score != scores[row.hole_number]]
+            for row in changed:
+                row.score = scores[row.hole_number]
+            #touch_round moves the version on by one when anything changed
+            new_version = version + 1 if changed else version
+            #Recorded first so a concurrent retry of the same key fails before writing anything
+            ScoreBatch.objects.create(round_id=round_id, key=key, version=new_version)
+            if changed:
+                #bulk_update skips the score signals, so the round is touched here once
+                Score.objects.bulk_update(changed, ['score'])
+                touch_round(round_id)
+    except IntegrityError:
+        #Either the same batch was applied by a concurrent retry, or something else failed and was rolled back
+        applied = _appliedVersion(round_id, key)
+        if applied is None:
+            raise
+        return 200, {'version': applied}
+    return 200, {'version': new_version}
@@ -0,0 +1,103 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+from .models import Round, Handicap
+from .stats import playerStats
+
+
+#Course renames don't invalidate the dashboard, so entries only live long enough to pick them up reasonably soon
+DASHBOARD_CACHE_TIMEOUT = 60 * 15
+RECENT_ROUNDS = 10
+#A rebuilt entry is replaced this long after its timeout, stale copies are served meanwhile
+STALE_TIMEOUT = 60 * 5
+#Longest a rebuild can hold the lock, in case the request building it dies
+REBUILD_LOCK_TIMEOUT = 10
+#How long to wait for another request building an entry nobody has a copy of yet
+REBUILD_WAIT_INTERVAL = 0.05
+REBUILD_WAIT_ATTEMPTS = 20
+
+
+def _versionKey(player_id) -> str:
+    return f'rounds:player:{player_id}:version'
+
+
+def playerVersion(player_id) -> int:
+    ''' Current cache version of a player's rounds '''
+    key = _versionKey(player_id)
+    version = cache.get(key)
+    if version is None:
+        #Start from the clock so a version key that was evicted never reuses an old version number
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bumpPlayerVersion(player_id) -> None:
+    ''' Invalidate every cached entry for a player's rounds by moving them to a new version '''
+    key = _versionKey(player_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def roundSummary(player) -> dict:
+    ''' Round counts, courses played, last round and best differential of a player in one query '''
+    return Round.objects.filter(player=player).aggregate(
+        rounds=Count('id'),
+        full_rounds=Count('id', filter=Q(num_of_holes='18')),
+        courses=Count('course', distinct=True),
+        last_played=Max('datetime'),
+        best_differential=Min('differential'),
+    )
+
+
+def _loadDashboard(player) -> dict:
+    recent = (Round.objects.filter(player=player).select_related('course', 'tees')
+              .order_by('-datetime', '-id')[:RECENT_ROUNDS])
+    return {
+        'rounds': list(recent),
+        'summary': roundSummary(player),
+        'stats': playerStats(player),
+        'handicap': Handicap.objects.filter(player=player).first(),
+    }
+
+
+def getDashboard(player) -> dict:
+    ''' Dashboard context of a player, from the cache when none of their rounds changed '''
+    key = f'rounds:player:{player.pk}:v{playerVersion(player.pk)}:dashboard'
+    context = cache.get(key)
+    if context is None:
+        context = _loadDashboard(player)
+        cache.set(key, context, DASHBOARD_CACHE_TIMEOUT)
+    return context
+
+
+def getOrRebuild(key, build, timeout):
+    ''' Value cached under key, rebuilt by a single request at a time once it is older than
+        timeout. Meanwhile other requests get the stale copy, or wait briefly for the one being
+        built, so a busy entry expiring doesn't send every request to the database at once '''
+    cached = cache.get(key)
+    if cached is not None and cached['expires'] > time.time():
+        return cached['value']
+
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(key, {'value': value, 'expires': time.time() + timeout}, timeout + STALE_TIMEOUT)
+        finally:
+            cache.delete(lock)
+        return value
+    if cached is not None:
+        return cached['value']
+
+    for attempt in range(REBUILD_WAIT_ATTEMPTS):
+        time.sleep(REBUILD_WAIT_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached['value']
+    #The other request is taking too long, build it here rather than fail
+    return build()
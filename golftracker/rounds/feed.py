@@ -0,0 +1,28 @@
+from golftracker.pagination import keysetPage
+from .models import Round
+from .caching import getOrRebuild
+
+
+#Most requests only see the first page, a round shows up there within this many seconds
+FEED_CACHE_TIMEOUT = 30
+FEED_ORDERING = ['-datetime', '-id']
+#The first page is cached and shown to anyone, so only the fields the feed renders are loaded
+FEED_FIELDS = ['datetime', 'gross_score', 'to_par', 'holes_played',
+               'player__username', 'course__name', 'tees__name']
+
+
+def publicRounds(course_id=None):
+    ''' Every player's public rounds, optionally at one course, with what the feed shows '''
+    rounds = Round.objects.filter(public=True).select_related('player', 'course', 'tees').only(*FEED_FIELDS)
+    if course_id is not None:
+        rounds = rounds.filter(course_id=course_id)
+    return rounds
+
+
+def feedPage(course_id=None, cursor=None):
+    ''' One page of the public feed, newest first, and the cursor for the next page.
+        The first page is shared by everyone, so it comes from the cache '''
+    if cursor:
+        return keysetPage(publicRounds(course_id), FEED_ORDERING, cursor)
+    key = f'rounds:feed:{course_id if course_id is not None else "all"}:first'
+    return getOrRebuild(key, lambda: keysetPage(publicRounds(course_id), FEED_ORDERING), FEED_CACHE_TIMEOUT)
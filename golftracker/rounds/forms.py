@@ -0,0 +1,65 @@
+import datetime
+
+from django import forms
+from django.utils import timezone
+from courselibrary.forms import BaseHoleFormSet
+from .models import Round
+
+
+class RoundStartForm(forms.ModelForm):
+    class Meta:
+        model = Round
+        fields = ['tees', 'num_of_holes', 'weather_conditions', 'public']
+
+    def __init__(self, *args, course, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.course = course
+        self.fields['tees'].queryset = course.tee_set.order_by('id')
+        self.fields['tees'].required = True
+
+    def clean_num_of_holes(self):
+        num_of_holes = self.cleaned_data['num_of_holes']
+        if self.course.num_of_holes == "09" and num_of_holes != "F9":
+            raise forms.ValidationError("This course only has 9 holes.")
+        return num_of_holes
+
+
+class BaseScoreFormSet(BaseHoleFormSet):
+    ''' Resolves each score form's id against the round's already loaded scores '''
+
+
+class RoundFilterForm(forms.Form):
+    course = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    tees = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    num_of_holes = forms.ChoiceField(required=False, label="Holes",
+                                     choices=[('', 'Any')] + list(Round.ROUND_CHOICES.items()))
+    played_after = forms.DateField(required=False, label="From",
+                                   widget=forms.DateInput(attrs={'type': 'date'}))
+    played_before = forms.DateField(required=False, label="To",
+                                    widget=forms.DateInput(attrs={'type': 'date'}))
+    public = forms.NullBooleanField(required=False, label="Public")
+
+    def filterRounds(self, rounds):
+        ''' Narrow down the rounds by every filter that was given and is valid '''
+        #Invalid filters are left out of cleaned_data, the rest still apply
+        self.is_valid()
+        filters = self.cleaned_data
+
+        if filters.get('course') is not None:
+            rounds = rounds.filter(course_id=filters['course'])
+        if filters.get('tees') is not None:
+            rounds = rounds.filter(tees_id=filters['tees'])
+        if filters.get('num_of_holes'):
+            rounds = rounds.filter(num_of_holes=filters['num_of_holes'])
+        #Compare against the start of the days in the local time zone so the datetime index can be used
+        if filters.get('played_after'):
+            rounds = rounds.filter(datetime__gte=_startOfDay(filters['played_after']))
+        if filters.get('played_before'):
+            rounds = rounds.filter(datetime__lt=_startOfDay(filters['played_before'] + datetime.timedelta(days=1)))
+        if filters.get('public') is not None:
+            rounds = rounds.filter(public=filters['public'])
+        return rounds
+
+
+def _startOfDay(date):
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
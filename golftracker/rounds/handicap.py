@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Round, Handicap
+
+
+WINDOW_SIZE = 20
+STANDARD_SLOPE = 113
+MAX_INDEX = 54.0
+#How many of the lowest differentials are averaged and the adjustment added, by how many
+#differentials the player has (World Handicap System rule 5.2)
+LOWEST_DIFFERENTIALS = [
+    (3, 1, -2.0), (4, 1, -1.0), (5, 1, 0.0), (6, 2, -1.0), (7, 2, 0.0), (9, 3, 0.0),
+    (12, 4, 0.0), (15, 5, 0.0), (17, 6, 0.0), (19, 7, 0.0), (20, 8, 0.0),
+]
+
+
+def expectedNineHoleDifferential(index) -> float:
+    ''' Expected differential for 9 unplayed holes of a player with the given handicap index '''
+    return index * 0.52 + 1.197
+
+
+def scoreDifferential(total, holes_played, tee, index=None):
+    ''' 18 hole score differential of a gross score over holes_played (9 or 18) holes from the tee.
+        The tee's ratings are for all the holes of its course, so they are scaled to the holes played.
+        A 9 hole score adds the expected differential of the other 9 holes for the player's index, or
+        counts twice if the player has no index yet. Returns None if the tee isn't rated '''
+    if tee is None or tee.course_rating is None or not tee.slope_rating:
+        return None
+    rated_holes = 9 if tee.course.num_of_holes == "09" else 18
+    course_rating = tee.course_rating * holes_played / rated_holes
+    differential = STANDARD_SLOPE / tee.slope_rating * (total - course_rating)
+    if holes_played == 9:
+        differential += expectedNineHoleDifferential(index) if index is not None else differential
+    return round(differential, 1)
+
+
+def handicapIndex(differentials):
+    ''' Handicap index from the 20 most recent of the differentials, given newest first.
+        None with fewer than 3 '''
+    #Only the most recent rounds count, the lowest are picked from among them
+    differentials = sorted(differentials[:WINDOW_SIZE])
+    counted = None
+    for minimum, lowest, adjustment in LOWEST_DIFFERENTIALS:
+        if len(differentials) >= minimum:
+            counted = (lowest, adjustment)
+    if counted is None:
+        return None
+    lowest, adjustment = counted
+    return min(MAX_INDEX, round(sum(differentials[:lowest]) / lowest + adjustment, 1))
+
+
+def roundDifferential(round, total, scored_holes, index=None):
+    ''' Differential of a round given the total and number of its entered scores, None unless
+        every hole of the round has been scored '''
+    holes_played = Round.HOLES_PLAYED.get(round.num_of_holes)
+    if total is None or scored_holes != holes_played:
+        return None
+    return scoreDifferential(total, holes_played, round.tees, index)
+
+
+def _windowEntry(round) -> list:
+    return [round.pk, round.datetime.isoformat(), round.differential]
+
+
+def _windowOrder(entry):
+    #Newest is largest, rounds saved in the same instant are ordered by id
+    return entry[1], entry[0]
+
+
+def _refillWindow(handicap) -> None:
+    rounds = (Round.objects.filter(player_id=handicap.player_id, differential__isnull=False)
+              .order_by('-datetime', '-id')[:WINDOW_SIZE])
+    handicap.window = [_windowEntry(round) for round in rounds]
+
+
+def _placeInWindow(handicap, round, removed=False) -> bool:
+    ''' Put the round's current differential into the player's window, or take it out if it has
+        none or was deleted. Returns False if the window doesn't change '''
+    window = [entry for entry in handicap.window if entry[0] != round.pk]
+    was_in_window = len(window) < len(handicap.window)
+    #The window holds the newest rated rounds, when it isn't full the player has no older ones
+    was_full = len(handicap.window) >= WINDOW_SIZE
+    if not removed and round.differential is not None:
+        entry = _windowEntry(round)
+        if len(window) < WINDOW_SIZE or _windowOrder(entry) > min(map(_windowOrder, window)):
+            window.append(entry)
+            window.sort(key=_windowOrder, reverse=True)
+            del window[WINDOW_SIZE:]
+        elif not was_in_window:
+            #Older than every round in a full window, it isn't counted
+            return False
+    elif not was_in_window:
+        return False
+
+    handicap.window = window
+    if was_in_window and was_full and len(window) < WINDOW_SIZE:
+        #A round left a full window, the next older rated round takes its place
+        _refillWindow(handicap)
+    return True
+
+
+def updateHandicap(round, removed=False) -> None:
+    ''' Update the player's window and handicap index after the round's differential
+        changed or the round was deleted '''
+    with transaction.atomic():
+        handicap, created = Handicap.objects.select_for_update().get_or_create(player_id=round.player_id)
+        if not _placeInWindow(handicap, round, removed):
+            return
+        handicap.index = handicapIndex([entry[2] for entry in handicap.window])
+        handicap.save()
+
+
+def _playedBefore(round) -> Q:
+    #Rounds saved in the same instant are ordered by id, like in the window
+    return Q(datetime__lt=round.datetime) | Q(datetime=round.datetime, pk__lt=round.pk)
+
+
+def indexBefore(round):
+    ''' Handicap index the player had when the round was played, from the 20 most recent
+        rated rounds before it '''
+    differentials = (Round.objects.filter(_playedBefore(round), player_id=round.player_id, differential__isnull=False)
+                     .order_by('-datetime', '-id').values_list('differential', flat=True)[:WINDOW_SIZE])
+    return handicapIndex(list(differentials))
+
+
+def _rateRound(round) -> bool:
+    ''' Store the round's differential from its score totals and update the player's handicap.
+        Returns False if the differential didn't change '''
+    #Only a 9 hole round's differential depends on the index
+    index = indexBefore(round) if Round.HOLES_PLAYED.get(round.num_of_holes) == 9 else None
+    differential = roundDifferential(round, round.gross_score, round.holes_played, index)
+    if differential == round.differential:
+        return False
+    round.differential = differential
+    Round.objects.filter(pk=round.pk).update(differential=differential)
+    updateHandicap(round)
+    return True
+
+
+def rerateLaterRounds(round) -> None:
+    ''' Rate again the player's 9 hole rounds played after the round, oldest first, since the
+        index they are priced with changes with the rounds before them '''
+    later = (Round.objects.select_related('tees__course')
+             .filter(player_id=round.player_id, differential__isnull=False, num_of_holes__in=['F9', 'B9'])
+             .exclude(_playedBefore(round)).exclude(pk=round.pk).order_by('datetime', 'id'))
+    for later_round in later:
+        _rateRound(later_round)
+
+
+def updateRoundDifferential(round_id) -> None:
+    ''' Recompute a round's differential from its stored score totals and, if it changed, the
+        player's handicap and the later 9 hole rounds rated with it. 9 hole rounds use the index
+        the player had when they were played, like replayRounds '''
+    round = Round.objects.select_related('tees__course').filter(pk=round_id).first()
+    if round is None:
+        return
+    if _rateRound(round):
+        rerateLaterRounds(round)
+
+
+def replayRounds(rounds):
+    ''' Recalculate the differentials of one player's rounds, given oldest first and annotated
+        with the total and scored_holes of their scores. 9 hole rounds use the index the player
+        had when they were played. Sets each round's differential without saving and returns
+        the player's current (index, window) '''
+    window = []
+    index = None
+    for round in rounds:
+        round.differential = roundDifferential(round, round.total, round.scored_holes, index)
+        if round.differential is not None:
+            window.insert(0, _windowEntry(round))
+            del window[WINDOW_SIZE:]
+            index = handicapIndex([entry[2] for entry in window])
+    return index, window
@@ -0,0 +1,56 @@
+from django.db.models import Count, F, Q, Sum
+
+from golftracker.pagination import keysetPage
+from .models import Round, LeaderboardEntry
+
+
+#Each ordering ends in the primary key so every entry has a distinct position for keyset paging
+BOARD_ORDERINGS = {
+    'gross': ['gross', 'datetime', 'id'],
+    'to_par': ['to_par', 'datetime', 'id'],
+    'recent': ['-datetime', '-id'],
+}
+
+
+def boardTotals(rounds):
+    ''' Annotate round values with what a leaderboard entry needs, computed from the rounds' scores '''
+    return (rounds.values('id', 'player_id', 'course_id', 'tees_id', 'num_of_holes', 'datetime')
+            .annotate(gross=Sum('score__score'), par=Sum('score__par', filter=Q(score__score__isnull=False)),
+                      scored_holes=Count('score__score')))
+
+
+def boardEntry(totals):
+    ''' Unsaved leaderboard entry for annotated round values, None unless the round is complete '''
+    holes = Round.HOLES_PLAYED.get(totals['num_of_holes'])
+    if totals['scored_holes'] != holes:
+        return None
+    return LeaderboardEntry(round_id=totals['id'], player_id=totals['player_id'], course_id=totals['course_id'],
+                            tees_id=totals['tees_id'], holes=holes, gross=totals['gross'],
+                            to_par=totals['gross'] - totals['par'], datetime=totals['datetime'])
+
+
+def updateLeaderboard(round_id) -> None:
+    ''' Add, update or remove a round's leaderboard entry after its scores, course, tees or
+        public flag changed. Only the round's stored score totals are read '''
+    totals = (Round.objects.filter(pk=round_id, public=True, course__isnull=False)
+              .values('id', 'player_id', 'course_id', 'tees_id', 'num_of_holes', 'datetime',
+                      gross=F('gross_score'), par=F('total_par'), scored_holes=F('holes_played')).first())
+    entry = boardEntry(totals) if totals is not None else None
+    if entry is None:
+        LeaderboardEntry.objects.filter(round_id=round_id).delete()
+        return
+    fields = ['player_id', 'course_id', 'tees_id', 'holes', 'gross', 'to_par', 'datetime']
+    LeaderboardEntry.objects.update_or_create(round_id=round_id,
+                                              defaults={field: getattr(entry, field) for field in fields})
+
+
+def leaderboardPage(course_id, holes=18, tees_id=None, order='gross', cursor=None):
+    ''' One page of a course's leaderboard, or of one of its tees, and the cursor for the next page.
+        The tee has to belong to the course '''
+    #A tee's board is filtered on the tee alone so it is read from the tee indexes
+    if tees_id is not None:
+        entries = LeaderboardEntry.objects.filter(tees_id=tees_id, holes=holes)
+    else:
+        entries = LeaderboardEntry.objects.filter(course_id=course_id, holes=holes)
+    entries = entries.select_related('player', 'tees')
+    return keysetPage(entries, BOARD_ORDERINGS[order], cursor)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rounds.models import Round
+from rounds.totals import staleTotals
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored score totals on every round from its scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report rounds whose stored totals are out of date, don't fix them")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        checked, stale = staleTotals(Round, options['batch_size'])
+
+        for round in stale:
+            self.stdout.write(f'Round {round.pk} has out of date totals')
+
+        if options['check']:
+            if stale:
+                raise CommandError(f'{len(stale)} of {checked} rounds have out of date totals')
+            self.stdout.write(self.style.SUCCESS(f'All {checked} rounds have correct totals'))
+            return
+
+        #Only the totals are written, the rounds' last_updated and version are left alone
+        Round.objects.bulk_update(stale, Round.TOTAL_FIELDS, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} rounds, updated {len(stale)}'))
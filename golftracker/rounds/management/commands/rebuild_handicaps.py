@@ -0,0 +1,48 @@
+from itertools import groupby
+from operator import attrgetter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from rounds.models import Round, Handicap
+from rounds.handicap import replayRounds
+
+
+class Command(BaseCommand):
+    help = "Recompute every round's score differential and every player's handicap index from their scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--player', help="Only rebuild the handicap of the player with this username")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rounds = (Round.objects.select_related('tees__course')
+                  .annotate(total=Sum('score__score'), scored_holes=Count('score__score'))
+                  .order_by('player_id', 'datetime', 'id'))
+        players = User.objects.all()
+        if options['player']:
+            players = players.filter(username=options['player'])
+            if not players.exists():
+                raise CommandError(f"There is no player named {options['player']}")
+            rounds = rounds.filter(player__username=options['player'])
+
+        updated = 0
+        rebuilt = set()
+        for player_id, player_rounds in groupby(rounds.iterator(chunk_size=batch_size), key=attrgetter('player_id')):
+            player_rounds = list(player_rounds)
+            before = {round.pk: round.differential for round in player_rounds}
+            index, window = replayRounds(player_rounds)
+            changed = [round for round in player_rounds if round.differential != before[round.pk]]
+            with transaction.atomic():
+                Round.objects.bulk_update(changed, ['differential'], batch_size=batch_size)
+                Handicap.objects.update_or_create(player_id=player_id, defaults={'index': index, 'window': window})
+            updated += len(changed)
+            rebuilt.add(player_id)
+
+        #Players without any rounds have no handicap
+        Handicap.objects.filter(player__in=players, player__round__isnull=True).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the handicaps of {len(rebuilt)} players, updated {updated} round differentials'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rounds.models import Round, LeaderboardEntry
+from rounds.leaderboard import boardTotals, boardEntry
+
+
+class Command(BaseCommand):
+    help = "Rebuild every course leaderboard from the scores of the completed public rounds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rounds = boardTotals(Round.objects.filter(public=True, course__isnull=False)).order_by('id')
+        entries = [entry for entry in map(boardEntry, rounds.iterator(chunk_size=batch_size)) if entry is not None]
+        with transaction.atomic():
+            LeaderboardEntry.objects.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the leaderboards with {len(entries)} rounds'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rounds', '0005_round_public'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0010_course_trigram'),
+        ('rounds', '0007_round_differential_handicap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(fields=['player', 'datetime'], name='round_player_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(fields=['player', 'course', 'datetime'], name='round_player_course_idx'),
+        ),
+    ]
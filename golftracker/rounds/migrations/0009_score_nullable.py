@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rounds', '0008_round_player_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='score',
+            name='score',
+            field=models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rounds', '0009_score_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ScoreBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('version', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rounds.round')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('round', 'key'), name='score_batch_round_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0010_course_trigram'),
+        ('rounds', '0010_round_version_scorebatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holes', models.IntegerField()),
+                ('gross', models.IntegerField()),
+                ('to_par', models.IntegerField()),
+                ('datetime', models.DateTimeField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courselibrary.course')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('round', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='rounds.round')),
+                ('tees', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courselibrary.tee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'holes', 'gross', 'datetime'], name='board_course_gross_idx'), models.Index(fields=['course', 'holes', 'to_par', 'datetime'], name='board_course_to_par_idx'), models.Index(fields=['course', 'holes', 'datetime'], name='board_course_recent_idx'), models.Index(fields=['tees', 'holes', 'gross', 'datetime'], name='board_tees_gross_idx'), models.Index(fields=['tees', 'holes', 'to_par', 'datetime'], name='board_tees_to_par_idx'), models.Index(fields=['tees', 'holes', 'datetime'], name='board_tees_recent_idx')],
+            },
+        ),
+    ]
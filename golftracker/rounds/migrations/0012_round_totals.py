@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+from rounds.totals import TOTAL_FIELDS, staleTotals
+
+
+def backfill_round_totals(apps, schema_editor):
+    Round = apps.get_model('rounds', 'Round')
+    checked, stale = staleTotals(Round)
+    Round.objects.bulk_update(stale, TOTAL_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rounds', '0011_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='back_nine',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='front_nine',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='gross_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='holes_played',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='to_par',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='total_par',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_round_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courselibrary', '0010_course_trigram'),
+        ('rounds', '0012_round_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(condition=models.Q(('public', True)), fields=['datetime'], name='round_public_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(condition=models.Q(('public', True)), fields=['course', 'datetime'], name='round_public_course_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from courselibrary.models import Course, Tee
+from .totals import TOTAL_FIELDS, totalsAggregates
 
 
 class Round(models.Model):
@@ -15,19 +18,116 @@ class Round(models.Model):
     tees = models.ForeignKey(Tee, on_delete=models.SET_NULL, blank=True, null=True)
     num_of_holes = models.CharField(max_length=2, choices=ROUND_CHOICES)
     datetime = models.DateTimeField(auto_now_add=True)
+    #Also moved forward whenever one of the round's scores changes
+    last_updated = models.DateTimeField(auto_now=True)
     weather_conditions = models.IntegerField(blank=True, null=True)
     public = models.BooleanField(default=False)
+    #18 hole score differential, kept up to date from the scores by rounds.handicap. Empty when
+    #the round isn't complete or its tee has no course and slope rating
+    differential = models.FloatField(blank=True, null=True, editable=False)
+    #Counts every change to the round's scores, clients send it back so stale autosaves are refused
+    version = models.PositiveIntegerField(default=0, editable=False)
+    #Totals of the round's entered scores, kept up to date by rounds.signals.touch_round whenever scores are written
+    gross_score = models.IntegerField(default=0, editable=False)
+    total_par = models.IntegerField(default=0, editable=False)
+    to_par = models.IntegerField(default=0, editable=False)
+    front_nine = models.IntegerField(default=0, editable=False)
+    back_nine = models.IntegerField(default=0, editable=False)
+    holes_played = models.IntegerField(default=0, editable=False)
+
+    HOLES_PLAYED = {"F9": 9, "B9": 9, "18": 18}
+    FIRST_HOLE = {"F9": 1, "B9": 10, "18": 1}
+    TOTAL_FIELDS = TOTAL_FIELDS
+    #Written with queryset updates as the scores change, so an older copy of the round must not save over them
+    MAINTAINED_FIELDS = TOTAL_FIELDS + ['differential', 'version']
+
+    class Meta:
+        indexes = [
+            #Support keyset pagination of a player's rounds, optionally filtered to one course
+            models.Index(fields=['player', 'datetime'], name='round_player_datetime_idx'),
+            models.Index(fields=['player', 'course', 'datetime'], name='round_player_course_idx'),
+            #Only public rounds are in the feed, so only they are indexed for it
+            models.Index(fields=['datetime'], condition=Q(public=True), name='round_public_datetime_idx'),
+            models.Index(fields=['course', 'datetime'], condition=Q(public=True), name='round_public_course_idx'),
+        ]
 
     def __str__(self):
         return f'{self.course}, Round ID: {self.pk}'
-    
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.MAINTAINED_FIELDS]
+        super().save(*args, **kwargs)
+
+    #Aggregate expressions for the score totals, see totalsAggregates
+    totals_aggregates = staticmethod(totalsAggregates)
+
 
 class Score(models.Model):
     round = models.ForeignKey(Round, on_delete=models.CASCADE)
     hole_number = models.IntegerField()
     par = models.IntegerField()
     yardage = models.IntegerField()
-    score = models.IntegerField()
+    #Empty until the hole has been played, par and yardage are copied from the tee when the round starts
+    score = models.IntegerField(blank=True, null=True, validators=[MinValueValidator(1)])
 
     def __str__(self):
         return f'{self.round}, Hole: {self.hole_number}'
+
+
+class ScoreBatch(models.Model):
+    ''' An autosaved batch of scores, kept so a client retrying with the same key gets
+        the original answer instead of applying the batch twice '''
+    round = models.ForeignKey(Round, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    #Version of the round after the batch was applied
+    version = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['round', 'key'], name='score_batch_round_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.round}, Batch: {self.key}'
+
+
+class Handicap(models.Model):
+    ''' A player's handicap index along with the window of recent differentials it is
+        calculated from, updated by rounds.handicap as rounds are scored '''
+    player = models.OneToOneField(User, on_delete=models.CASCADE)
+    index = models.FloatField(blank=True, null=True)
+    #[round id, round datetime, differential] of the most recent rated rounds, newest first
+    window = models.JSONField(default=list)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.player.username} Handicap'
+
+
+class LeaderboardEntry(models.Model):
+    ''' A completed public round on its course's leaderboard, kept in step with the round's
+        scores by rounds.leaderboard so boards are read a page at a time from the indexes '''
+    round = models.OneToOneField(Round, on_delete=models.CASCADE)
+    player = models.ForeignKey(User, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    tees = models.ForeignKey(Tee, on_delete=models.SET_NULL, blank=True, null=True)
+    holes = models.IntegerField()
+    gross = models.IntegerField()
+    to_par = models.IntegerField()
+    datetime = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'holes', 'gross', 'datetime'], name='board_course_gross_idx'),
+            models.Index(fields=['course', 'holes', 'to_par', 'datetime'], name='board_course_to_par_idx'),
+            models.Index(fields=['course', 'holes', 'datetime'], name='board_course_recent_idx'),
+            models.Index(fields=['tees', 'holes', 'gross', 'datetime'], name='board_tees_gross_idx'),
+            models.Index(fields=['tees', 'holes', 'to_par', 'datetime'], name='board_tees_to_par_idx'),
+            models.Index(fields=['tees', 'holes', 'datetime'], name='board_tees_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.round}, Gross: {self.gross}'
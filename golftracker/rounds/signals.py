@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Round, Score, Handicap
+from .handicap import updateRoundDifferential, updateHandicap, rerateLaterRounds
+from .caching import bumpPlayerVersion
+from .leaderboard import updateLeaderboard
+
+
+def touch_round(round_id):
+    #Every path that changes a round's scores ends here, including the bulk ones that skip the score signals
+    totals = Score.objects.filter(round_id=round_id).aggregate(**Round.totals_aggregates())
+    Round.objects.filter(pk=round_id).update(last_updated=timezone.now(), version=F('version') + 1, **totals)
+    #Both read the totals stored above, the cache is invalidated after the handicap changed too
+    updateRoundDifferential(round_id)
+    updateLeaderboard(round_id)
+    player_id = Round.objects.filter(pk=round_id).values_list('player_id', flat=True).first()
+    if player_id is not None:
+        invalidate_player(player_id)
+
+
+def invalidate_player(player_id):
+    bumpPlayerVersion(player_id)
+    #Bump again once the write commits, in case a concurrent request cached the old data under the new version
+    transaction.on_commit(lambda: bumpPlayerVersion(player_id))
+
+
+@receiver(post_save, sender=Score)
+@receiver(post_delete, sender=Score)
+def score_changed(sender, instance, origin=None, **kwargs):
+    #Nothing to update when the scores are going away with their round
+    if isinstance(origin, Round):
+        return
+    touch_round(instance.round_id)
+
+
+@receiver(post_save, sender=Round)
+def round_saved(sender, instance, created, update_fields=None, **kwargs):
+    #A new round has no scores yet, and only the tees and number of holes change how it's rated
+    if created or (update_fields is not None and not {'tees', 'num_of_holes'} & set(update_fields)):
+        return
+    updateRoundDifferential(instance.pk)
+
+
+@receiver(post_save, sender=Round)
+def update_round_leaderboard(sender, instance, created, update_fields=None, **kwargs):
+    #A new round has no scores yet, otherwise the round can join or leave its course's leaderboard
+    if created or (update_fields is not None and
+                   not {'public', 'course', 'tees', 'num_of_holes'} & set(update_fields)):
+        return
+    updateLeaderboard(instance.pk)
+
+
+@receiver(post_delete, sender=Round)
+def round_deleted(sender, instance, origin=None, **kwargs):
+    #The handicap is deleted along with the player
+    if isinstance(origin, User) or instance.differential is None:
+        return
+    updateHandicap(instance, removed=True)
+    rerateLaterRounds(instance)
+
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+def invalidate_round_player_cache(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return
+    invalidate_player(instance.player_id)
+
+
+@receiver(post_save, sender=Handicap)
+def invalidate_handicap_player_cache(sender, instance, **kwargs):
+    #Also covers rebuild_handicaps, whose bulk differential updates skip the round signals
+    invalidate_player(instance.player_id)
@@ -0,0 +1,103 @@
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from .models import Round, Score
+
+
+#Round ids use the full width of the primary key, the per hole numbers are always small
+SCORE_COLUMNS = {
+    'round_id': np.int64,
+    'hole_number': np.int16,
+    'par': np.int16,
+    'yardage': np.int16,
+    'score': np.int16,
+}
+#Scores relative to par are clipped into these buckets, from -2 and under to +2 and over
+TO_PAR_LABELS = ['Eagle or better', 'Birdie', 'Par', 'Bogey', 'Double bogey or worse']
+#Upper edges of the hole length buckets in yards, the last bucket is everything longer
+YARDAGE_EDGES = [150, 200, 350, 400, 450, 500]
+
+
+def loadScores(player) -> dict:
+    ''' Every score a player has entered as NumPy arrays with one entry per hole played,
+        keyed by round_id, hole_number, par, yardage, score and date, from two queries.
+        The score rows are read from a plain cursor since converting tens of thousands of rows
+        through the ORM takes longer than computing every statistic '''
+    queryset = Score.objects.filter(round__player=player, score__isnull=False).values_list(*SCORE_COLUMNS)
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    if not rows:
+        arrays = {column: np.zeros(0, dtype=dtype) for column, dtype in SCORE_COLUMNS.items()}
+        arrays['date'] = np.zeros(0, dtype='datetime64[D]')
+        return arrays
+    arrays = {column: np.array(values, dtype=dtype)
+              for (column, dtype), values in zip(SCORE_COLUMNS.items(), zip(*rows))}
+    #Every hole of a round has the same date, so the dates are read once per round and turned
+    #local here. Truncating them in the score query converts the timezone once per hole, which
+    #SQLite does in a Python function
+    played = sorted(Round.objects.filter(player=player).values_list('id', 'datetime'))
+    round_ids = np.array([round_id for round_id, datetime in played], dtype=np.int64)
+    round_dates = np.array([timezone.localtime(datetime).date() for round_id, datetime in played],
+                           dtype='datetime64[D]')
+    arrays['date'] = round_dates[np.searchsorted(round_ids, arrays['round_id'])]
+    return arrays
+
+
+def _yardageLabels() -> list:
+    labels = [f'Under {YARDAGE_EDGES[0]}']
+    labels += [f'{low}-{high - 1}' for low, high in zip(YARDAGE_EDGES, YARDAGE_EDGES[1:])]
+    labels.append(f'{YARDAGE_EDGES[-1]}+')
+    return labels
+
+
+def playerStats(player):
+    ''' Scoring statistics over all of a player's scores, computed with array operations.
+        Returns None if the player has no scores '''
+    arrays = loadScores(player)
+    score = arrays['score']
+    if not len(score):
+        return None
+    par = arrays['par']
+    to_par = score - par
+
+    #Total strokes and holes played in each round
+    round_ids, round_index = np.unique(arrays['round_id'], return_inverse=True)
+    round_totals = np.bincount(round_index, weights=score)
+    round_holes = np.bincount(round_index)
+
+    def averageOf(values):
+        return float(values.mean()) if len(values) else None
+
+    averages_to_par = []
+    for hole_par in (3, 4, 5):
+        averages_to_par.append((hole_par, averageOf(to_par[par == hole_par])))
+
+    counts = np.bincount(np.clip(to_par, -2, 2) + 2, minlength=len(TO_PAR_LABELS))
+    distribution = [(label, int(count), float(count) / len(score))
+                    for label, count in zip(TO_PAR_LABELS, counts)]
+
+    bucket = np.digitize(arrays['yardage'], YARDAGE_EDGES)
+    bucket_holes = np.bincount(bucket, minlength=len(YARDAGE_EDGES) + 1)
+    bucket_scores = np.bincount(bucket, weights=score, minlength=len(YARDAGE_EDGES) + 1)
+    bucket_to_par = np.bincount(bucket, weights=to_par, minlength=len(YARDAGE_EDGES) + 1)
+    yardage = [(label, int(holes), float(strokes / holes), float(over / holes))
+               for label, holes, strokes, over in zip(_yardageLabels(), bucket_holes, bucket_scores, bucket_to_par)
+               if holes]
+
+    return {
+        'rounds': len(round_ids),
+        'holes': len(score),
+        'first_round': arrays['date'].min().item(),
+        'last_round': arrays['date'].max().item(),
+        'scoring_average': averageOf(round_totals[round_holes == 18]),
+        'nine_hole_average': averageOf(round_totals[round_holes == 9]),
+        'average_score': float(score.mean()),
+        'average_to_par': float(to_par.mean()),
+        'par_averages': averages_to_par,
+        'distribution': distribution,
+        'yardage': yardage,
+    }
@@ -0,0 +1,102 @@
+from importlib import import_module
+from io import StringIO
+from django.apps import apps
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from ..models import Round, Score, Handicap, LeaderboardEntry
+from courselibrary.models import Course, Tee
+
+
+class RebuildHandicapsCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=self.user, num_of_holes="18")
+        tee = Tee.objects.create(name='White', course=course, course_rating=72.0, slope_rating=113)
+        #Bulk created scores skip the signals, so nothing is rated until the rebuild
+        for total in (80, 84, 88):
+            round = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='18')
+            Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400,
+                                             score=total // 18 + (1 if hole < total % 18 else 0))
+                                       for hole in range(18)])
+
+    def test_rebuild_rates_rounds_and_stores_index(self):
+        """Check that the command stores every round differential and the player's index"""
+        out = StringIO()
+        call_command('rebuild_handicaps', stdout=out)
+        self.assertEqual(sorted(Round.objects.values_list('differential', flat=True)), [8.0, 12.0, 16.0])
+        self.assertEqual(Handicap.objects.get(player=self.user).index, 6.0)
+        self.assertIn('Rebuilt the handicaps of 1 players', out.getvalue())
+
+    def test_rebuild_removes_handicaps_without_rounds(self):
+        """Check that a player whose rounds are all gone loses their handicap"""
+        other = User.objects.create_user(username='other', password='12345')
+        Handicap.objects.create(player=other, index=10.0)
+        call_command('rebuild_handicaps', stdout=StringIO())
+        self.assertFalse(Handicap.objects.filter(player=other).exists())
+
+    def test_unknown_player(self):
+        """Check that rebuilding an unknown player fails"""
+        with self.assertRaises(CommandError):
+            call_command('rebuild_handicaps', '--player', 'nobody', stdout=StringIO())
+
+
+class RebuildLeaderboardsCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        user = User.objects.create_user(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=user, num_of_holes="18")
+        tee = Tee.objects.create(name='White', course=course)
+        #Bulk created scores skip the signals, so nothing is on the leaderboard until the rebuild
+        for public, scored in ((True, 9), (True, 8), (False, 9)):
+            round = Round.objects.create(player=user, course=course, tees=tee, num_of_holes='F9', public=public)
+            Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400,
+                                             score=5 if hole < scored else None)
+                                       for hole in range(9)])
+        self.complete = Round.objects.filter(public=True).order_by('id').first()
+
+    def test_rebuild_adds_completed_public_rounds(self):
+        """Check that only complete public rounds are put on the leaderboard"""
+        out = StringIO()
+        call_command('rebuild_leaderboards', stdout=out)
+        entry = LeaderboardEntry.objects.get()
+        self.assertEqual((entry.round, entry.gross, entry.to_par), (self.complete, 45, 9))
+        self.assertIn('Rebuilt the leaderboards with 1 rounds', out.getvalue())
+
+
+class BackfillRoundTotalsCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        user = User.objects.create_user(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=user, num_of_holes="18")
+        round = Round.objects.create(player=user, course=course, num_of_holes='F9')
+        #Bulk created scores skip the signals, so the stored totals are out of date
+        Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400, score=5)
+                                   for hole in range(9)])
+
+    def test_check_reports_stale_totals(self):
+        """Check that --check fails when stored totals don't match the scores
+        and doesn't change anything"""
+        with self.assertRaises(CommandError):
+            call_command('backfill_round_totals', '--check', stdout=StringIO())
+        self.assertEqual(Round.objects.get().gross_score, 0)
+
+    def test_backfill_fixes_stale_totals(self):
+        """Check that running the command stores the correct totals and that
+        a following check passes"""
+        call_command('backfill_round_totals', stdout=StringIO())
+        round = Round.objects.get()
+        self.assertEqual((round.gross_score, round.to_par, round.front_nine, round.holes_played), (45, 9, 45, 9))
+        out = StringIO()
+        call_command('backfill_round_totals', '--check', stdout=out)
+        self.assertIn('All 1 rounds have correct totals', out.getvalue())
+
+    def test_migration_fills_existing_rounds(self):
+        """Check that the migration adding the totals fills them in for the rounds already stored"""
+        migration = import_module('rounds.migrations.0012_round_totals')
+        migration.backfill_round_totals(apps, None)
+        round = Round.objects.get()
+        self.assertEqual((round.gross_score, round.total_par, round.holes_played), (45, 36, 9))
@@ -1,7 +1,18 @@
+import datetime
+import time
+from io import StringIO
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
 
-from ..models import Round, Score
+from django.db.models import Count, Sum
+
+from ..models import Round, Score, Handicap, LeaderboardEntry
+from ..stats import loadScores, playerStats
+from ..handicap import scoreDifferential, handicapIndex, replayRounds
+from ..leaderboard import leaderboardPage
+from ..signals import touch_round
 from courselibrary.models import Course, Tee
 
 
@@ -46,4 +57,322 @@ class ScoreModelTestCase(TestCase):
     def test_correct_str_representation_for_model(self):
         """Test to ensure that a Score object returns the correct string representation"""
         score = Score.objects.get(pk=1)
-        self.assertEqual(score.__str__(), 'Cedarholm Golf Course, Round ID: 1, Hole: 3')
\ No newline at end of file
+        self.assertEqual(score.__str__(), 'Cedarholm Golf Course, Round ID: 1, Hole: 3')
+
+class PlayerStatsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.other = User.objects.create(username='otheruser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN',
+                                       creator=self.user, num_of_holes="18")
+        tee = Tee.objects.create(name='Red', course=course)
+        pars = [4, 3, 5, 4, 4, 3, 5, 4, 4] * 2
+        yardages = [380, 140, 520, 410, 360, 185, 480, 330, 420] * 2
+        for round_number in range(3):
+            round = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='18')
+            Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=pars[hole], yardage=yardages[hole],
+                                             score=pars[hole] + (hole + round_number) % 4 - 1)
+                                       for hole in range(18)])
+        nine = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='F9')
+        Score.objects.bulk_create([Score(round=nine, hole_number=hole + 1, par=pars[hole], yardage=yardages[hole],
+                                         score=pars[hole] + 1) for hole in range(9)])
+        #Another player's scores must not be counted
+        other_round = Round.objects.create(player=self.other, course=course, tees=tee, num_of_holes='F9')
+        Score.objects.create(round=other_round, hole_number=1, par=4, yardage=380, score=12)
+
+    def test_load_scores_returns_arrays(self):
+        """Test that a player's scores are loaded as arrays with one entry per hole"""
+        arrays = loadScores(self.user)
+        self.assertEqual(len(arrays['score']), 63)
+        self.assertEqual(sorted(set(arrays['round_id'].tolist())), [1, 2, 3, 4])
+        self.assertEqual(arrays['date'].dtype, 'datetime64[D]')
+
+    def test_stats_match_score_rows(self):
+        """Test that the vectorized stats match the same numbers worked out row by row"""
+        scores = list(Score.objects.filter(round__player=self.user))
+        stats = playerStats(self.user)
+        self.assertEqual(stats['rounds'], 4)
+        self.assertEqual(stats['holes'], len(scores))
+        totals = {}
+        for score in scores:
+            totals.setdefault(score.round_id, []).append(score.score)
+        eighteen = [sum(round_scores) for round_scores in totals.values() if len(round_scores) == 18]
+        self.assertAlmostEqual(stats['scoring_average'], sum(eighteen) / len(eighteen))
+        self.assertAlmostEqual(stats['nine_hole_average'], sum(totals[4]))
+        for par, average in stats['par_averages']:
+            to_par = [score.score - score.par for score in scores if score.par == par]
+            self.assertAlmostEqual(average, sum(to_par) / len(to_par))
+        birdies = len([score for score in scores if score.score - score.par == -1])
+        self.assertEqual(stats['distribution'][1], ('Birdie', birdies, birdies / len(scores)))
+        under_150 = [score for score in scores if score.yardage < 150]
+        self.assertEqual(stats['yardage'][0][:2], ('Under 150', len(under_150)))
+        self.assertAlmostEqual(stats['yardage'][0][2], sum(score.score for score in under_150) / len(under_150))
+
+    def test_stats_are_two_queries(self):
+        """Test that computing the stats reads the scores and the round dates in one query each"""
+        with self.assertNumQueries(2):
+            playerStats(self.user)
+
+    def test_dates_are_local(self):
+        """Test that a round played late in the evening counts on that day, not the next UTC day"""
+        evening = timezone.make_aware(datetime.datetime(2024, 6, 1, 22, 30))
+        Round.objects.filter(player=self.user).update(datetime=evening)
+        stats = playerStats(self.user)
+        self.assertEqual(stats['first_round'], datetime.date(2024, 6, 1))
+        self.assertEqual(stats['last_round'], datetime.date(2024, 6, 1))
+
+    def test_player_without_scores(self):
+        """Test that a player with no scores has no stats"""
+        player = User.objects.create(username='newplayer', password='12345')
+        self.assertIsNone(playerStats(player))
+
+    def test_stats_scale_to_many_rounds(self):
+        """Test that the stats of a player with 2,000 rounds take two queries and well under a second"""
+        player = User.objects.create(username='regular', password='12345')
+        course = Course.objects.get(name='Cedarholm Golf Course')
+        tee = Tee.objects.get(course=course)
+        start = timezone.make_aware(datetime.datetime(2020, 1, 1, 20, 0))
+        rounds = Round.objects.bulk_create([Round(player=player, course=course, tees=tee, num_of_holes='18')
+                                            for number in range(2000)])
+        for number, round in enumerate(rounds):
+            round.datetime = start + datetime.timedelta(days=number)
+        Round.objects.bulk_update(rounds, ['datetime'], batch_size=500)
+        Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400, score=5)
+                                   for round in rounds for hole in range(18)], batch_size=2000)
+
+        began = time.perf_counter()
+        with self.assertNumQueries(2):
+            stats = playerStats(player)
+        self.assertLess(time.perf_counter() - began, 0.5)
+        self.assertEqual((stats['rounds'], stats['holes']), (2000, 36000))
+        self.assertEqual(stats['first_round'], datetime.date(2020, 1, 1))
+        self.assertEqual(stats['last_round'], datetime.date(2020, 1, 1) + datetime.timedelta(days=1999))
+
+
+class HandicapTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='White', course=course, course_rating=72.0, slope_rating=113)
+        self.course = course
+
+    def playRound(self, total, num_of_holes='18'):
+        ''' Create a round with the given total, spread evenly over its holes '''
+        holes = Round.HOLES_PLAYED[num_of_holes]
+        round = Round.objects.create(player=self.user, course=self.course, tees=self.tee, num_of_holes=num_of_holes)
+        scores = [total // holes + (1 if hole < total % holes else 0) for hole in range(holes)]
+        Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400, score=score)
+                                   for hole, score in enumerate(scores)])
+        touch_round(round.pk)
+        round.refresh_from_db()
+        return round
+
+    def test_score_differential(self):
+        """Test the differential of an 18 hole score"""
+        self.tee.course_rating = 70.0
+        self.tee.slope_rating = 130
+        self.assertEqual(scoreDifferential(85, 18, self.tee), 13.0)
+
+    def test_nine_hole_differential(self):
+        """Test that a 9 hole score is rated against half the course rating and adds the
+        expected score for the other 9 holes, or counts twice without an index"""
+        self.assertEqual(scoreDifferential(41, 9, self.tee), 10.0)
+        self.assertEqual(scoreDifferential(41, 9, self.tee, index=10.0), round(5 + 10.0 * 0.52 + 1.197, 1))
+
+    def test_unrated_tee_has_no_differential(self):
+        """Test that a tee without ratings gives no differential"""
+        self.tee.slope_rating = None
+        self.assertIsNone(scoreDifferential(85, 18, self.tee))
+
+    def test_handicap_index_table(self):
+        """Test that the index averages the right number of lowest differentials"""
+        self.assertIsNone(handicapIndex([10.0, 12.0]))
+        self.assertEqual(handicapIndex([10.0, 12.0, 14.0]), 8.0)
+        self.assertEqual(handicapIndex([float(value) for value in range(20)]), 3.5)
+
+    def test_handicap_index_uses_most_recent_twenty(self):
+        """Test that low differentials older than the 20 most recent don't count"""
+        self.assertEqual(handicapIndex([20.0] * 20 + [0.0] * 5), 20.0)
+
+    def test_incomplete_round_has_no_differential(self):
+        """Test that a round is only rated once every hole has a score"""
+        round = Round.objects.create(player=self.user, course=self.course, tees=self.tee, num_of_holes='18')
+        Score.objects.create(round=round, hole_number=1, par=4, yardage=400, score=4)
+        self.assertIsNone(Round.objects.get(pk=round.pk).differential)
+
+    def test_score_save_updates_differential_and_index(self):
+        """Test that saving scores rates the round and updates the player's handicap"""
+        for total in (80, 82, 90):
+            self.playRound(total)
+        round = Round.objects.create(player=self.user, course=self.course, tees=self.tee, num_of_holes='18')
+        for hole in range(18):
+            Score.objects.create(round=round, hole_number=hole + 1, par=4, yardage=400, score=4)
+        self.assertEqual(Round.objects.get(pk=round.pk).differential, 0.0)
+        self.assertEqual(Handicap.objects.get(player=self.user).index, 0.0 - 1.0)
+
+    def test_window_keeps_the_newest_twenty(self):
+        """Test that only the 20 most recent rounds count towards the index"""
+        for total in [72] * 5 + [90] * 20:
+            self.playRound(total)
+        handicap = Handicap.objects.get(player=self.user)
+        self.assertEqual(len(handicap.window), 20)
+        self.assertEqual(handicap.index, 18.0)
+
+    def test_editing_round_outside_window_changes_nothing(self):
+        """Test that rescoring a round older than the window doesn't touch the handicap"""
+        old = self.playRound(72)
+        for total in [90] * 20:
+            self.playRound(total)
+        before = Handicap.objects.get(player=self.user).last_updated
+        score = old.score_set.first()
+        score.score += 1
+        score.save()
+        self.assertEqual(Round.objects.get(pk=old.pk).differential, 1.0)
+        self.assertEqual(Handicap.objects.get(player=self.user).last_updated, before)
+
+    def test_deleting_round_refills_window(self):
+        """Test that deleting a round from a full window brings the next older round back in"""
+        old = self.playRound(72)
+        rounds = [self.playRound(total) for total in [90] * 20]
+        rounds[-1].delete()
+        handicap = Handicap.objects.get(player=self.user)
+        self.assertEqual(len(handicap.window), 20)
+        self.assertEqual(handicap.window[-1][0], old.pk)
+        self.assertEqual(handicap.index, round((0.0 + 18.0 * 7) / 8, 1))
+
+    def test_incremental_matches_replay(self):
+        """Test that the incrementally maintained handicap matches replaying every round"""
+        for total, num_of_holes in [(85, '18'), (40, 'F9'), (78, '18'), (44, 'B9'), (90, '18'), (81, '18'), (39, 'F9')]:
+            self.playRound(total, num_of_holes)
+        handicap = Handicap.objects.get(player=self.user)
+        replayed = (Round.objects.select_related('tees__course').filter(player=self.user)
+                    .annotate(total=Sum('score__score'), scored_holes=Count('score__score')).order_by('datetime', 'id'))
+        index, window = replayRounds(replayed)
+        self.assertEqual(handicap.index, index)
+        self.assertEqual(handicap.window, window)
+
+
+    def test_incremental_updates_match_rebuild(self):
+        """Test that rescoring and deleting older rounds leaves the same differentials and index
+        as rebuild_handicaps, with 9 hole rounds priced at the index the player had when they played"""
+        rounds = [self.playRound(total, num_of_holes) for total, num_of_holes in
+                  [(85, '18'), (78, '18'), (90, '18'), (40, 'F9'), (81, '18'), (44, 'B9'), (76, '18'), (39, 'F9')]]
+        score = rounds[1].score_set.first()
+        score.score += 6
+        score.save()
+        rounds[2].delete()
+        incremental = dict(Round.objects.filter(player=self.user).values_list('id', 'differential'))
+        index = Handicap.objects.get(player=self.user).index
+
+        call_command('rebuild_handicaps', stdout=StringIO())
+        self.assertEqual(dict(Round.objects.filter(player=self.user).values_list('id', 'differential')), incremental)
+        self.assertEqual(Handicap.objects.get(player=self.user).index, index)
+
+
+class LeaderboardTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                            creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='White', course=self.course)
+
+    def playRound(self, scores, public=True, num_of_holes='F9'):
+        ''' Create a round and enter each score through Score.save '''
+        round = Round.objects.create(player=self.user, course=self.course, tees=self.tee,
+                                     num_of_holes=num_of_holes, public=public)
+        for hole, score in enumerate(scores):
+            Score.objects.create(round=round, hole_number=hole + 1, par=4, yardage=400, score=score)
+        return round
+
+    def test_completed_public_round_is_added(self):
+        """Test that a public round joins the leaderboard once every hole is scored"""
+        round = self.playRound([4] * 8)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        Score.objects.create(round=round, hole_number=9, par=4, yardage=400, score=5)
+        entry = LeaderboardEntry.objects.get(round=round)
+        self.assertEqual((entry.holes, entry.gross, entry.to_par), (9, 37, 1))
+
+    def test_private_round_is_not_added(self):
+        """Test that private rounds stay off the leaderboard and leave it when made private"""
+        round = self.playRound([4] * 9, public=False)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        round.public = True
+        round.save()
+        self.assertTrue(LeaderboardEntry.objects.filter(round=round).exists())
+        round.public = False
+        round.save(update_fields=['public'])
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_score_changes_update_entry(self):
+        """Test that editing a score updates the entry and deleting one removes it"""
+        round = self.playRound([4] * 9)
+        score = round.score_set.get(hole_number=1)
+        score.score = 3
+        score.save()
+        self.assertEqual(LeaderboardEntry.objects.get(round=round).gross, 35)
+        score.delete()
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_seeded_round_joins_once_scored(self):
+        """Test that a round with empty seeded scores only joins once they are all entered"""
+        round = Round.objects.create(player=self.user, course=self.course, tees=self.tee,
+                                     num_of_holes='F9', public=True)
+        Score.objects.bulk_create([Score(round=round, hole_number=i + 1, par=4, yardage=400) for i in range(9)])
+        for score in round.score_set.all()[:8]:
+            score.score = 4
+            score.save()
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        score = round.score_set.get(hole_number=9)
+        score.score = 4
+        score.save()
+        self.assertTrue(LeaderboardEntry.objects.filter(round=round).exists())
+
+    def test_pages_are_ordered(self):
+        """Test the gross, to par and most recent orderings of a board"""
+        best, worst, latest = self.playRound([3] * 9), self.playRound([6] * 9), self.playRound([4] * 9)
+        self.playRound([4] * 18, num_of_holes='18')
+        entries, next_cursor = leaderboardPage(self.course.id, holes=9)
+        self.assertEqual([entry.round for entry in entries], [best, latest, worst])
+        entries, next_cursor = leaderboardPage(self.course.id, holes=9, order='recent')
+        self.assertEqual([entry.round for entry in entries], [latest, worst, best])
+        entries, next_cursor = leaderboardPage(self.course.id, holes=9, tees_id=self.tee.id, order='to_par')
+        self.assertEqual([entry.to_par for entry in entries], [-9, 0, 18])
+        self.assertIsNone(next_cursor)
+
+
+class RoundTotalsTestCase(TestCase):
+    def setUp(self) -> None:
+        user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=user, num_of_holes="18")
+        self.round = Round.objects.create(player=user, course=course, num_of_holes='18')
+
+    def totals(self):
+        round = Round.objects.get(pk=self.round.pk)
+        return {field: getattr(round, field) for field in Round.TOTAL_FIELDS}
+
+    def test_score_writes_keep_totals(self):
+        """Test that saving and deleting scores keeps the stored totals in step"""
+        Score.objects.create(round=self.round, hole_number=1, par=4, yardage=400, score=5)
+        back = Score.objects.create(round=self.round, hole_number=10, par=3, yardage=150, score=2)
+        self.assertEqual(self.totals(), {'gross_score': 7, 'total_par': 7, 'to_par': 0,
+                                         'front_nine': 5, 'back_nine': 2, 'holes_played': 2})
+        back.delete()
+        self.assertEqual(self.totals(), {'gross_score': 5, 'total_par': 4, 'to_par': 1,
+                                         'front_nine': 5, 'back_nine': 0, 'holes_played': 1})
+
+    def test_empty_scores_are_not_counted(self):
+        """Test that holes without a score count towards none of the totals"""
+        Score.objects.create(round=self.round, hole_number=1, par=4, yardage=400, score=3)
+        Score.objects.create(round=self.round, hole_number=2, par=5, yardage=500)
+        self.assertEqual(self.totals(), {'gross_score': 3, 'total_par': 4, 'to_par': -1,
+                                         'front_nine': 3, 'back_nine': 0, 'holes_played': 1})
+
+    def test_saving_older_copy_keeps_totals(self):
+        """Test that saving a copy of the round loaded before its scores changed keeps the totals"""
+        Score.objects.create(round=self.round, hole_number=1, par=4, yardage=400, score=5)
+        self.round.public = True
+        self.round.save()
+        self.assertEqual(self.totals()['gross_score'], 5)
+        self.assertEqual(Round.objects.get(pk=self.round.pk).version, 1)
@@ -1,9 +1,19 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
+from django.test import TestCase, Client
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from django.db import connection, IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
 
 from ..views import isOwnerOrPublic, isOwner
-from ..models import Round, Score
-from courselibrary.models import Course, Tee
+from ..caching import getOrRebuild
+from .. import autosave
+from ..models import Round, Score, Handicap, ScoreBatch
+from courselibrary.models import Course, Tee, Hole
+from golftracker.pagination import PAGE_SIZE
 
 
 class IsOwnerOrPublicHelperFunctionTestCase(TestCase):
@@ -71,4 +81,588 @@ class IsOwnerHelperFunctionTestCase(TestCase):
         user = User.objects.get(username='testuser')
         round = Round.objects.get(pk=2)
         result = isOwnerOrPublic(round, user)
-        self.assertTrue(result)
\ No newline at end of file
+        self.assertTrue(result)
+
+
+class RoundListViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN',
+                                            creator=self.user, num_of_holes="09")
+        self.other_course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                                  creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='Red', course=self.course)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def createRounds(self, count, **kwargs):
+        kwargs.setdefault('course', self.course)
+        return [Round.objects.create(player=self.user, num_of_holes='F9', **kwargs) for i in range(count)]
+
+    def test_rounds_are_paginated_newest_first(self):
+        """Check that following the next cursor reaches every round, newest first, including
+        rounds created in the same instant"""
+        rounds = self.createRounds(PAGE_SIZE + 5)
+        Round.objects.update(datetime=timezone.now())
+        response = self.client.get('/roundslibrary/')
+        self.assertEqual(response.context['rounds_list'], rounds[::-1][:PAGE_SIZE])
+        response = self.client.get('/roundslibrary/', {'after': response.context['next_cursor']})
+        self.assertEqual(response.context['rounds_list'], rounds[::-1][PAGE_SIZE:])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_only_lists_own_rounds(self):
+        """Check that other players' rounds are never listed"""
+        other = User.objects.create(username='other', password='12345')
+        Round.objects.create(player=other, course=self.course, num_of_holes='F9', public=True)
+        response = self.client.get('/roundslibrary/')
+        self.assertEqual(response.context['rounds_list'], [])
+
+    def test_filters(self):
+        """Check that rounds can be filtered by course, tees, holes and public, and that
+        the filters are kept in the page links"""
+        at_course = self.createRounds(2, tees=self.tee)
+        public = Round.objects.create(player=self.user, course=self.other_course, num_of_holes='18', public=True)
+        response = self.client.get('/roundslibrary/', {'course': self.course.pk})
+        self.assertEqual(response.context['rounds_list'], at_course[::-1])
+        response = self.client.get('/roundslibrary/', {'tees': self.tee.pk})
+        self.assertEqual(response.context['rounds_list'], at_course[::-1])
+        response = self.client.get('/roundslibrary/', {'num_of_holes': '18'})
+        self.assertEqual(response.context['rounds_list'], [public])
+        response = self.client.get('/roundslibrary/', {'public': 'true'})
+        self.assertEqual(response.context['rounds_list'], [public])
+        self.assertEqual(response.context['filters'], 'public=true')
+
+    def test_date_range_filter(self):
+        """Check that the date range includes both the first and last day"""
+        old, new = self.createRounds(2)
+        Round.objects.filter(pk=old.pk).update(datetime=timezone.now() - timezone.timedelta(days=10))
+        today = timezone.localdate()
+        response = self.client.get('/roundslibrary/', {'played_after': today, 'played_before': today})
+        self.assertEqual(response.context['rounds_list'], [new])
+        response = self.client.get('/roundslibrary/', {'played_before': today - timezone.timedelta(days=10)})
+        self.assertEqual(response.context['rounds_list'], [old])
+
+    def test_invalid_filter_is_ignored(self):
+        """Check that an invalid filter is dropped while the others still apply"""
+        rounds = self.createRounds(1)
+        Round.objects.create(player=self.user, course=self.other_course, num_of_holes='18')
+        response = self.client.get('/roundslibrary/', {'course': self.course.pk, 'played_after': 'yesterday'})
+        self.assertEqual(response.context['rounds_list'], rounds)
+
+    def test_invalid_cursor_raises_404(self):
+        """Check that a tampered page cursor returns a 404"""
+        response = self.client.get('/roundslibrary/', {'after': 'notacursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count_does_not_grow_with_rounds(self):
+        """Check that a page of rounds with their courses and tees takes a fixed number of
+        queries (session, user, rounds) however many rounds the player has"""
+        self.createRounds(PAGE_SIZE * 2, tees=self.tee)
+        response = self.client.get('/roundslibrary/')
+        with self.assertNumQueries(3):
+            self.client.get('/roundslibrary/', {'after': response.context['next_cursor']})
+
+
+class RoundDetailViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course',
+                              location='Roseville, MN',
+                              creator=self.user, num_of_holes="09")
+        tee = Tee.objects.create(name='Red', course=course)
+        round = Round.objects.create(player=self.user, course=course,
+                                     tees=tee, num_of_holes='F9')
+        self.score = Score.objects.create(round=round, hole_number=1, par=4, yardage=350, score=5)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_renders_correct_template(self):
+        """Check that the correct template is rendered"""
+        response = self.client.get('/roundslibrary/1/')
+        self.assertTemplateUsed(response, 'rounds/round_detail.html')
+
+    def test_rejects_private_round_of_other_user(self):
+        """Check that another user can't see a private round, even with an etag"""
+        etag = self.client.get('/roundslibrary/1/')['ETag']
+        other = User.objects.create(username='nonowner', password='12345')
+        client = Client()
+        client.force_login(other)
+        response = client.get('/roundslibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 403)
+
+    def test_unchanged_round_returns_304(self):
+        """Check that a client polling an unchanged round gets a 304"""
+        etag = self.client.get('/roundslibrary/1/')['ETag']
+        response = self.client.get('/roundslibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, 'rounds/round_detail.html')
+
+    def test_score_change_updates_round(self):
+        """Check that entering a score moves the round's last_updated so the
+        next poll gets the new page"""
+        etag = self.client.get('/roundslibrary/1/')['ETag']
+        before = Round.objects.get(pk=1).last_updated
+        self.score.score = 4
+        self.score.save()
+        self.assertGreater(Round.objects.get(pk=1).last_updated, before)
+        response = self.client.get('/roundslibrary/1/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Score: <b>4</b>')
+
+    def test_scores_are_ordered_by_hole(self):
+        """Check that the scorecard lists the scores by hole number whatever order they were entered in"""
+        round = Round.objects.get(pk=1)
+        Score.objects.create(round=round, hole_number=3, par=3, yardage=150, score=3)
+        Score.objects.create(round=round, hole_number=2, par=5, yardage=480, score=6)
+        response = self.client.get('/roundslibrary/1/')
+        self.assertEqual([score.hole_number for score in response.context['round'].score_set.all()], [1, 2, 3])
+
+    def test_detail_query_count(self):
+        """Check that the scorecard takes a fixed number of queries (session, user, round with
+        its course and tees, scores) and a 304 skips loading the scores"""
+        round = Round.objects.get(pk=1)
+        Score.objects.create(round=round, hole_number=2, par=5, yardage=480, score=6)
+        with self.assertNumQueries(4):
+            etag = self.client.get('/roundslibrary/1/')['ETag']
+        with self.assertNumQueries(3):
+            self.client.get('/roundslibrary/1/', headers={'If-None-Match': etag})
+
+
+class RoundUpdateDeleteViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN',
+                                       creator=self.user, num_of_holes="09")
+        self.round = Round.objects.create(player=self.user, course=course, num_of_holes='F9')
+        self.other = Client()
+        self.other.force_login(User.objects.create(username='nonowner', password='12345'))
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_update_redirects_to_round(self):
+        """Check that updating a round saves it and redirects to its page"""
+        response = self.client.post(f'/roundslibrary/{self.round.pk}/update/',
+                                    {'course': self.round.course_id, 'num_of_holes': 'B9'})
+        self.assertRedirects(response, f'/roundslibrary/{self.round.pk}/')
+        self.assertEqual(Round.objects.get(pk=self.round.pk).num_of_holes, 'B9')
+
+    def test_delete_redirects_to_library(self):
+        """Check that deleting a round removes it and redirects to the round library"""
+        response = self.client.post(f'/roundslibrary/{self.round.pk}/delete/')
+        self.assertRedirects(response, '/roundslibrary/')
+        self.assertFalse(Round.objects.filter(pk=self.round.pk).exists())
+
+    def test_other_user_cannot_change_round(self):
+        """Check that another user can neither open nor post the update and delete pages"""
+        for url in (f'/roundslibrary/{self.round.pk}/update/', f'/roundslibrary/{self.round.pk}/delete/'):
+            self.assertEqual(self.other.get(url).status_code, 403)
+        response = self.other.post(f'/roundslibrary/{self.round.pk}/update/', {'num_of_holes': 'B9'})
+        self.assertEqual(response.status_code, 403)
+        response = self.other.post(f'/roundslibrary/{self.round.pk}/delete/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Round.objects.get(pk=self.round.pk).num_of_holes, 'F9')
+
+    def test_update_fetches_round_once(self):
+        """Check that the round is looked up once for the permission check, the form and the success url"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/roundslibrary/{self.round.pk}/update/',
+                             {'course': self.round.course_id, 'num_of_holes': 'B9'})
+        lookups = [query for query in queries.captured_queries
+                   if query['sql'].startswith('SELECT') and 'FROM "rounds_round" WHERE "rounds_round"."id" =' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+
+
+class DashboardViewTestCase(TestCase):
+    def setUp(self) -> None:
+        #Player ids are reused between tests, so cached dashboards must not carry over
+        cache.clear()
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Cedarholm Golf Course',
+                              location='Roseville, MN',
+                              creator=self.user, num_of_holes="09")
+        tee = Tee.objects.create(name='Red', course=course)
+        round = Round.objects.create(player=self.user, course=course,
+                                     tees=tee, num_of_holes='F9')
+        Score.objects.create(round=round, hole_number=1, par=3, yardage=140, score=2)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_shows_player_stats(self):
+        """Check that the dashboard shows the player's stats"""
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['stats']['holes'], 1)
+        self.assertContains(response, 'Birdie: 1 (100%)')
+        self.assertContains(response, 'Par 3: -1.00')
+
+    def test_no_stats_without_scores(self):
+        """Check that a player without any scores gets no stats section"""
+        client = Client()
+        client.force_login(User.objects.create(username='newplayer', password='12345'))
+        response = client.get('/dashboard/')
+        self.assertIsNone(response.context['stats'])
+        self.assertNotContains(response, 'Your Stats')
+
+    def test_shows_handicap_index(self):
+        """Check that the dashboard shows the player's handicap index once they have one"""
+        response = self.client.get('/dashboard/')
+        self.assertNotContains(response, 'Handicap Index')
+        Handicap.objects.create(player=self.user, index=12.4)
+        response = self.client.get('/dashboard/')
+        self.assertContains(response, 'Handicap Index: 12.4')
+
+    def test_only_shows_own_recent_rounds(self):
+        """Check that the dashboard lists only the player's own rounds, newest first and
+        limited to the most recent ones"""
+        other = User.objects.create(username='other', password='12345')
+        course = Course.objects.get(name='Cedarholm Golf Course')
+        Round.objects.create(player=other, course=course, num_of_holes='F9')
+        newest = [Round.objects.create(player=self.user, course=course, num_of_holes='F9') for i in range(12)]
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['rounds'], newest[::-1][:10])
+        self.assertEqual(response.context['summary']['rounds'], 13)
+        self.assertEqual(response.context['summary']['courses'], 1)
+        self.assertContains(response, 'See all rounds')
+
+    def test_second_request_is_served_from_cache(self):
+        """Check that once cached, the dashboard only queries the session and user"""
+        self.client.get('/dashboard/')
+        with self.assertNumQueries(2):
+            self.client.get('/dashboard/')
+
+    def test_round_write_invalidates_cache(self):
+        """Check that adding a round or a score shows up on the next dashboard"""
+        self.client.get('/dashboard/')
+        round = Round.objects.create(player=self.user, course=Course.objects.first(), num_of_holes='F9')
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['summary']['rounds'], 2)
+        Score.objects.create(round=round, hole_number=1, par=3, yardage=140, score=3)
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['stats']['holes'], 2)
+
+    def test_cache_is_per_player(self):
+        """Check that another player never sees a cached dashboard"""
+        self.client.get('/dashboard/')
+        client = Client()
+        client.force_login(User.objects.create(username='newplayer', password='12345'))
+        response = client.get('/dashboard/')
+        self.assertEqual(response.context['rounds'], [])
+
+
+class RoundStartViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                            creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='White', course=self.course, course_rating=72.0, slope_rating=113)
+        Hole.objects.bulk_create([Hole(number=i + 1, par=4, yards=300 + i, tees=self.tee) for i in range(18)])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_start_seeds_scores_from_tee(self):
+        """Check that starting a back 9 creates the round with an empty score for holes 10 to 18
+        copied from the tee, then redirects to the scorecard"""
+        response = self.client.post(f'/roundslibrary/start/{self.course.pk}/', {'tees': self.tee.pk, 'num_of_holes': 'B9'})
+        round = Round.objects.get()
+        self.assertRedirects(response, f'/roundslibrary/{round.pk}/scorecard/')
+        self.assertEqual((round.player, round.course, round.tees), (self.user, self.course, self.tee))
+        scores = list(round.score_set.order_by('hole_number').values_list('hole_number', 'par', 'yardage', 'score'))
+        self.assertEqual(scores, [(i, 4, 299 + i, None) for i in range(10, 19)])
+
+    def test_start_query_count(self):
+        """Check that starting a round takes a fixed number of queries whatever the number of holes"""
+        with self.assertNumQueries(10):
+            self.client.post(f'/roundslibrary/start/{self.course.pk}/', {'tees': self.tee.pk, 'num_of_holes': 'F9'})
+        with self.assertNumQueries(10):
+            self.client.post(f'/roundslibrary/start/{self.course.pk}/', {'tees': self.tee.pk, 'num_of_holes': '18'})
+
+    def test_rejects_tees_of_other_course(self):
+        """Check that only the course's own tees can be picked"""
+        other = Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN',
+                                      creator=self.user, num_of_holes="18")
+        other_tee = Tee.objects.create(name='Red', course=other)
+        response = self.client.post(f'/roundslibrary/start/{self.course.pk}/', {'tees': other_tee.pk, 'num_of_holes': '18'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Round.objects.exists())
+
+    def test_rejects_tees_missing_holes(self):
+        """Check that a round can't start from tees without every hole filled in"""
+        Hole.objects.filter(tees=self.tee, number=18).delete()
+        response = self.client.post(f'/roundslibrary/start/{self.course.pk}/', {'tees': self.tee.pk, 'num_of_holes': '18'})
+        self.assertContains(response, "every hole of the round")
+        self.assertFalse(Round.objects.exists())
+
+
+class ScorecardEntryViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=self.user, num_of_holes="18")
+        tee = Tee.objects.create(name='White', course=course, course_rating=72.0, slope_rating=113)
+        self.round = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='F9')
+        self.scores = Score.objects.bulk_create([Score(round=self.round, hole_number=i + 1, par=4, yardage=400)
+                                                 for i in range(9)])
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def postScores(self, values, client=None):
+        data = {'form-TOTAL_FORMS': len(self.scores), 'form-INITIAL_FORMS': len(self.scores)}
+        for i, (score, value) in enumerate(zip(self.scores, values)):
+            data[f'form-{i}-id'] = score.pk
+            data[f'form-{i}-score'] = value
+        return (client or self.client).post(f'/roundslibrary/{self.round.pk}/scorecard/', data)
+
+    def test_saves_scores_and_rates_round(self):
+        """Check that entering every score saves them, rates the round and moves its last_updated"""
+        before = self.round.last_updated
+        response = self.postScores([4] * 8 + [5])
+        self.assertRedirects(response, f'/roundslibrary/{self.round.pk}/')
+        self.assertEqual(list(self.round.score_set.order_by('hole_number').values_list('score', flat=True)), [4] * 8 + [5])
+        round = Round.objects.get(pk=self.round.pk)
+        self.assertEqual(round.differential, 2.0)
+        self.assertGreater(round.last_updated, before)
+
+    def test_partial_scorecard(self):
+        """Check that holes can be left empty and the round isn't rated until they are filled in"""
+        self.postScores([4, 5, ''] + [''] * 6)
+        self.assertEqual(self.round.score_set.filter(score__isnull=False).count(), 2)
+        self.assertIsNone(Round.objects.get(pk=self.round.pk).differential)
+
+    def test_query_count(self):
+        """Check that saving a scorecard takes the same number of queries however many scores changed"""
+        self.postScores([4] * 9)
+        with CaptureQueriesContext(connection) as one_changed:
+            self.postScores([5] + [4] * 8)
+        with CaptureQueriesContext(connection) as all_changed:
+            self.postScores([6] * 9)
+        self.assertEqual(len(one_changed), len(all_changed))
+
+    def test_invalid_score_is_rejected(self):
+        """Check that a score below 1 isn't saved"""
+        response = self.postScores([0] + [4] * 8)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.round.score_set.filter(score__isnull=False).exists())
+
+    def test_other_user_cannot_enter_scores(self):
+        """Check that only the player can enter scores for their round"""
+        other = Client()
+        other.force_login(User.objects.create(username='nonowner', password='12345'))
+        self.assertEqual(other.get(f'/roundslibrary/{self.round.pk}/scorecard/').status_code, 403)
+        self.assertEqual(self.postScores([4] * 9, client=other).status_code, 403)
+
+
+class ScoreAutosaveViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                       creator=self.user, num_of_holes="18")
+        tee = Tee.objects.create(name='White', course=course, course_rating=72.0, slope_rating=113)
+        self.round = Round.objects.create(player=self.user, course=course, tees=tee, num_of_holes='F9')
+        Score.objects.bulk_create([Score(round=self.round, hole_number=i + 1, par=4, yardage=400) for i in range(9)])
+        self.url = f'/roundslibrary/{self.round.pk}/scores/'
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def autosave(self, key, version, scores):
+        return self.client.post(self.url, {'key': key, 'version': version, 'scores': scores},
+                                content_type='application/json')
+
+    def holeScores(self):
+        return dict(self.round.score_set.values_list('hole_number', 'score'))
+
+    def test_batch_is_applied(self):
+        """Check that a batch saves its scores and moves the round to the next version"""
+        response = self.autosave('a1', 0, {'1': 4, '2': 5})
+        self.assertEqual(response.json(), {'version': 1})
+        self.assertEqual(self.holeScores()[1], 4)
+        self.assertEqual(self.holeScores()[2], 5)
+        self.assertEqual(Round.objects.get(pk=self.round.pk).version, 1)
+
+    def test_retry_is_applied_once(self):
+        """Check that resending a batch with the same key gets the same answer without
+        applying it again, even once the round has moved on"""
+        first = self.autosave('a1', 0, {'1': 4})
+        self.autosave('a2', 1, {'1': 6})
+        retry = self.autosave('a1', 0, {'1': 4})
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(self.holeScores()[1], 6)
+        self.assertEqual(Round.objects.get(pk=self.round.pk).version, 2)
+
+    def test_concurrent_retry_gets_its_version(self):
+        """Check that a retry that passed the first check while the same batch was being
+        saved by another request answers with the version that batch produced"""
+        ScoreBatch.objects.create(round=self.round, key='a1', version=1)
+        lookups = iter([lambda round_id, key: None, autosave._appliedVersion])
+        with patch('rounds.autosave._appliedVersion', side_effect=lambda *args: next(lookups)(*args)):
+            self.assertEqual(autosave.applyScoreBatch(self.round.pk, 'a1', 0, {1: 4}), (200, {'version': 1}))
+        self.assertIsNone(self.holeScores()[1])
+
+    def test_other_integrity_errors_are_raised(self):
+        """Check that an integrity error that isn't a saved retry is raised as itself"""
+        with patch('rounds.autosave.Score.objects.bulk_update', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                autosave.applyScoreBatch(self.round.pk, 'a1', 0, {1: 4})
+        self.assertFalse(ScoreBatch.objects.exists())
+
+    def test_stale_version_conflicts(self):
+        """Check that a batch based on an old version of the round is refused"""
+        self.autosave('a1', 0, {'1': 4})
+        response = self.autosave('b1', 0, {'1': 7})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(self.holeScores()[1], 4)
+
+    def test_score_signals_move_the_version(self):
+        """Check that scores saved elsewhere also move the version, so autosaves based on the
+        old scores are refused"""
+        score = self.round.score_set.get(hole_number=3)
+        score.score = 3
+        score.save()
+        self.assertEqual(self.autosave('a1', 0, {'3': 5}).status_code, 409)
+
+    def test_completed_round_is_rated(self):
+        """Check that the batch finishing the round rates it"""
+        self.autosave('a1', 0, {str(hole): 4 for hole in range(1, 10)})
+        self.assertEqual(Round.objects.get(pk=self.round.pk).differential, 0.0)
+
+    def test_invalid_batches(self):
+        """Check that malformed batches and unknown holes are rejected without changing anything"""
+        for scores in ({'1': 0}, {'1': 'four'}, {'one': 4}, {}):
+            self.assertEqual(self.autosave('a1', 0, scores).status_code, 400)
+        self.assertEqual(self.autosave('a1', 0, {'12': 4}).status_code, 400)
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Round.objects.get(pk=self.round.pk).version, 0)
+        self.assertFalse(ScoreBatch.objects.exists())
+
+    def test_polling_unchanged_round_returns_304(self):
+        """Check that polling gets the scores, then a 304 until they change"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['version'], 0)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        self.autosave('a1', 0, {'1': 4})
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.json()['scores']['1'], 4)
+
+    def test_other_user_cannot_autosave(self):
+        """Check that only the player can save or poll their scores"""
+        self.client.force_login(User.objects.create(username='nonowner', password='12345'))
+        self.assertEqual(self.autosave('a1', 0, {'1': 4}).status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class CourseLeaderboardViewTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                            creator=self.user, num_of_holes="18")
+        self.tee = Tee.objects.create(name='White', course=self.course)
+        for total in range(PAGE_SIZE + 2):
+            round = Round.objects.create(player=self.user, course=self.course, tees=self.tee,
+                                         num_of_holes='18', public=True)
+            Score.objects.bulk_create([Score(round=round, hole_number=hole + 1, par=4, yardage=400,
+                                             score=4 + (1 if hole < total % 18 else 0))
+                                       for hole in range(18)])
+        call_command('rebuild_leaderboards', stdout=StringIO())
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_board_is_paginated(self):
+        """Check that the leaderboard pages through every entry, best first"""
+        response = self.client.get(f'/leaderboard/{self.course.pk}/')
+        first_page = [entry.gross for entry in response.context['entries']]
+        self.assertEqual(first_page, sorted(first_page))
+        response = self.client.get(f'/leaderboard/{self.course.pk}/', {'after': response.context['next_cursor']})
+        self.assertEqual(len(first_page) + len(response.context['entries']), PAGE_SIZE + 2)
+        self.assertGreaterEqual(response.context['entries'][0].gross, first_page[-1])
+
+    def test_query_count(self):
+        """Check that a page of the board takes a fixed number of queries (session, user,
+        course, tees, entries with their players and tees)"""
+        with self.assertNumQueries(5):
+            self.client.get(f'/leaderboard/{self.course.pk}/', {'tees': self.tee.pk, 'order': 'to_par'})
+
+    def test_other_course_tees_are_ignored(self):
+        """Check that picking a tee of another course shows the whole course board"""
+        response = self.client.get(f'/leaderboard/{self.course.pk}/', {'tees': 9999})
+        self.assertIsNone(response.context['tees_id'])
+        self.assertEqual(len(response.context['entries']), PAGE_SIZE)
+
+
+class PublicFeedViewTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.course = Course.objects.create(name='Keller Golf Course', location='Maplewood, MN',
+                                            creator=self.user, num_of_holes="18")
+        self.other_course = Course.objects.create(name='Cedarholm Golf Course', location='Roseville, MN',
+                                                  creator=self.user, num_of_holes="09")
+        self.client = Client()
+
+    def createRound(self, course=None, public=True):
+        return Round.objects.create(player=self.user, course=course or self.course, num_of_holes='F9', public=public)
+
+    def test_lists_public_rounds_newest_first(self):
+        """Check that the feed shows every player's public rounds, newest first, without logging in"""
+        older, newer = self.createRound(), self.createRound(self.other_course)
+        self.createRound(public=False)
+        response = self.client.get('/feed/')
+        self.assertEqual(response.context['rounds'], [newer, older])
+        response = self.client.get('/feed/', {'course': self.other_course.pk})
+        self.assertEqual(response.context['rounds'], [newer])
+
+    def test_feed_is_paginated(self):
+        """Check that following the next cursor reaches the older public rounds"""
+        rounds = [self.createRound() for i in range(PAGE_SIZE + 3)]
+        response = self.client.get('/feed/')
+        self.assertEqual(len(response.context['rounds']), PAGE_SIZE)
+        response = self.client.get('/feed/', {'after': response.context['next_cursor']})
+        self.assertEqual(response.context['rounds'], rounds[:3][::-1])
+
+    def test_first_page_is_cached(self):
+        """Check that the first page is loaded in one query with the players, courses and
+        tees, and then served from the cache"""
+        self.createRound()
+        with self.assertNumQueries(1):
+            self.client.get('/feed/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/feed/')
+        self.assertContains(response, 'testuser at Keller Golf Course')
+
+    def test_cached_page_holds_no_private_user_fields(self):
+        """Check that the players cached with the shared first page only have their usernames loaded"""
+        self.createRound()
+        response = self.client.get('/feed/')
+        player = response.context['rounds'][0].player
+        self.assertEqual(player.get_deferred_fields() & {'password', 'email', 'is_staff'},
+                         {'password', 'email', 'is_staff'})
+
+    def test_unknown_course_is_not_cached(self):
+        """Check that filtering by a course that doesn't exist is a 404 rather than a new cache entry"""
+        response = self.client.get('/feed/', {'course': 9999})
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get('rounds:feed:9999:first'))
+
+
+class GetOrRebuildTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_rebuilds_once_expired(self):
+        """Check that a value is cached until its timeout, then rebuilt"""
+        self.assertEqual(getOrRebuild('test:fresh', self.build, 30), 1)
+        self.assertEqual(getOrRebuild('test:fresh', self.build, 30), 1)
+        self.assertEqual(getOrRebuild('test:expired', self.build, -1), 2)
+        self.assertEqual(getOrRebuild('test:expired', self.build, -1), 3)
+
+    def test_stale_copy_served_during_rebuild(self):
+        """Check that while another request rebuilds an expired value, the stale copy is served"""
+        getOrRebuild('test:feed', self.build, -1)
+        cache.add('test:feed:lock', 1)
+        self.assertEqual(getOrRebuild('test:feed', self.build, 30), 1)
+        self.assertEqual(self.builds, 1)
@@ -0,0 +1,43 @@
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+#Score totals stored on each round, kept up to date as its scores change
+TOTAL_FIELDS = ['gross_score', 'total_par', 'to_par', 'front_nine', 'back_nine', 'holes_played']
+
+
+def totalsAggregates(prefix='') -> dict:
+    ''' Aggregate expressions for the score totals, prefix is the lookup path to the
+        scores ('' from a score queryset, 'score__' from a round queryset). Holes without
+        a score yet don't count towards any of them, par included '''
+    entered = Q(**{f'{prefix}score__isnull': False})
+    return {
+        'gross_score': Coalesce(Sum(f'{prefix}score'), 0),
+        'total_par': Coalesce(Sum(f'{prefix}par', filter=entered), 0),
+        'to_par': Coalesce(Sum(F(f'{prefix}score') - F(f'{prefix}par')), 0),
+        'front_nine': Coalesce(Sum(f'{prefix}score', filter=Q(**{f'{prefix}hole_number__lte': 9})), 0),
+        'back_nine': Coalesce(Sum(f'{prefix}score', filter=Q(**{f'{prefix}hole_number__gt': 9})), 0),
+        'holes_played': Count(f'{prefix}score'),
+    }
+
+
+def staleTotals(Round, batch_size=500):
+    ''' (rounds checked, rounds whose stored totals don't match their scores). The stale rounds
+        have their totals set to the computed ones without being saved. Takes the Round model
+        so the 0012 migration can run it on its historical one '''
+    aggregates = {f'computed_{field}': expression for field, expression in totalsAggregates('score__').items()}
+    rounds = Round.objects.annotate(**aggregates).order_by('id')
+
+    stale = []
+    checked = 0
+    for round in rounds.iterator(chunk_size=batch_size):
+        checked += 1
+        changed = False
+        for field in TOTAL_FIELDS:
+            computed = getattr(round, f'computed_{field}')
+            if getattr(round, field) != computed:
+                setattr(round, field, computed)
+                changed = True
+        if changed:
+            stale.append(round)
+    return checked, stale
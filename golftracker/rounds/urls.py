@@ -5,8 +5,13 @@ app_name = "rounds"
 urlpatterns = [
     path('', views.welcome, name='dashboard'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('feed/', views.publicFeed, name='feed'),
     path('roundslibrary/', views.RoundListView.as_view(), name='library'),
+    path('roundslibrary/start/<int:course_id>/', views.roundStart, name='start'),
+    path('leaderboard/<int:course_id>/', views.courseLeaderboard, name='leaderboard'),
     path('roundslibrary/<int:pk>/', views.RoundDetailView.as_view(), name='detail'),
+    path('roundslibrary/<int:round_id>/scorecard/', views.scorecardEntry, name='scorecard'),
+    path('roundslibrary/<int:round_id>/scores/', views.scoreAutosave, name='autosave'),
     path('roundslibrary/<int:pk>/update/', views.RoundUpdateView.as_view(), name='update'),
     path('roundslibrary/<int:pk>/delete/', views.RoundDeleteView.as_view(), name='delete'),
 ]
\ No newline at end of file
@@ -1,35 +1,208 @@
+import json
 from typing import Any
+from django.db.models import Prefetch, prefetch_related_objects
 from django.db.models.query import QuerySet
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.http import Http404, JsonResponse
+from django.db import transaction
+from django.forms import modelformset_factory
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import generic
 from django.core.exceptions import PermissionDenied
 from django.urls import reverse
-from .models import Round
+from golftracker.conditional import conditionalResponse
+from golftracker.pagination import keysetPage
+from courselibrary.models import Course, Tee, Hole
+from .models import Round, Score
+from .caching import getDashboard
+from .forms import RoundFilterForm, RoundStartForm, BaseScoreFormSet
+from .autosave import applyScoreBatch
+from .leaderboard import leaderboardPage, BOARD_ORDERINGS
+from .feed import feedPage
+from .signals import touch_round
 
 
 def isOwnerOrPublic(round, user) -> bool:
     ''' Check if user is the owner of the round or the round is public '''
-    public = round.public
-    owner = round.player
-    return owner == user or public
+    return isOwner(round, user) or round.public
 
 
 def isOwner(round, user) -> bool:
     ''' Check if user is the owner of the round '''
-    return user == round.player
+    #Compare ids so checking doesn't load the player
+    return round.player_id == user.pk
 
 
 def welcome(request):
     return render(request, 'rounds/welcome.html')
 
 
+def publicFeed(request):
+    try:
+        course_id = int(request.GET['course'])
+    except (KeyError, ValueError):
+        course_id = None
+    #Checked before the cache key is built from it, so made up course ids can't fill the cache
+    if course_id is not None and not Course.objects.filter(pk=course_id).exists():
+        raise Http404("Course does not exist")
+    rounds, next_cursor = feedPage(course_id, request.GET.get('after'))
+
+    context = {
+        'rounds': rounds,
+        'course_id': course_id,
+        'next_cursor': next_cursor,
+        'first_page': not request.GET.get('after'),
+    }
+    return render(request, 'rounds/feed.html', context)
+
+
 @login_required
 def dashboard(request):
-    rounds = Round.objects.all()
-    context = {"rounds": rounds}
-    return render(request, 'rounds/dashboard.html', context)
+    return render(request, 'rounds/dashboard.html', getDashboard(request.user))
+
+
+@login_required
+def roundStart(request, course_id):
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        raise Http404("Course does not exist")
+
+    if request.method == 'POST':
+        form = RoundStartForm(request.POST, course=course)
+        if form.is_valid():
+            first_hole = Round.FIRST_HOLE[form.instance.num_of_holes]
+            hole_numbers = range(first_hole, first_hole + Round.HOLES_PLAYED[form.instance.num_of_holes])
+            holes = list(Hole.objects.filter(tees=form.instance.tees, number__in=hole_numbers).order_by('number'))
+            if [hole.number for hole in holes] != list(hole_numbers):
+                form.add_error('tees', "These tees don't have every hole of the round filled in.")
+            else:
+                #The round and a score row for every hole are created together, par and yardage come from the tee
+                with transaction.atomic():
+                    form.instance.player = request.user
+                    form.instance.course = course
+                    form.save()
+                    Score.objects.bulk_create([Score(round=form.instance, hole_number=hole.number,
+                                                     par=hole.par, yardage=hole.yards)
+                                               for hole in holes])
+                return redirect(reverse('rounds:scorecard', kwargs={ 'round_id': form.instance.id }))
+    else:
+        form = RoundStartForm(course=course)
+
+    context = {
+        'course': course,
+        'form': form,
+    }
+    return render(request, 'rounds/round_start.html', context)
+
+
+@login_required
+def scorecardEntry(request, round_id):
+    try:
+        round = Round.objects.select_related('course', 'tees').get(pk=round_id)
+    except Round.DoesNotExist:
+        raise Http404("Round does not exist")
+    if not isOwner(round, request.user):
+        raise PermissionDenied()
+
+    ScoreFormset = modelformset_factory(Score, formset=BaseScoreFormSet, fields=('score',),
+                                        extra=0, edit_only=True)
+    scores = Score.objects.filter(round=round).order_by('hole_number')
+
+    if request.method == 'POST':
+        score_formset = ScoreFormset(request.POST, queryset=scores)
+        if score_formset.is_valid():
+            changed_scores = score_formset.save(commit=False)
+            if changed_scores:
+                #bulk_update skips the score signals, so the round is touched here once
+                with transaction.atomic():
+                    Score.objects.bulk_update(changed_scores, ['score'])
+                    touch_round(round.pk)
+            return redirect(reverse('rounds:detail', args=[str(round.pk)]))
+    else:
+        score_formset = ScoreFormset(queryset=scores)
+
+    context = {
+        'round': round,
+        'score_formset': score_formset,
+    }
+    return render(request, 'rounds/scorecard_entry.html', context)
+
+
+def _parseScoreBatch(body):
+    ''' Read {"key": ..., "version": ..., "scores": {hole number: score or null}} from a
+        request body. Raises ValueError if anything is missing or malformed '''
+    data = json.loads(body)
+    key, version, scores = data['key'], data['version'], data['scores']
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        raise ValueError
+    if not isinstance(version, int) or not isinstance(scores, dict) or not scores:
+        raise ValueError
+    parsed = {}
+    for hole, score in scores.items():
+        if score is not None and (not isinstance(score, int) or isinstance(score, bool) or score < 1):
+            raise ValueError
+        parsed[int(hole)] = score
+    return key, version, parsed
+
+
+@login_required
+def scoreAutosave(request, round_id):
+    try:
+        round = Round.objects.only('id', 'player_id', 'version', 'last_updated').get(pk=round_id)
+    except Round.DoesNotExist:
+        raise Http404("Round does not exist")
+    if not isOwner(round, request.user):
+        raise PermissionDenied()
+
+    if request.method == 'POST':
+        try:
+            key, version, scores = _parseScoreBatch(request.body)
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a key, the round version and scores by hole number'}, status=400)
+        status, body = applyScoreBatch(round.pk, key, version, scores)
+        return JsonResponse(body, status=status)
+
+    #Polling clients get a 304 until the scores change
+    return conditionalResponse(request, f'round-{round.pk}-v{round.version}',
+                               lambda: JsonResponse({'version': round.version,
+                                                     'scores': dict(round.score_set.values_list('hole_number', 'score'))}))
+
+
+@login_required
+def courseLeaderboard(request, course_id):
+    try:
+        course = Course.objects.get(pk=course_id)
+    except Course.DoesNotExist:
+        raise Http404("Course does not exist")
+    tees = list(Tee.objects.filter(course=course).order_by('id'))
+
+    order = request.GET.get('order', 'gross')
+    holes = 9 if request.GET.get('holes') == '9' else 18
+    tees_id = request.GET.get('tees')
+    if order not in BOARD_ORDERINGS:
+        order = 'gross'
+    #Only the course's own tees have a board here
+    if tees_id not in {str(tee.id) for tee in tees}:
+        tees_id = None
+    entries, next_cursor = leaderboardPage(course.id, holes, tees_id, order, request.GET.get('after'))
+
+    #Page links keep the current board
+    board = request.GET.copy()
+    board.pop('after', None)
+    context = {
+        'course': course,
+        'tees': tees,
+        'entries': entries,
+        'order': order,
+        'holes': holes,
+        'tees_id': tees_id,
+        'board': board.urlencode(),
+        'next_cursor': next_cursor,
+        'first_page': not request.GET.get('after'),
+    }
+    return render(request, 'rounds/leaderboard.html', context)
 
 
 class RoundListView(LoginRequiredMixin, generic.ListView):
@@ -37,44 +210,79 @@ class RoundListView(LoginRequiredMixin, generic.ListView):
     context_object_name = 'rounds_list'
 
     def get_queryset(self) -> QuerySet[Any]:
-        return Round.objects.filter(player=self.request.user).order_by('-datetime')[:100]
-    
+        self.filter_form = RoundFilterForm(self.request.GET)
+        rounds = Round.objects.filter(player=self.request.user).select_related('course', 'tees')
+        rounds = self.filter_form.filterRounds(rounds)
+        rounds, self.next_cursor = keysetPage(rounds, ['-datetime', '-id'], self.request.GET.get('after'))
+        return rounds
 
-class RoundDetailView(LoginRequiredMixin, generic.DetailView):
-    model = Round
+    def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        #Page links keep the current filters
+        filters = self.request.GET.copy()
+        filters.pop('after', None)
+        context.update({
+            "filter_form": self.filter_form,
+            "filters": filters.urlencode(),
+            "next_cursor": self.next_cursor,
+            "first_page": not self.request.GET.get('after'),
+        })
+        return context
+
+
+class SingleRoundMixin:
+    #Resolve the round once per request so the permission check, the view and the success url share it
+    def get_object(self, queryset=None):
+        if not hasattr(self, '_round'):
+            self._round = super().get_object(queryset)
+        return self._round
+
+
+class OwnRoundMixin(SingleRoundMixin):
+    def get_object(self, queryset=None):
+        round = super().get_object(queryset)
+        #Only the owner of the round can change it
+        if not isOwner(round, self.request.user):
+            raise PermissionDenied()
+        return round
+
+
+class RoundDetailView(LoginRequiredMixin, SingleRoundMixin, generic.DetailView):
     template_name = "rounds/round_detail.html"
 
+    def get_queryset(self) -> QuerySet[Any]:
+        return Round.objects.select_related('course', 'tees')
+
     def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
         #Only show page if the round is public or user is the owner of the round
-        if isOwnerOrPublic(self.get_object(), self.request.user) == False:
+        if isOwnerOrPublic(self.object, self.request.user) == False:
             raise PermissionDenied()
-        return super().get(request, *args, **kwargs)
+
+        #Course and tee names are shown too, tee edits move the course's last_updated forward
+        last_updated = self.object.last_updated
+        if self.object.course is not None:
+            last_updated = max(last_updated, self.object.course.last_updated)
+        etag = f'round-{self.object.pk}-{last_updated.timestamp()}-{request.user.pk}'
+        return conditionalResponse(request, etag, self.renderScorecard)
+
+    def renderScorecard(self):
+        #Scores are only loaded when the page is rendered, not for a 304
+        prefetch_related_objects([self.object], Prefetch('score_set', queryset=Score.objects.order_by('hole_number')))
+        return self.render_to_response(self.get_context_data(object=self.object))
     
 
-class RoundUpdateView(LoginRequiredMixin, generic.UpdateView):
+class RoundUpdateView(LoginRequiredMixin, OwnRoundMixin, generic.UpdateView):
     model = Round
     fields = ['course', 'tees', 'num_of_holes', 'weather_conditions', 'public']
     template_name = "rounds/round_update.html"
 
-    def get(self, request, *args, **kwargs):
-        #Only show page if the round is public or user is the owner of the round
-        if isOwner(self.get_object(), self.request.user) == False:
-            raise PermissionDenied()
-        return super().get(request, *args, **kwargs)
-    
     def get_success_url(self) -> str:
-        return reverse('rounds:detail', args=[str(self.get_object().pk)])
+        return reverse('rounds:detail', args=[str(self.object.pk)])
     
 
-class RoundDeleteView(LoginRequiredMixin, generic.DeleteView):
+class RoundDeleteView(LoginRequiredMixin, OwnRoundMixin, generic.DeleteView):
     model = Round
 
-    def get(self, request, *args, **kwargs):
-        #Only show page if the round is public or user is the owner of the round
-        if isOwner(self.get_object(), self.request.user) == False:
-            raise PermissionDenied()
-        return super().get(request, *args, **kwargs)
-    
     def get_success_url(self) -> str:
         return reverse('rounds:library')
-
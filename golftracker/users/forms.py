@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.core.files.uploadedfile import UploadedFile
 from .models import Profile
+from .images import shrinkUpload
 
 
 class UserRegisterForm(UserCreationForm):
@@ -23,4 +25,11 @@ class UserUpdateForm(forms.ModelForm):
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['image']
\ No newline at end of file
+        fields = ['image']
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        #Only a new upload is decoded, shrunk and stripped here, the stored image is left as it is
+        if isinstance(image, UploadedFile):
+            return shrinkUpload(image)
+        return image
@@ -0,0 +1,179 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+PROFILE_IMAGE_SIZE = (300, 300)
+DEFAULT_IMAGE = 'default.png'
+#Square avatar sizes in pixels, each stored as WebP with a JPEG fallback for browsers without WebP
+AVATAR_SIZES = [32, 64, 128, 300]
+AVATAR_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+HASH_CHUNK_SIZE = 64 * 1024
+#Uploads are checked against these limits from their headers, before any pixels are decoded.
+#JPEGs are decoded at a fraction of their size, other formats are decoded whole so they get a lower limit
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_UPLOAD_PIXELS = 64_000_000
+MAX_FULL_DECODE_PIXELS = 16_000_000
+#Stored images are decoded at no less than this, the largest avatar is cut from them
+UPLOAD_SIDE = max(AVATAR_SIZES)
+
+logger = logging.getLogger(__name__)
+#Writing the variants only touches files, so one worker thread per process is enough and keeps it off the requests
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-images')
+_pending = set()
+
+
+def openScaled(file, size):
+    ''' Open an image for decoding at no less than size. A JPEG is set to decode at the smallest
+        of 1/2, 1/4 or 1/8 of its size still covering size, so its full resolution is never in memory.
+        Raises ValidationError for images too large to decode '''
+    img = Image.open(file)
+    pixels = img.width * img.height
+    limit = MAX_UPLOAD_PIXELS if img.format == 'JPEG' else MAX_FULL_DECODE_PIXELS
+    if pixels > limit:
+        img.close()
+        raise ValidationError(f'Images can be at most {limit // 1_000_000} megapixels.', code='too_many_pixels')
+    if img.format == 'JPEG':
+        img.draft(img.mode, size)
+    return img
+
+
+def shrinkUpload(upload):
+    ''' Decode an uploaded image at a reduced size, turn it upright and re-encode it without its
+        EXIF data, shrunk to fit PROFILE_IMAGE_SIZE. JPEGs stay JPEGs, anything else is stored as
+        a PNG. Returns a file to store instead of the upload, the stored image is never rewritten '''
+    if upload.size > MAX_UPLOAD_BYTES:
+        raise ValidationError(f'Images can be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.', code='too_large')
+    upload.seek(0)
+    try:
+        img = openScaled(upload, PROFILE_IMAGE_SIZE)
+    except (Image.DecompressionBombError, OSError):
+        raise ValidationError('Upload a valid image.', code='invalid_image')
+    with img:
+        image_format = 'JPEG' if img.format == 'JPEG' else 'PNG'
+        icc_profile = img.info.get('icc_profile')
+        #Turning the image upright drops its orientation, saving without exif drops the rest
+        img = ImageOps.exif_transpose(img)
+        scale = min(PROFILE_IMAGE_SIZE[0] / img.width, PROFILE_IMAGE_SIZE[1] / img.height)
+        if scale < 1:
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+        if image_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif image_format == 'PNG' and img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            img = img.convert('RGBA')
+        data = io.BytesIO()
+        if image_format == 'JPEG':
+            img.save(data, format='JPEG', quality=90, icc_profile=icc_profile)
+        else:
+            img.save(data, format='PNG', icc_profile=icc_profile)
+
+    name = os.path.basename(upload.name)
+    if image_format == 'PNG':
+        name = f'{os.path.splitext(name)[0]}.png'
+    return ContentFile(data.getvalue(), name=name)
+
+
+def contentHash(file) -> str:
+    ''' SHA-256 of a file's content, read in chunks from the start and rewound afterwards '''
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def storedImageHash(name) -> str:
+    ''' Content hash of a stored image, empty if the file is missing '''
+    try:
+        with default_storage.open(name, 'rb') as file:
+            return contentHash(file)
+    except FileNotFoundError:
+        return ''
+
+
+def variantName(content_hash, size, extension) -> str:
+    ''' Storage name of one avatar variant. Variants live under the hash of the original image,
+        so identical uploads share them and a name never changes content '''
+    return f'avatars/{content_hash[:2]}/{content_hash}/{size}.{extension}'
+
+
+#(storage location, hash) of variants found or written by this process, they never change once they exist
+_ready = set()
+
+
+def variantsReady(content_hash) -> bool:
+    ''' Check if every variant of an image hash has been written '''
+    if (default_storage.location, content_hash) in _ready:
+        return True
+    if all(default_storage.exists(variantName(content_hash, size, extension))
+           for size in AVATAR_SIZES for extension in AVATAR_FORMATS):
+        _ready.add((default_storage.location, content_hash))
+        return True
+    return False
+
+
+def _writeAtomically(name, data) -> None:
+    #Another process may be writing the same variant, whichever finishes last replaces an identical file
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def createAvatarVariants(name, content_hash) -> None:
+    ''' Write the square WebP and JPEG variants of a stored image under its content hash,
+        unless an identical image already has them '''
+    if not content_hash or variantsReady(content_hash):
+        return
+    with openScaled(default_storage.path(name), (UPLOAD_SIDE, UPLOAD_SIDE)) as img:
+        img = ImageOps.exif_transpose(img)
+        #JPEG has no transparency, so transparent images are flattened onto white
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        else:
+            img = img.convert('RGB')
+        for size in AVATAR_SIZES:
+            variant = ImageOps.fit(img, (size, size), Image.LANCZOS)
+            for extension, image_format in AVATAR_FORMATS.items():
+                data = io.BytesIO()
+                variant.save(data, format=image_format, quality=85)
+                _writeAtomically(variantName(content_hash, size, extension), data.getvalue())
+    _ready.add((default_storage.location, content_hash))
+
+
+def processProfileImage(name, content_hash) -> None:
+    ''' Background job for a new profile image, write its variants. The image itself was shrunk
+        before it was stored and isn't changed '''
+    createAvatarVariants(name, content_hash)
+
+
+def _finished(future) -> None:
+    _pending.discard(future)
+    if future.exception() is not None:
+        logger.error('Processing a profile image failed', exc_info=future.exception())
+
+
+def enqueueProfileImage(name, content_hash):
+    ''' Process a new profile image on the worker thread. Returns the future of the job '''
+    future = _executor.submit(processProfileImage, name, content_hash)
+    _pending.add(future)
+    future.add_done_callback(_finished)
+    return future
+
+
+def waitForProfileImages(timeout=None) -> None:
+    ''' Block until every queued job has finished '''
+    wait(list(_pending), timeout=timeout)
@@ -0,0 +1,87 @@
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+
+from users.images import UPLOAD_SIDE, shrinkUpload
+
+
+def writeSample(path, megapixels) -> None:
+    ''' Write a JPEG of about the given size, rotated by its EXIF orientation like a phone photo '''
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = width * 3 // 4
+    gradient = Image.linear_gradient('L')
+    img = Image.merge('RGB', [gradient.resize((width, height)), gradient.resize((height, width)).transpose(Image.ROTATE_90),
+                              Image.new('L', (width, height), 128)])
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    img.save(path, format='JPEG', quality=90, exif=exif)
+
+
+def decodeWhole(path) -> None:
+    ''' Previous upload handling, the whole image is decoded to turn it upright before cutting the avatar '''
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        ImageOps.fit(img, (UPLOAD_SIDE, UPLOAD_SIDE), Image.LANCZOS)
+
+
+def decodeScaled(path) -> None:
+    ''' Current upload handling, checked from the headers and decoded at a reduced size '''
+    with open(path, 'rb') as file:
+        shrinkUpload(File(file, name=os.path.basename(path)))
+
+
+def _run(connection, function, args) -> None:
+    #Runs in a fresh fork, so its peak RSS only covers this call on top of what it inherited
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    connection.send((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline))
+    connection.close()
+
+
+def measure(function, *args):
+    ''' (seconds, peak RSS growth in KiB) of a call made in a forked process '''
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run, args=(sender, function, args))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+class Command(BaseCommand):
+    help = "Compare the latency and peak memory of decoding large uploads whole and at a reduced size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=int, nargs='+', default=[12, 24, 48],
+                            help="Sizes of the sample photos")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Runs of each case, the median latency and largest peak are reported")
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for megapixels in options['megapixels']:
+                path = os.path.join(directory, f'{megapixels}.jpeg')
+                #Written in a fork too so the sample's pixels don't stay in this process
+                measure(writeSample, path, megapixels)
+                size = os.path.getsize(path) / (1024 * 1024)
+                for label, function in (('before', decodeWhole), ('after', decodeScaled)):
+                    runs = [measure(function, path) for run in range(max(1, options['repeat']))]
+                    latency = statistics.median(elapsed for elapsed, peak in runs) * 1000
+                    peak = max(peak for elapsed, peak in runs) / 1024
+                    self.stdout.write(f'{megapixels} MP ({size:.1f} MB) {label}: {latency:.0f} ms, peak RSS +{peak:.1f} MB')
+        finally:
+            shutil.rmtree(directory)
+        self.stdout.write(self.style.SUCCESS('Benchmark finished'))
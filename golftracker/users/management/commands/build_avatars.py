@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from users.models import Profile
+from users.images import storedImageHash, createAvatarVariants
+
+
+def processImage(name):
+    ''' Hash a stored image and write its avatar variants, run in the worker processes.
+        Returns (name, content hash, why it failed), the hash is empty when it failed '''
+    content_hash = storedImageHash(name)
+    if not content_hash:
+        return name, '', 'is missing'
+    try:
+        createAvatarVariants(name, content_hash)
+    except ValidationError:
+        #Stored before uploads were checked and too large to decode, it keeps showing the original
+        return name, '', 'is too large to decode'
+    except OSError:
+        #Corrupt or truncated files, UnidentifiedImageError is one too. Reported with the others
+        #instead of stopping the whole run
+        return name, '', 'could not be decoded'
+    return name, content_hash, ''
+
+
+class Command(BaseCommand):
+    help = "Write the avatar variants of every stored profile image and record their content hashes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Number of processes decoding and encoding images")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        #Profiles sharing an image, like the default one, only have it processed once
+        names = list(Profile.objects.order_by().values_list('image', flat=True).distinct())
+        #The workers are forked from this process and must not share its database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            results = list(pool.map(processImage, names, chunksize=16))
+
+        hashes = {}
+        for name, content_hash, failure in results:
+            hashes[name] = content_hash
+            if failure:
+                self.stdout.write(f'Image {name} {failure}')
+
+        changed = []
+        profiles = Profile.objects.only('id', 'image', 'avatar_hash').order_by('id')
+        for profile in profiles.iterator(chunk_size=batch_size):
+            content_hash = hashes.get(profile.image.name, '')
+            if profile.avatar_hash != content_hash:
+                profile.avatar_hash = content_hash
+                changed.append(profile)
+        Profile.objects.bulk_update(changed, ['avatar_hash'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(names)} distinct images, updated {len(changed)} profiles'))
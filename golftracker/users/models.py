@@ -1,21 +1,64 @@
 from django.db import models
+from django.db import transaction
 from django.contrib.auth.models import User
-from PIL import Image
+from django.core.files.uploadedfile import UploadedFile
+from .images import enqueueProfileImage, contentHash, storedImageHash, shrinkUpload, DEFAULT_IMAGE
+
+
+#The default image is shared by most profiles, so its hash is only read once per process
+_default_hash = None
+
+
+def defaultImageHash() -> str:
+    global _default_hash
+    if not _default_hash:
+        _default_hash = storedImageHash(DEFAULT_IMAGE)
+    return _default_hash
 
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    image = models.ImageField(default='default.png', upload_to='profile_pics')
+    image = models.ImageField(default=DEFAULT_IMAGE, upload_to='profile_pics')
+    #Content hash of the image as stored, its avatar variants are stored under it
+    avatar_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     def __str__(self):
         return f'{self.user.username} Profile'
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #Remember the stored image so saves can tell whether it was replaced
+        instance._saved_image = instance.__dict__.get('image')
+        return instance
+
+    def image_changed(self) -> bool:
+        ''' Check if the image was replaced since the profile was loaded or last saved '''
+        return (self._state.adding or not self.image._committed
+                or self.image.name != getattr(self, '_saved_image', None))
+
+    def _image_hash(self) -> str:
+        if not self.image._committed:
+            return contentHash(self.image.file)
+        if self.image.name == DEFAULT_IMAGE:
+            return defaultImageHash()
+        return storedImageHash(self.image.name)
+
     def save(self, *args, **kwargs):
+        image_changed = self.image_changed()
+        #Uploads saved without ProfileUpdateForm, which already shrinks them, are shrunk here so the
+        #stored file is final and its hash matches what build_avatars reads back
+        if not self.image._committed and isinstance(self.image.file, UploadedFile):
+            self.image = shrinkUpload(self.image.file)
+        if image_changed and self.image.name:
+            self.avatar_hash = self._image_hash()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'image' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'avatar_hash'}
         super(Profile, self).save(*args, **kwargs)
-        
-        img = Image.open(self.image.path)
+        self._saved_image = self.image.name
 
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.image.path)
+        #The variants are made on the worker once the profile is committed, not in the request
+        if image_changed and self.image.name:
+            name, content_hash = self.image.name, self.avatar_hash
+            transaction.on_commit(lambda: enqueueProfileImage(name, content_hash))
@@ -12,4 +12,7 @@ def create_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    #Only a profile loaded through this user can have been changed through it, and an unchanged one
+    #isn't saved at all, so saves like the last_login update on every login don't touch the profile
+    if User.profile.is_cached(instance) and instance.profile.image_changed():
+        instance.profile.save()
@@ -0,0 +1,32 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from ..images import AVATAR_SIZES, variantName, variantsReady
+
+register = template.Library()
+
+
+def _variantSize(size) -> int:
+    #Smallest variant that covers the size, or the largest there is
+    return next((variant for variant in AVATAR_SIZES if variant >= size), AVATAR_SIZES[-1])
+
+
+def _srcset(content_hash, size, extension) -> str:
+    one_x = default_storage.url(variantName(content_hash, _variantSize(size), extension))
+    two_x = default_storage.url(variantName(content_hash, _variantSize(size * 2), extension))
+    return one_x if one_x == two_x else f'{one_x} 1x, {two_x} 2x'
+
+
+@register.simple_tag
+def avatar(profile, size, alt=''):
+    ''' Image of a profile shown at size pixels square, from the smallest WebP variant that covers
+        it with a JPEG fallback. Until the variants have been made the original image is used '''
+    size = int(size)
+    if not profile.avatar_hash or not variantsReady(profile.avatar_hash):
+        return format_html('<img src="{}" width="{}" height="{}" alt="{}">', profile.image.url, size, size, alt)
+    return format_html('<picture><source type="image/webp" srcset="{}">'
+                       '<img src="{}" srcset="{}" width="{}" height="{}" alt="{}"></picture>',
+                       _srcset(profile.avatar_hash, size, 'webp'),
+                       default_storage.url(variantName(profile.avatar_hash, _variantSize(size), 'jpg')),
+                       _srcset(profile.avatar_hash, size, 'jpg'), size, size, alt)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from ..models import Profile
+from ..images import AVATAR_SIZES, variantName, waitForProfileImages
+
+
+class BuildAvatarsCommandTestCase(TestCase):
+    def setUp(self) -> None:
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        os.makedirs(os.path.join(self.media, 'profile_pics'))
+        shutil.copy('./media/default.png', self.media)
+        shutil.copy('./users/tests/test_media/test_profile_photo.jpeg', os.path.join(self.media, 'profile_pics/photo.jpeg'))
+        shutil.copy('./users/tests/test_media/test_profile_photo.jpeg', os.path.join(self.media, 'profile_pics/copy.jpeg'))
+        #Cut short like an interrupted upload
+        with open('./users/tests/test_media/test_profile_photo.jpeg', 'rb') as file:
+            data = file.read()
+        with open(os.path.join(self.media, 'profile_pics/truncated.jpeg'), 'wb') as file:
+            file.write(data[:len(data) // 2])
+        for username, image in (('first', 'default.png'), ('second', 'default.png'),
+                                ('third', 'profile_pics/photo.jpeg'), ('fourth', 'profile_pics/copy.jpeg'),
+                                ('fifth', 'profile_pics/missing.jpeg'), ('sixth', 'profile_pics/truncated.jpeg')):
+            User.objects.create(username=username, password='12345')
+            #Updated directly so the stored hashes start out empty like profiles from before avatars
+            Profile.objects.filter(user__username=username).update(image=image, avatar_hash='')
+
+    def test_builds_shared_variants(self):
+        """Check that every profile gets the hash of its image, identical images share one set
+        of variants, and missing or corrupt images are reported without stopping the others"""
+        out = StringIO()
+        call_command('build_avatars', '--workers', '2', stdout=out)
+        hashes = dict(Profile.objects.values_list('user__username', 'avatar_hash'))
+        self.assertEqual(hashes['first'], hashes['second'])
+        self.assertEqual(hashes['third'], hashes['fourth'])
+        self.assertEqual(hashes['fifth'], '')
+        self.assertEqual(hashes['sixth'], '')
+        self.assertEqual(len(os.listdir(os.path.join(self.media, 'avatars', hashes['third'][:2]))), 1)
+        for size in AVATAR_SIZES:
+            for extension in ('webp', 'jpg'):
+                self.assertTrue(os.path.exists(os.path.join(self.media, variantName(hashes['first'], size, extension))))
+        self.assertIn('Image profile_pics/missing.jpeg is missing', out.getvalue())
+        self.assertIn('Image profile_pics/truncated.jpeg could not be decoded', out.getvalue())
+        self.assertIn('Processed 5 distinct images, updated 4 profiles', out.getvalue())
+
+    def test_keeps_hash_of_uploaded_image(self):
+        """Check that the hash recorded when an image is uploaded is the one the command reads
+        back from the stored file, so the profile keeps its variants"""
+        profile = Profile.objects.get(user__username='third')
+        with open('./users/tests/test_media/test_profile_photo.jpeg', 'rb') as file:
+            profile.image = SimpleUploadedFile(name='upload.jpeg', content=file.read(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        waitForProfileImages()
+        uploaded = profile.avatar_hash
+        out = StringIO()
+        call_command('build_avatars', '--workers', '1', stdout=out)
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_hash, uploaded)
+
+
+class BenchmarkUploadsCommandTestCase(TestCase):
+    def test_reports_both_decoders(self):
+        """Check that the benchmark reports the latency and peak memory of both ways of decoding"""
+        out = StringIO()
+        call_command('benchmark_uploads', '--megapixels', '1', '--repeat', '1', stdout=out)
+        self.assertRegex(out.getvalue(), r'1 MP \(.* MB\) before: \d+ ms, peak RSS \+')
+        self.assertRegex(out.getvalue(), r'1 MP \(.* MB\) after: \d+ ms, peak RSS \+')
@@ -1,10 +1,16 @@
 import os
+import shutil
+import tempfile
 from PIL import Image
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.template import Context, Template
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from ..models import Profile
+from ..images import waitForProfileImages, variantName
 
 
 class ProfileModelTestCase(TestCase):
@@ -29,13 +35,20 @@ class ProfileModelTestCase(TestCase):
         profile = Profile.objects.get(pk=1)
         image_path = './users/tests/test_media/test_profile_photo.jpeg'
         profile.image = SimpleUploadedFile(name='test_profile_photo_compressed.jpeg', content=open(image_path, 'rb').read(), content_type='image/jpeg')
-        profile.save()
+        #The image is shrunk before it is stored, its variants are written on the worker once the save commits
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        waitForProfileImages()
         img = Image.open(profile.image)
         self.assertTrue(img.width <= 300)
         self.assertTrue(img.height <= 300)
         #Delete test image from media folder once we are done with test
         saved_image_path = os.path.join(os.getcwd(), 'media/profile_pics/test_profile_photo_compressed.jpeg')
         os.remove(saved_image_path)
+        #Along with its avatar variants and their folders
+        variants = os.path.dirname(os.path.join(os.getcwd(), 'media', variantName(profile.avatar_hash, 32, 'jpg')))
+        shutil.rmtree(variants)
+        os.removedirs(os.path.dirname(variants))
 
     def test_profile_is_deleted_when_user_deleted(self):
         """Checking that our profile is deleted when the associated user
@@ -44,3 +57,69 @@ class ProfileModelTestCase(TestCase):
         user.delete()
         profile = Profile.objects.filter(pk=1)
         self.assertQuerySetEqual(profile, Profile.objects.none())
+
+    def test_unchanged_profile_is_not_saved(self):
+        """Checking that saving a user, like the last_login update on every login,
+        doesn't save or resize an unchanged profile"""
+        user = User.objects.get(username='testuser')
+        with CaptureQueriesContext(connection) as queries:
+            user.save(update_fields=['last_login'])
+            user.profile
+            user.save()
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith('UPDATE "users_profile"')])
+
+    def test_resize_only_queued_for_new_image(self):
+        """Checking that a resize is only queued when the image was replaced"""
+        profile = Profile.objects.get(pk=1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            profile.save()
+        self.assertEqual(callbacks, [])
+        profile.image = 'profile_pics/new.jpeg'
+        with self.captureOnCommitCallbacks() as callbacks:
+            profile.save()
+            profile.save()
+        self.assertEqual(len(callbacks), 1)
+
+
+class AvatarTestCase(TestCase):
+    def setUp(self) -> None:
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        shutil.copy('./media/default.png', self.media)
+        self.user = User.objects.create(username='testuser', password='12345')
+
+    def uploadPhoto(self, name):
+        image_path = './users/tests/test_media/test_profile_photo.jpeg'
+        profile = Profile.objects.get(user__username='testuser')
+        profile.image = SimpleUploadedFile(name=name, content=open(image_path, 'rb').read(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        waitForProfileImages()
+        return profile
+
+    def test_identical_uploads_share_variants(self):
+        """Checking that uploading the same photo twice stores one set of square variants"""
+        first = self.uploadPhoto('first.jpeg')
+        second = self.uploadPhoto('second.jpeg')
+        self.assertEqual(first.avatar_hash, second.avatar_hash)
+        self.assertEqual(len(os.listdir(os.path.join(self.media, 'avatars'))), 1)
+        with Image.open(os.path.join(self.media, variantName(first.avatar_hash, 64, 'webp'))) as variant:
+            self.assertEqual((variant.format, variant.size), ('WEBP', (64, 64)))
+
+    def test_avatar_tag_picks_smallest_covering_variant(self):
+        """Checking that the avatar tag uses the smallest variant covering the size, with a
+        WebP source, and the original image until the variants exist"""
+        profile = Profile.objects.get(user__username='testuser')
+        profile.avatar_hash = 'f' * 64
+        html = Template('{% load avatars %}{% avatar profile 48 %}').render(Context({'profile': profile}))
+        self.assertIn('src="/media/default.png"', html)
+
+        profile = self.uploadPhoto('photo.jpeg')
+        html = Template('{% load avatars %}{% avatar profile 48 %}').render(Context({'profile': profile}))
+        self.assertIn(f'srcset="/media/{variantName(profile.avatar_hash, 64, "webp")} 1x, '
+                      f'/media/{variantName(profile.avatar_hash, 128, "webp")} 2x"', html)
+        self.assertIn(f'src="/media/{variantName(profile.avatar_hash, 64, "jpg")}"', html)
@@ -1,10 +1,18 @@
+import io
 import os
-from django.test import TestCase, Client
+import shutil
+import tempfile
+from unittest.mock import patch
+from PIL import Image
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from ..models import Profile
+from ..images import storedImageHash, waitForProfileImages
 from ..views import register, profile
 
 
@@ -108,6 +116,75 @@ class ProfileViewTestCase(TestCase):
         os.remove(saved_image_path)
 
 
+class ProfileUploadTestCase(TestCase):
+    def setUp(self) -> None:
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.settings = override_settings(MEDIA_ROOT=self.media)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, content):
+        payload = {'username': 'testuser',
+                   'email': 'testuser@gmail.com',
+                   'image': SimpleUploadedFile(name=name, content=content)}
+        return self.client.post('/profile/', payload)
+
+    def photo(self, size, image_format='JPEG'):
+        #Rotated a quarter turn by its EXIF orientation, with a camera model that shouldn't be kept
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x0110] = 'Test camera'
+        data = io.BytesIO()
+        Image.new('RGB', size, 'green').save(data, format=image_format, exif=exif)
+        return data.getvalue()
+
+    def test_large_photo_is_shrunk_upright_without_exif(self):
+        """Check that an uploaded photo is stored turned upright, shrunk to fit 300x300, and
+        without its EXIF data"""
+        response = self.upload('photo.jpeg', self.photo((2400, 1600)))
+        self.assertEqual(response.status_code, 302)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.image.name, 'profile_pics/photo.jpeg')
+        with Image.open(profile.image.path) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (200, 300)))
+            self.assertFalse(img.getexif())
+
+    def test_other_formats_are_stored_as_png(self):
+        """Check that an upload that isn't a JPEG is stored as a PNG"""
+        self.upload('photo.webp', self.photo((600, 400), 'WEBP'))
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.image.name, 'profile_pics/photo.png')
+        with Image.open(profile.image.path) as img:
+            self.assertEqual((img.format, img.size), ('PNG', (200, 300)))
+
+    def test_profile_is_saved_once(self):
+        """Check that posting a new image and user details saves the profile once and that the
+        stored file is the one hashed, not rewritten afterwards"""
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload('photo.jpeg', self.photo((2400, 1600)))
+            waitForProfileImages()
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if query['sql'].startswith('UPDATE "users_profile"')]), 1)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.avatar_hash, storedImageHash(profile.image.name))
+
+    def test_oversized_images_are_rejected(self):
+        """Check that images over the pixel or file size limits are rejected from their
+        headers and the profile keeps its image"""
+        with patch('users.images.MAX_UPLOAD_PIXELS', 1_000_000):
+            response = self.upload('photo.jpeg', self.photo((1200, 1000)))
+        self.assertContains(response, 'Images can be at most 1 megapixels.')
+        with patch('users.images.MAX_UPLOAD_BYTES', 100):
+            response = self.upload('photo.jpeg', self.photo((400, 300)))
+        self.assertContains(response, 'Images can be at most')
+        self.assertEqual(Profile.objects.get(user=self.user).image.name, 'default.png')
+
+
 #Django Default View so code coverage for this test case only found in golftracker/urls.py
 class LoginViewTestCase(TestCase):
     def test_renders_correct_template(self):
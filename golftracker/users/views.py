@@ -23,8 +23,11 @@ def profile(request):
         u_form = UserUpdateForm(request.POST, instance=request.user)
         p_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
         if u_form.is_valid() and p_form.is_valid():
+            #The profile only holds the image, leave it alone unless a new one was uploaded. It is saved
+            #first, so the user's post_save handler finds it unchanged instead of saving it again
+            if p_form.has_changed():
+                p_form.save()
             u_form.save()
-            p_form.save()
             messages.success(request, f'Account updated successfully.')
             return redirect('profile')
     else: